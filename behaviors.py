@@ -0,0 +1,167 @@
+#########################################
+## Behaviors (paths) of the simulation ##
+#########################################
+
+from state_graph import State
+from successor_cache import SuccessorCache
+from visualization import open_output_file
+from copy import copy
+import random
+
+
+#################
+## Single behavior: sequence of states from the initial state, and the transitions between them. A behavior either ends
+## in a terminal state (no transitions to other states), in a cycle (the last transition leads back to the state at index
+## cycle_start), or is truncated because it reached the maximum length
+#################
+class Behavior:
+
+	def __init__(self, states, transitions, cycle_start=None, truncated=False):
+		self.states = states
+		self.transitions = transitions
+		self.cycle_start = cycle_start
+		self.truncated = truncated
+
+	# Number of transitions
+	def __len__(self):
+		return len(self.transitions)
+
+	def is_cycle(self):
+		return self.cycle_start is not None
+
+	def to_string(self):
+		if self.is_cycle():
+			end = "loops back to state " + str(self.cycle_start + 1)
+		elif self.truncated:
+			end = "stopped at maximum length"
+		else:
+			end = "ends in terminal state"
+		s = str(len(self)) + " transitions, " + end + "\n"
+		for i, state in enumerate(self.states):
+			s += ("  " if i == 0 else "  -> ") + ", ".join([q_name + " (" + ",".join(vals) + ")" for q_name, vals in state.value_dict.items()]) + "\n"
+		return s
+
+
+# Generator of the behaviors of a reasoner's model, starting from its initial state (the values of the model's quantities).
+# States are expanded when a behavior reaches them, so the first behaviors are yielded without exploring the whole state graph.
+# Successors are taken from the successor cache of the reasoner, or if it is disabled, from an own cache of max_cache_size (see
+# SuccessorCache), as states are reached by many paths. Apart from this cache, only the current path (and the reported cycles, see below)
+# is kept in memory.
+# Behaviors are enumerated by depth first search over paths without repeated states. A path is reported when it reaches a terminal
+# state, a transition back to a state on the path (cycle), or max_length transitions. If report_cycles_once is True, a cycle that was
+# already reported (reached by another path) is skipped. For this, up to max_reported_cycles cycles are saved (None for no limit),
+# further cycles can be reported more than once.
+# If sample is given, that number of behaviors is drawn instead by random walks from the initial state (the same behavior can be drawn several times)
+def generate_behaviors(reasoner, max_length=None, sample=None, seed=0, report_cycles_once=True, max_reported_cycles=100000, max_cache_size=100000):
+	start = [copy(q) for q in reasoner.quantities]
+	cache = SuccessorCache(max_cache_size) if not reasoner.successor_cache.is_enabled() else None
+	if sample is not None:
+		return sample_behaviors(reasoner, start, sample, max_length, seed, cache)
+	return enumerate_behaviors(reasoner, start, max_length, report_cycles_once, max_reported_cycles, cache)
+
+def enumerate_behaviors(reasoner, start, max_length, report_cycles_once, max_reported_cycles, cache):
+	path = list()
+	keys = list()
+	positions = dict()
+	transitions = list()
+	stack = list()
+	reported_cycles = set()
+	entering = (None, start, State(start).key)
+	while entering is not None or len(stack) > 0:
+		if entering is not None:
+			t, quantities, key = entering
+			entering = None
+			positions[key] = len(path)
+			path.append(quantities)
+			keys.append(key)
+			if t is not None:
+				transitions.append(t)
+			next_states = get_next_states(reasoner, quantities, key, cache)
+			if len(next_states) > 0 and (max_length is None or len(transitions) < max_length):
+				stack.append(iter(next_states))
+				continue
+			yield create_behavior(reasoner, path, transitions, truncated=len(next_states) > 0)
+		else:
+			next_state = next(stack[-1], None)
+			if next_state is not None:
+				if next_state[2] not in positions:
+					entering = next_state
+					continue
+				cycle_start = positions[next_state[2]]
+				cycle = keys[cycle_start:]
+				first = cycle.index(min(cycle))
+				cycle = tuple(cycle[first:] + cycle[:first])
+				if not report_cycles_once or cycle not in reported_cycles:
+					if report_cycles_once and (max_reported_cycles is None or len(reported_cycles) < max_reported_cycles):
+						reported_cycles.add(cycle)
+					yield create_behavior(reasoner, path, transitions + [next_state[0]], cycle_start=cycle_start)
+				continue
+			stack.pop()
+		# Leaving the last state of the path
+		del positions[keys.pop()]
+		path.pop()
+		if len(transitions) > 0:
+			transitions.pop()
+
+def sample_behaviors(reasoner, start, num_samples, max_length, seed, cache):
+	rand = random.Random(seed)
+	start_key = State(start).key
+	for _ in range(num_samples):
+		path = [start]
+		positions = {start_key: 0}
+		transitions = list()
+		key = start_key
+		while True:
+			next_states = get_next_states(reasoner, path[-1], key, cache)
+			if len(next_states) == 0 or (max_length is not None and len(transitions) >= max_length):
+				yield create_behavior(reasoner, path, transitions, truncated=len(next_states) > 0)
+				break
+			t, quantities, key = rand.choice(next_states)
+			if key in positions:
+				yield create_behavior(reasoner, path, transitions + [t], cycle_start=positions[key])
+				break
+			positions[key] = len(path)
+			path.append(quantities)
+			transitions.append(t)
+
+# Successors of a state as list of (transition, quantities, state key). Like in the state graph, only the first transition
+# to each other state is kept. If a cache is given, successors are saved in it (the successor cache of the reasoner is disabled then)
+def get_next_states(reasoner, quantities, key, cache=None):
+	if cache is None:
+		successors = reasoner.get_successors(quantities)
+	else:
+		code = reasoner.codec.encode(quantities)
+		cached_successors = cache.get(code)
+		if cached_successors is not None:
+			successors = reasoner.decode_successors(quantities, cached_successors)
+		else:
+			successors = reasoner.get_successors(quantities)
+			cache.put(code, reasoner.encode_successors(successors))
+	next_states = list()
+	next_keys = {key}
+	for t, next_quantities in successors:
+		next_key = State(next_quantities).key
+		if next_key not in next_keys:
+			next_keys.add(next_key)
+			next_states.append((t, next_quantities, next_key))
+	return next_states
+
+# Behavior with new state objects, as the path is changed afterwards. Dependent quantities are added if the reasoner projected them
+def create_behavior(reasoner, path, transitions, cycle_start=None, truncated=False):
+	states = [State(quantities) for quantities in path]
+	transitions = list(transitions)
+	if reasoner.projection is not None:
+		states = [reasoner.projection.expand_state(s) for s in states]
+		transitions = [reasoner.projection.expand_termination(t) for t in transitions]
+	return Behavior(states, transitions, cycle_start, truncated)
+
+# Writes behaviors one after the other while they are generated. Returns the number of written behaviors
+def save_behaviors(filename, behaviors, compress=False):
+	count = 0
+	with open_output_file(filename, compress) as f:
+		f.write("Behaviors\n")
+		f.write("#"*50 + "\n")
+		for behavior in behaviors:
+			count += 1
+			f.write("Behavior " + str(count) + ": " + behavior.to_string() + "\n")
+	return count
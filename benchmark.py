@@ -0,0 +1,249 @@
+####################################################
+## Benchmarks of the reasoner on synthetic models ##
+####################################################
+from qreasoner import QualitativeReasoner
+from state_graph import Entity, Quantity, Relationship
+import argparse
+import contextlib
+import gc
+import io
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+import types
+
+# Magnitude spaces of synthetic quantities by size. Only the predefined values are used, as the reasoner assigns meaning to them
+MAGNITUDE_SPACES = {
+	2: [Quantity.ZERO, Quantity.POSITIVE],
+	3: [Quantity.ZERO, Quantity.POSITIVE, Quantity.MAX_VAL],
+	4: [Quantity.NEGATIVE, Quantity.ZERO, Quantity.POSITIVE, Quantity.MAX_VAL],
+	5: [Quantity.MIN_VAL, Quantity.NEGATIVE, Quantity.ZERO, Quantity.POSITIVE, Quantity.MAX_VAL]
+}
+TOPOLOGIES = ["chain", "mesh"]
+
+# Creates a synthetic model (entities, quantities, relations) with num_quantities quantities.
+# The first num_exogenous quantities are exogenous, all others are connected in a chain: every quantity is influenced (I) or
+# proportional (P) to its predecessor, with the share of proportionalities given by proportional_ratio. The chain starts at the last
+# exogenous quantity, the other exogenous quantities influence (I+) the first quantity of the chain, so that every quantity has a relation. For a mesh, every pair
+# of quantities (in forward direction, so that there are no causal loops) gets an additional relation with probability density,
+# which is negative with probability negative_ratio.
+# Proportional quantities get value constraints for their landmarks with probability vc_density
+def generate_synthetic_model(num_quantities, topology="chain", density=0.2, proportional_ratio=0.5, vc_density=0.5, num_exogenous=1, space_size=3, seed=0, negative_ratio=0.5):
+	if topology not in TOPOLOGIES:
+		raise ValueError("Unknown topology \"" + str(topology) + "\". Options: " + ", ".join(TOPOLOGIES))
+	if space_size not in MAGNITUDE_SPACES:
+		raise ValueError("Unsupported size of quantity spaces " + str(space_size) + ". Options: " + ", ".join([str(k) for k in MAGNITUDE_SPACES.keys()]))
+	rand = random.Random(seed)
+	entity = Entity(name="System")
+	quantities = list()
+	for i in range(num_quantities):
+		exogenous = i < num_exogenous
+		q = Quantity(name="Q" + str(i), magn_space=list(MAGNITUDE_SPACES[2 if exogenous else space_size]), model_2nd_derivative=not exogenous, exogenous=exogenous)
+		entity.add_quantity(q)
+		quantities.append(q)
+
+	pairs = [(max(i - 1, 0), i) for i in range(max(num_exogenous, 1), num_quantities)]
+	if topology == "mesh":
+		pairs += [(i, j) for i in range(num_quantities) for j in range(max(i + 2, num_exogenous), num_quantities) if rand.random() < density]
+	relations = list()
+	for pair_index, (i, j) in enumerate(pairs):
+		# Relations of the chain are positive, so that changes can propagate from the exogenous quantities through the model
+		positive = pair_index < num_quantities - max(num_exogenous, 1) or rand.random() >= negative_ratio
+		if rand.random() < proportional_ratio:
+			relations.append(Relationship(rel_opt=Relationship.PROPORTIONAL, q1=quantities[i], q2=quantities[j], positive=positive, verbose=False))
+			if positive and quantities[i].magn_space == quantities[j].magn_space and rand.random() < vc_density:
+				for landmark in [v for v in quantities[j].magn_space if quantities[j].is_landmark_value(v)]:
+					relations.append(Relationship(rel_opt=Relationship.VALUE_EQ, q1=quantities[i], q2=quantities[j], add_params=(landmark, landmark), verbose=False))
+		else:
+			relations.append(Relationship(rel_opt=Relationship.INFLUENCE, q1=quantities[i], q2=quantities[j], positive=positive, verbose=False))
+	if num_exogenous < num_quantities:
+		for i in range(num_exogenous - 1):
+			relations.append(Relationship(rel_opt=Relationship.INFLUENCE, q1=quantities[i], q2=quantities[num_exogenous], positive=True, verbose=False))
+	return [entity], quantities, relations
+
+# Runs a function and returns its result together with the time in seconds and (if tracked) the peak of allocated memory in bytes
+def measure(function, track_memory=False):
+	if track_memory:
+		tracemalloc.start()
+	start = time.perf_counter()
+	with contextlib.redirect_stdout(io.StringIO()):
+		result = function()
+	duration = time.perf_counter() - start
+	peak_memory = None
+	if track_memory:
+		peak_memory = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+	return result, duration, peak_memory
+
+# Size in bytes of an object and all objects it refers to (e.g. the state graph that a reasoner keeps after simulating).
+# Classes, modules and functions are shared with other objects and not counted, neither are the objects that exclude refers to
+def get_retained_memory(obj, exclude=None):
+	seen = set()
+	if exclude is not None:
+		add_referents_size(exclude, seen)
+	return add_referents_size(obj, seen)
+
+# Size of the objects that obj refers to and that are not in seen (ids). Adds them to seen
+def add_referents_size(obj, seen):
+	stack = [obj]
+	size = 0
+	while len(stack) > 0:
+		o = stack.pop()
+		if id(o) in seen or isinstance(o, (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType)):
+			continue
+		seen.add(id(o))
+		size += sys.getsizeof(o)
+		stack.extend(gc.get_referents(o))
+	return size
+
+# Memory of the explored state graph of a reasoner (states, index, connections and transitions). The model (quantities and their
+# relations) and the codec of the quantity values are not counted, as the reasoner keeps them anyway (also without packed states)
+def get_state_graph_memory(reasoner):
+	return get_retained_memory([reasoner.state_list, reasoner.state_index, reasoner.state_connections, reasoner.state_transitions], exclude=[reasoner.quantities, reasoner.codec])
+
+# Explores the state graph from the initial state without writing any output
+def run_simulate(graph, packed_states=False):
+	reasoner = QualitativeReasoner(graph, packed_states=packed_states)
+	reasoner.simulate(sinks=[])
+	return reasoner
+
+def run_try_all_states(graph):
+	reasoner = QualitativeReasoner(graph)
+	reasoner.try_all_states()
+	return reasoner
+
+# Creates the terminations of all given states and combines them with create_cross_product. Returns the list of (quantities, transitions)
+def run_cross_product(reasoner, states):
+	transitions = list()
+	for state in states:
+		quantities = QualitativeReasoner.copy_quantities(reasoner.quantities)
+		for q in quantities:
+			q.set_value(*state.value_dict[q.name])
+		eps_term = reasoner.create_epsilon_terminations(quantities)
+		extra_terms = reasoner.create_value_terminations(quantities) + reasoner.create_exogenous_terminations(quantities) + reasoner.create_ambiguous_terminations(quantities)
+		transitions.append((quantities, reasoner.create_cross_product(eps_term, extra_terms)))
+	return transitions
+
+def run_next_states(reasoner, transitions):
+	num_valid = 0
+	for quantities, poss_transitions in transitions:
+		for t in poss_transitions:
+			if reasoner.create_next_state(QualitativeReasoner.copy_quantities(quantities), t) is not None:
+				num_valid += 1
+	return num_valid
+
+# Benchmarks all phases on one model. Phases are repeated and the fastest time is reported. Memory peaks are measured in an
+# additional run of each phase, as tracking allocations slows down the reasoner
+def benchmark_model(graph, repeat=3, track_memory=True, max_combinations=10**6):
+	result = {"num_quantities": len(graph[1]), "num_relations": len(graph[2]), "phases": dict()}
+	phase_functions = [("simulate", lambda: run_simulate(graph))]
+	combinations = QualitativeReasoner.count_all_combinations(len(graph[1]), [len(QualitativeReasoner.get_quantity_value_options(q)) for q in graph[1]])
+	result["num_combinations"] = combinations
+	if combinations <= max_combinations:
+		phase_functions.append(("try_all_states", lambda: run_try_all_states(graph)))
+	reasoner = None
+	for name, function in phase_functions:
+		times = list()
+		for _ in range(repeat):
+			reasoner_result, duration, _ = measure(function)
+			times.append(duration)
+		result["phases"][name] = {"time": min(times), "mean_time": sum(times) / len(times)}
+		if track_memory:
+			result["phases"][name]["peak_memory"] = measure(function, track_memory=True)[2]
+		if name == "simulate":
+			reasoner = reasoner_result
+			result["num_states"] = len(reasoner.state_list)
+			result["num_transitions"] = sum([len(sources) for sources in reasoner.state_connections.values()])
+			# Memory of the simulated state graph with State and Termination objects and with packed states
+			if track_memory:
+				result["retained_memory"] = {"states": get_state_graph_memory(reasoner), "packed_states": get_state_graph_memory(measure(lambda: run_simulate(graph, packed_states=True))[0])}
+		else:
+			result["num_all_states"] = len(reasoner_result.state_list)
+
+	# Micro benchmarks on the states found by simulate
+	transitions = None
+	for name, function in [("create_cross_product", lambda: run_cross_product(reasoner, reasoner.state_list)), ("create_next_state", lambda: run_next_states(reasoner, transitions))]:
+		times = list()
+		for _ in range(repeat):
+			phase_result, duration, _ = measure(function)
+			times.append(duration)
+		result["phases"][name] = {"time": min(times), "mean_time": sum(times) / len(times)}
+		if track_memory:
+			result["phases"][name]["peak_memory"] = measure(function, track_memory=True)[2]
+		if name == "create_cross_product":
+			transitions = phase_result
+			result["num_checked_transitions"] = sum([len(t[1]) for t in transitions])
+	return result
+
+# Compares results with a baseline. Returns a list of regressions (model, phase, baseline time, new time) where the time
+# increased by more than the tolerance (relative). Models or phases missing in one of the files are ignored
+def compare_results(results, baseline, tolerance=0.2):
+	baseline_models = {m["name"]: m for m in baseline["models"]}
+	regressions = list()
+	for model in results["models"]:
+		if model["name"] not in baseline_models:
+			continue
+		for phase, values in model["phases"].items():
+			base_values = baseline_models[model["name"]]["phases"].get(phase)
+			if base_values is not None and values["time"] > base_values["time"] * (1 + tolerance):
+				regressions.append((model["name"], phase, base_values["time"], values["time"]))
+	return regressions
+
+def print_results(results, baseline=None):
+	baseline_models = {m["name"]: m for m in baseline["models"]} if baseline is not None else dict()
+	print("%-28s %8s %8s %-22s %12s %12s %10s" % ("Model", "States", "Trans.", "Phase", "Time [ms]", "Peak [KiB]", "Change"))
+	for model in results["models"]:
+		for phase, values in model["phases"].items():
+			change = ""
+			base_values = baseline_models.get(model["name"], {"phases": dict()})["phases"].get(phase)
+			if base_values is not None and base_values["time"] > 0:
+				change = "%+.1f%%" % (100 * (values["time"] / base_values["time"] - 1))
+			peak = ("%12.1f" % (values["peak_memory"] / 1024)) if values.get("peak_memory") is not None else "%12s" % "-"
+			print("%-28s %8d %8d %-22s %12.2f %s %10s" % (model["name"], model["num_states"], model["num_transitions"], phase, 1000 * values["time"], peak, change))
+		if "retained_memory" in model:
+			memory = model["retained_memory"]
+			print("%-28s retained memory of the state graph: %.1f KiB, packed states: %.1f KiB (%.1fx smaller)" % (model["name"], memory["states"] / 1024, memory["packed_states"] / 1024, memory["states"] / max(memory["packed_states"], 1)))
+
+parser = argparse.ArgumentParser(description="Benchmarks the reasoner on synthetic models and compares the results with a baseline")
+parser.add_argument("--sizes", help="Comma separated numbers of quantities. Default: 3,4,5", type=str, default="3,4,5")
+parser.add_argument("--topologies", help="Comma separated topologies. Options: " + ", ".join(TOPOLOGIES) + ". Default: chain,mesh", type=str, default="chain,mesh")
+parser.add_argument("--density", help="Probability of an additional relation between two quantities in a mesh. Default: 0.2", type=float, default=0.2)
+parser.add_argument("--proportional_ratio", help="Share of proportionalities (P) among the relations, others are influences (I). Default: 0.5", type=float, default=0.5)
+parser.add_argument("--vc_density", help="Probability of value constraints (VC) for a proportionality. Default: 0.5", type=float, default=0.5)
+parser.add_argument("--negative_ratio", help="Share of negative relations among the additional relations of a mesh. Default: 0.5", type=float, default=0.5)
+parser.add_argument("--exogenous", help="Number of exogenous quantities. Default: 1", type=int, default=1)
+parser.add_argument("--space_size", help="Size of the magnitude spaces (2 to 5). Default: 3", type=int, default=3)
+parser.add_argument("--seed", help="Seed for generating the models. Default: 0", type=int, default=0)
+parser.add_argument("--repeat", help="Number of runs per phase. The fastest run is reported. Default: 3", type=int, default=3)
+parser.add_argument("--max_combinations", help="Generating all states is skipped for models with more value combinations. Default: 1000000", type=int, default=10**6)
+parser.add_argument("--no_memory", help="Does not measure memory peaks.", action="store_true")
+parser.add_argument("--output", help="Filename for the results (JSON). Default: \"benchmark_results.json\"", type=str, default="benchmark_results.json")
+parser.add_argument("--baseline", help="Results of an earlier run (JSON) to compare with. Exits with code 1 if a phase got slower than the tolerance allows", type=str, default=None)
+parser.add_argument("--tolerance", help="Allowed relative slowdown compared to the baseline. Default: 0.2", type=float, default=0.2)
+
+if __name__ == '__main__':
+	args = parser.parse_args()
+	results = {"python": platform.python_version(), "machine": platform.machine(), "time": time.strftime("%Y-%m-%d %H:%M:%S"), "settings": vars(args), "models": list()}
+	for topology in [t.strip() for t in args.topologies.split(",")]:
+		for size in [int(s) for s in args.sizes.split(",")]:
+			graph = generate_synthetic_model(size, topology, args.density, args.proportional_ratio, args.vc_density, args.exogenous, args.space_size, args.seed, args.negative_ratio)
+			model_result = benchmark_model(graph, repeat=args.repeat, track_memory=not args.no_memory, max_combinations=args.max_combinations)
+			model_result["name"] = topology + "_" + str(size)
+			results["models"].append(model_result)
+	with open(args.output, "w") as f:
+		json.dump(results, f, indent=1)
+
+	baseline = None
+	if args.baseline is not None:
+		with open(args.baseline, "r") as f:
+			baseline = json.load(f)
+	print_results(results, baseline)
+	if baseline is not None:
+		regressions = compare_results(results, baseline, args.tolerance)
+		for name, phase, base_time, new_time in regressions:
+			print("Regression: " + phase + " on " + name + " took %.2f ms instead of %.2f ms" % (1000 * new_time, 1000 * base_time))
+		if len(regressions) > 0:
+			sys.exit(1)
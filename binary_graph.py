@@ -0,0 +1,157 @@
+##############################################
+## Compact binary export of the state graph ##
+##############################################
+
+from state_graph import Termination
+from state_store import PackedStateList
+from array import array
+import json
+import mmap
+import struct
+import sys
+
+#################
+## File layout (all sections start at multiples of 8 bytes, integers in the byte order given in the header):
+##  - Header: magic "QRSG", version, byte order (0 little, 1 big), length of model description, number of states, edges and changes
+##  - Model description (JSON): quantity names and value spaces, needed for decoding the state codes (see PackedStateList)
+##  - State codes: uint64 per state
+##  - Edges in CSR form, ordered by source state: offsets (uint64, number of states + 1) and target states (uint32, sorted per source)
+##  - Causes of the transitions: offsets per edge into the changes (uint64, number of edges + 1) and the changes themselves (uint64).
+##    A change is encoded as (quantity index << 16) | (value slot << 12) | (index of new value in its space << 4) | termination type
+#################
+
+MAGIC = b"QRSG"
+VERSION = 1
+HEADER_FORMAT = "<4sHHIQQQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# Value slots of a change and termination types in change records
+VALUE_SLOTS = ["magnitude", "derivative", "2nd order derivative"]
+TERMINATION_TYPES = [None, Termination.EPSILON, Termination.VALUE, Termination.EXOGENOUS, Termination.AMBIGUOUS]
+
+def padding(size):
+	return (8 - size % 8) % 8
+
+# Saves the state graph in the binary format. States can be given as list of State objects or as PackedStateList
+def save_binary_state_graph(filename, quantities, state_list, state_connections, state_transitions):
+	packed = state_list if isinstance(state_list, PackedStateList) else PackedStateList(quantities)
+	if packed.num_codes > 2**64:
+		raise ValueError("State space of the model is too large for 64 bit state codes")
+	if isinstance(state_list, PackedStateList):
+		codes = array('Q', state_list.codes)
+	else:
+		codes = array('Q', [packed.encode_state(s) for s in state_list])
+
+	if len(codes) >= 2**32 or len(packed.spaces) >= 2**48 or max([len(space) for q_spaces in packed.spaces for space in q_spaces] + [0]) > 0xFF:
+		raise ValueError("Model has too many states, quantities or too large value spaces for the binary format")
+
+	# Group edges by their source state. The transitions are not necessarily ordered by goal state (e.g. states expanded again by
+	# priority exploration), so the edges of a source are sorted by target together with their changes (see find_edge)
+	q_indices = {name: i for i, name in enumerate(packed.quantity_names)}
+	outgoing = [list() for _ in range(len(codes))]
+	for goal_state, connections in state_transitions.items():
+		for source_state, transition in connections.items():
+			outgoing[source_state].append((goal_state, transition))
+	for source_edges in outgoing:
+		source_edges.sort(key=lambda edge: edge[0])
+	offsets = array('Q', [0])
+	targets = array('I')
+	cause_offsets = array('Q', [0])
+	changes = array('Q')
+	for source_edges in outgoing:
+		for goal_state, transition in source_edges:
+			targets.append(goal_state)
+			for q, vals, types in zip(transition.quantities, transition.vals, transition.types):
+				q_index = q_indices[q.name]
+				for slot, (v, typ) in enumerate(zip(vals, types)):
+					if v != Termination.UNCHANGED and slot < len(packed.spaces[q_index]):
+						changes.append((q_index << 16) | (slot << 12) | (packed.value_indices[q_index][slot][v] << 4) | TERMINATION_TYPES.index(typ))
+			cause_offsets.append(len(changes))
+		offsets.append(len(targets))
+
+	model_description = json.dumps({"quantities": packed.quantity_names, "spaces": packed.spaces}).encode("utf-8")
+	with open(filename, "wb") as f:
+		f.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, 0 if sys.byteorder == "little" else 1, len(model_description), len(codes), len(targets), len(changes)))
+		f.write(b"\0" * padding(HEADER_SIZE))
+		f.write(model_description + b"\0" * padding(len(model_description)))
+		for section in [codes, offsets, targets, cause_offsets, changes]:
+			section_bytes = section.tobytes()
+			f.write(section_bytes + b"\0" * padding(len(section_bytes)))
+
+
+#################
+## Reader for binary state graphs. The file is memory-mapped and the sections are accessed as typed memoryviews,
+## so only the parts that are queried are read from disk
+#################
+class BinaryStateGraph:
+
+	def __init__(self, filename):
+		self.file = open(filename, "rb")
+		self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		magic, version, byte_order, description_size, self.num_states, self.num_edges, self.num_changes = struct.unpack_from(HEADER_FORMAT, self.buffer, 0)
+		if magic != MAGIC or version != VERSION:
+			self.close()
+			raise ValueError("File \"" + str(filename) + "\" is not a binary state graph of version " + str(VERSION))
+		if byte_order != (0 if sys.byteorder == "little" else 1):
+			self.close()
+			raise ValueError("Binary state graph was written on a machine with different byte order")
+		position = HEADER_SIZE + padding(HEADER_SIZE)
+		description = json.loads(bytes(self.buffer[position:position+description_size]).decode("utf-8"))
+		position += description_size + padding(description_size)
+		self.quantity_names = description["quantities"]
+		self.spaces = description["spaces"]
+		self.state_decoder = PackedStateList.from_spaces(self.quantity_names, self.spaces)
+		self.views = list()
+		for typecode, length in [('Q', self.num_states), ('Q', self.num_states + 1), ('I', self.num_edges), ('Q', self.num_edges + 1), ('Q', self.num_changes)]:
+			size = length * array(typecode).itemsize
+			self.views.append(memoryview(self.buffer)[position:position+size].cast(typecode))
+			position += size + padding(size)
+		self.codes, self.offsets, self.targets, self.cause_offsets, self.changes = self.views
+
+	def __len__(self):
+		return self.num_states
+
+	# State object of a state (decoded from its code)
+	def get_state(self, s_index):
+		return self.state_decoder.decode(self.codes[s_index])
+
+	# Target states of the outgoing edges of a state
+	def get_successors(self, s_index):
+		return self.targets[self.offsets[s_index]:self.offsets[s_index+1]]
+
+	# Indices of the outgoing edges of a state. Edge indices are used for querying the causes of a transition
+	def get_edge_indices(self, s_index):
+		return range(self.offsets[s_index], self.offsets[s_index+1])
+
+	# Edge index of the transition from source to target, or -1 if there is no such transition
+	def find_edge(self, source, target):
+		start, end = self.offsets[source], self.offsets[source+1]
+		# Targets of a state are sorted, so we can use binary search
+		while start < end:
+			middle = (start + end) // 2
+			if self.targets[middle] < target:
+				start = middle + 1
+			else:
+				end = middle
+		return start if start < self.offsets[source+1] and self.targets[start] == target else -1
+
+	# Changes of a transition as list of (quantity name, value slot, new value, termination type)
+	def get_edge_causes(self, edge_index):
+		causes = list()
+		for change in self.changes[self.cause_offsets[edge_index]:self.cause_offsets[edge_index+1]]:
+			q_index, slot, v_index, t_index = change >> 16, (change >> 12) & 0xF, (change >> 4) & 0xFF, change & 0xF
+			causes.append((self.quantity_names[q_index], VALUE_SLOTS[slot], self.spaces[q_index][slot][v_index], TERMINATION_TYPES[t_index]))
+		return causes
+
+	def close(self):
+		for view in getattr(self, "views", list()):
+			view.release()
+		self.views = list()
+		self.buffer.close()
+		self.file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
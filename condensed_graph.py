@@ -0,0 +1,180 @@
+###########################################
+## Condensed views of large state graphs ##
+###########################################
+
+from visualization import open_output_file, state_to_label
+
+
+#################
+## State graph in which groups of states are merged into single nodes, so that Graphviz can lay out large envisionments.
+## States are merged if they are in the same strongly connected component (cycles of the behaviour) and/or have the same
+## values for selected quantities. If there are still more nodes than max_nodes, the smallest nodes are merged into one summary node
+#################
+class CondensedGraph:
+
+	def __init__(self, state_list, state_connections, collapse_scc=True, group_quantities=None, max_nodes=None):
+		self.state_list = state_list
+		self.group_quantities = group_quantities if group_quantities is not None else list()
+		num_states = len(state_list)
+		successors = get_successor_lists(state_connections, num_states)
+		scc_indices = find_strongly_connected_components(successors)[1] if collapse_scc else list(range(num_states))
+
+		# Nodes are ordered by their first state, so the initial state is always part of the first node
+		node_keys = dict()
+		self.nodes = list()
+		self.node_index = list()
+		for s_index in range(num_states):
+			key = (scc_indices[s_index],)
+			if len(self.group_quantities) > 0:
+				values = state_list[s_index].value_dict
+				key = tuple([values[q_name] for q_name in self.group_quantities]) + (key if collapse_scc else tuple())
+			if key not in node_keys:
+				node_keys[key] = len(self.nodes)
+				self.nodes.append(list())
+			self.nodes[node_keys[key]].append(s_index)
+			self.node_index.append(node_keys[key])
+
+		# Node budget: the largest nodes are kept, all others are merged into a summary node (which counts towards the budget)
+		self.summary_node = None
+		if max_nodes is not None and max_nodes < 1:
+			raise ValueError("The condensed graph needs at least one node, got max_nodes=" + str(max_nodes))
+		if max_nodes is not None and len(self.nodes) > max_nodes:
+			kept = sorted(range(len(self.nodes)), key=lambda n: (-len(self.nodes[n]), n))[:max_nodes-1]
+			kept = sorted(kept)
+			new_indices = {n: i for i, n in enumerate(kept)}
+			summary_states = [s for n in range(len(self.nodes)) if n not in new_indices for s in self.nodes[n]]
+			self.nodes = [self.nodes[n] for n in kept] + [sorted(summary_states)]
+			self.summary_node = len(self.nodes) - 1
+			self.node_index = [new_indices.get(n, self.summary_node) for n in self.node_index]
+
+		# Edges between nodes with the number of transitions they summarize. Transitions inside a node are not shown
+		self.edges = dict()
+		for s_index, s_successors in enumerate(successors):
+			for succ in s_successors:
+				edge = (self.node_index[s_index], self.node_index[succ])
+				if edge[0] != edge[1]:
+					self.edges[edge] = self.edges.get(edge, 0) + 1
+
+	def __len__(self):
+		return len(self.nodes)
+
+	# Values that all states of a node have in common, as dictionary quantity name -> values
+	def get_common_values(self, n_index):
+		states = self.nodes[n_index]
+		common = dict(self.state_list[states[0]].value_dict)
+		for s_index in states[1:]:
+			values = self.state_list[s_index].value_dict
+			for q_name in list(common.keys()):
+				if values[q_name] != common[q_name]:
+					del common[q_name]
+		return common
+
+	def node_to_label(self, n_index):
+		states = self.nodes[n_index]
+		if len(states) == 1:
+			return state_to_label(self.state_list[states[0]], states[0])
+		if n_index == self.summary_node:
+			label = str(len(states)) + " other states\n"
+		else:
+			label = str(len(states)) + " states (" + ", ".join([str(s) for s in states[:5]]) + (", ..." if len(states) > 5 else "") + ")\n"
+		for q_name, val in self.get_common_values(n_index).items():
+			label += q_name + " (" + ",".join(val) + ")\n"
+		return label
+
+	# Writes the condensed graph as dot file. Nodes with several states are drawn in grey, edges are labelled with
+	# the number of transitions if they summarize more than one
+	def save_dot(self, filename, compress=False):
+		with open_output_file(filename, compress) as f:
+			f.write("digraph graphname {\n\trankdir=LR;\n")
+			for n_index in range(len(self.nodes)):
+				style = ", style=filled, color=\"grey\"" if len(self.nodes[n_index]) > 1 else ""
+				f.write("\tn" + str(n_index) + " [shape=box, label=\"" + self.node_to_label(n_index) + "\"" + style + "];\n")
+			for (source, target), count in self.edges.items():
+				f.write("\tn" + str(source) + " -> n" + str(target) + (" [label=\"" + str(count) + "\"]" if count > 1 else "") + ";\n")
+			f.write("}")
+
+	# Writes one dot file per node with several states, showing all its states and the transitions between them.
+	# Filenames are the given filename with the node index appended. Returns the list of written files
+	def save_component_files(self, filename, state_connections, compress=False):
+		base_name, extension = filename.rsplit(".", 1) if "." in filename else (filename, "dot")
+		filenames = list()
+		for n_index, states in enumerate(self.nodes):
+			if len(states) < 2:
+				continue
+			component_filename = base_name + "_component" + str(n_index) + "." + extension
+			save_state_subgraph(component_filename, self.state_list, state_connections, states, compress)
+			filenames.append(component_filename)
+		return filenames
+
+
+# Writes the states with the given indices and the transitions between them as dot file (labels like visualize_state_graph)
+def save_state_subgraph(filename, state_list, state_connections, state_indices, compress=False):
+	included = set(state_indices)
+	with open_output_file(filename, compress) as f:
+		f.write("digraph graphname {\n\trankdir=LR;\n")
+		for i in state_indices:
+			f.write("\ts" + str(i) + " [shape=box, label=\"" + state_to_label(state_list[i], i) + "\"];\n")
+		for i in state_indices:
+			for source in state_connections[i]:
+				if source in included:
+					f.write("\ts" + str(source) + " -> s" + str(i) + ";\n")
+		f.write("}")
+
+# State connections map states to their predecessors. Returns the successors of every state instead
+def get_successor_lists(state_connections, num_states):
+	successors = [list() for _ in range(num_states)]
+	for s_index, sources in state_connections.items():
+		for source in sources:
+			successors[source].append(s_index)
+	return successors
+
+# Tarjan's algorithm without recursion (state graphs can be deeper than the recursion limit).
+# Returns the list of components (lists of states) and the component index of every state
+def find_strongly_connected_components(successors):
+	num_states = len(successors)
+	index = [-1] * num_states
+	lowlink = [0] * num_states
+	on_stack = [False] * num_states
+	stack = list()
+	components = list()
+	component_index = [-1] * num_states
+	counter = 0
+	for root in range(num_states):
+		if index[root] >= 0:
+			continue
+		index[root] = lowlink[root] = counter
+		counter += 1
+		stack.append(root)
+		on_stack[root] = True
+		work = [(root, iter(successors[root]))]
+		while len(work) > 0:
+			s_index, succ_iter = work[-1]
+			descended = False
+			for succ in succ_iter:
+				if index[succ] < 0:
+					index[succ] = lowlink[succ] = counter
+					counter += 1
+					stack.append(succ)
+					on_stack[succ] = True
+					work.append((succ, iter(successors[succ])))
+					descended = True
+					break
+				elif on_stack[succ]:
+					lowlink[s_index] = min(lowlink[s_index], index[succ])
+			if descended:
+				continue
+			work.pop()
+			if len(work) > 0:
+				parent = work[-1][0]
+				lowlink[parent] = min(lowlink[parent], lowlink[s_index])
+			if lowlink[s_index] == index[s_index]:
+				component = list()
+				while True:
+					member = stack.pop()
+					on_stack[member] = False
+					component_index[member] = len(components)
+					component.append(member)
+					if member == s_index:
+						break
+				components.append(sorted(component))
+	return components, component_index
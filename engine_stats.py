@@ -0,0 +1,92 @@
+########################################
+## Statistics of the reasoning engine ##
+########################################
+
+import json
+import time
+
+
+#################
+## Counters and timers for the phases of the reasoner (see QualitativeReasoner.find_next_states). Only created if statistics
+## are requested. Without statistics, the reasoner uses NO_STATISTICS, which records nothing
+#################
+class EngineStatistics:
+
+	# Maximum number of saved frontier sizes. If there are more, every second sample is dropped and the interval doubled
+	MAX_FRONTIER_SAMPLES = 1000
+
+	def __init__(self):
+		self.reset()
+
+	def reset(self):
+		self.counters = dict()
+		self.times = dict()
+		self.calls = dict()
+		# Frontier size over time as list of (number of states, frontier size)
+		self.frontier_samples = list()
+		self.frontier_interval = 1
+		self.max_frontier_size = 0
+
+	def count(self, name, value=1):
+		self.counters[name] = self.counters.get(name, 0) + value
+
+	def add_time(self, name, duration):
+		self.times[name] = self.times.get(name, 0.0) + duration
+		self.calls[name] = self.calls.get(name, 0) + 1
+
+	# Calls a function and adds the time it took to the phase name. Returns the result of the function
+	def timed(self, name, function, *args):
+		start = time.perf_counter()
+		result = function(*args)
+		self.add_time(name, time.perf_counter() - start)
+		return result
+
+	def record_frontier(self, num_states, frontier_size):
+		self.max_frontier_size = max(self.max_frontier_size, frontier_size)
+		if num_states % self.frontier_interval != 0:
+			return
+		self.frontier_samples.append((num_states, frontier_size))
+		if len(self.frontier_samples) > EngineStatistics.MAX_FRONTIER_SAMPLES:
+			self.frontier_interval *= 2
+			self.frontier_samples = [s for s in self.frontier_samples if s[0] % self.frontier_interval == 0]
+
+	# Share of checked transitions that did not lead to a valid state
+	def get_invalid_transition_rate(self):
+		checked = self.counters.get("valid_transitions", 0) + self.counters.get("invalid_transitions", 0)
+		return self.counters.get("invalid_transitions", 0) / checked if checked > 0 else 0.0
+
+	def to_dict(self):
+		return {"counters": dict(self.counters),
+				"times": {name: {"total": t, "calls": self.calls[name]} for name, t in self.times.items()},
+				"invalid_transition_rate": self.get_invalid_transition_rate(),
+				"max_frontier_size": self.max_frontier_size,
+				"frontier_sizes": list(self.frontier_samples)}
+
+	def to_json(self, **kwargs):
+		return json.dumps(self.to_dict(), **kwargs)
+
+	# One line summary for the command line
+	def summary_line(self):
+		phases = ", ".join([name + " %.1f ms" % (1000 * t) for name, t in sorted(self.times.items(), key=lambda item: -item[1])])
+		return "Statistics: " + str(self.counters.get("expanded_states", 0)) + " expanded states, " + \
+			   str(self.counters.get("cross_product_candidates", 0)) + " -> " + str(self.counters.get("cross_product_transitions", 0)) + " transitions after conflict filtering, " + \
+			   "%.1f%% invalid, " % (100 * self.get_invalid_transition_rate()) + \
+			   str(self.counters.get("fixpoint_sweeps", 0)) + " fixpoint sweeps, " + \
+			   str(self.counters.get("state_lookup_hits", 0)) + " state lookup hits, max frontier " + str(self.max_frontier_size) + \
+			   (" | " + phases if len(phases) > 0 else "")
+
+
+#################
+## Statistics that record nothing. Timed functions are called directly, so the phases of the reasoner can be written once
+## for both cases without measuring the time if statistics are not requested
+#################
+class NoStatistics:
+
+	def count(self, name, value=1):
+		pass
+
+	def timed(self, name, function, *args):
+		return function(*args)
+
+
+NO_STATISTICS = NoStatistics()
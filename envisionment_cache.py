@@ -0,0 +1,80 @@
+############################################
+## Persistent cache of simulation results ##
+############################################
+
+from model_diff import ModelDiff
+from contextlib import contextmanager
+import hashlib
+import json
+import sqlite3
+import time
+import zlib
+
+
+#################
+## Saves state graphs (states, connections and transitions) in a SQLite file. Every entry is keyed by a fingerprint of the
+## compiled model and the simulation options. If the model or the options change, the fingerprint changes as well and the
+## state graph is simulated again. Only the most recently used entries are kept in the file. The state graphs are saved as
+## compressed JSON, so that loading a cache file cannot run code
+#################
+class EnvisionmentCache:
+
+	# Increase if the format of the saved data changes. Invalidates all existing entries
+	FORMAT_VERSION = 2
+
+	def __init__(self, filename="envisionment_cache.db", max_entries=16):
+		self.filename = filename
+		self.max_entries = max_entries
+		with self.connect() as connection:
+			connection.execute("CREATE TABLE IF NOT EXISTS envisionments (fingerprint TEXT PRIMARY KEY, num_states INTEGER, num_transitions INTEGER, last_used REAL, data BLOB)")
+
+	# Connection that commits the changes at the end of the with block (or rolls them back on an exception) and is closed afterwards
+	@contextmanager
+	def connect(self):
+		connection = sqlite3.connect(self.filename)
+		try:
+			with connection:
+				yield connection
+		finally:
+			connection.close()
+
+	# Fingerprint of the model (quantities with their spaces and landmarks, and all relations) and the options that change the resulting state graph
+	@staticmethod
+	def get_fingerprint(model, quantities, options):
+		definition = [EnvisionmentCache.FORMAT_VERSION, model.quantity_names]
+		definition.append([ModelDiff.get_quantity_definition(q) for q in quantities])
+		definition.append([ModelDiff.get_landmark_definition(q) for q in quantities])
+		definition.append([[ModelDiff.get_relation_definition(r, model) for r in rels] for rels in model.incoming_relations])
+		definition.append(sorted(options.items()))
+		return hashlib.sha256(repr(definition).encode("utf-8")).hexdigest()
+
+	# Returns the saved data (see QualitativeReasoner.get_state_graph_data) or None if there is no (readable) entry for the fingerprint
+	def load(self, fingerprint):
+		with self.connect() as connection:
+			row = connection.execute("SELECT data FROM envisionments WHERE fingerprint = ?", (fingerprint,)).fetchone()
+			if row is None:
+				return None
+			connection.execute("UPDATE envisionments SET last_used = ? WHERE fingerprint = ?", (time.time(), fingerprint))
+		try:
+			data = json.loads(zlib.decompress(row[0]).decode("utf-8"))
+			# JSON has no tuples, so the values of the states are converted back into tuples
+			data["states"] = [tuple([tuple(values) for values in state]) for state in data["states"]]
+		except (zlib.error, UnicodeDecodeError, ValueError, TypeError, KeyError):
+			return None
+		return data
+
+	def save(self, fingerprint, data):
+		blob = zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+		num_transitions = sum([len(sources) for sources in data["transitions"]])
+		with self.connect() as connection:
+			connection.execute("INSERT OR REPLACE INTO envisionments VALUES (?, ?, ?, ?, ?)", (fingerprint, len(data["states"]), num_transitions, time.time(), sqlite3.Binary(blob)))
+			if self.max_entries is not None:
+				connection.execute("DELETE FROM envisionments WHERE fingerprint NOT IN (SELECT fingerprint FROM envisionments ORDER BY last_used DESC LIMIT ?)", (self.max_entries,))
+
+	def clear(self):
+		with self.connect() as connection:
+			connection.execute("DELETE FROM envisionments")
+
+	def __len__(self):
+		with self.connect() as connection:
+			return connection.execute("SELECT COUNT(*) FROM envisionments").fetchone()[0]
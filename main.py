@@ -2,35 +2,125 @@
 ## Main file to run reasoner ##
 ###############################
 from qreasoner import QualitativeReasoner
+from successor_cache import SuccessorCache
+from envisionment_cache import EnvisionmentCache
+from model_file import load_model
+from output_sinks import SINK_TYPES, DotSink, CondensedDotSink, GraphvizRenderer
+from state_query import parse_state_pattern, check_pattern_quantities
+from behaviors import generate_behaviors, save_behaviors
 from state_graph import create_default_graph, create_extended_graph, set_debugging
 import argparse
-import os 
+import itertools
+import json
 
 parser = argparse.ArgumentParser()
 parser.add_argument("-d","--debug", help="Increases output to all generated transitions and states", action="store_true")
-parser.add_argument("--graph", help="Options for which graph to use. 1: default in the report, 2: bidrectional value constraints, 3: extended graph with height and pressure. Default: 1", type=int, default=1)
+parser.add_argument("--graph", help="Options for which graph to use. 1: default in the report, 2: bidrectional value constraints, 3: extended graph with height and pressure. Default: 1", type=int, default=1, choices=[1, 2, 3])
+parser.add_argument("--model", help="Model file (JSON or TOML, see model_file.py) to use instead of the graph option. Examples are in the folder \"models\".", type=str, default=None)
 parser.add_argument("--all_states", help="Generates all states and not only from initial zero state.", action="store_true")
+parser.add_argument("--vectorized", help="Checks all states in batches with NumPy when generating all states (requires NumPy).", action="store_true")
+parser.add_argument("--workers", help="Number of processes for exploring states in parallel (breadth first). Default: 1", type=int, default=1)
+parser.add_argument("--exploration", help="Order in which new states are explored. Options: dfs (depth first), bfs (breadth first), priority. Default: dfs", type=str, default="dfs", choices=QualitativeReasoner.EXPLORATION_ORDERS)
+parser.add_argument("--target", help="State pattern, e.g. \"Volume=(max,+)\". Exploration stops as soon as a matching state is found and prints the shortest path to it. Default: none", type=str, default=None)
+parser.add_argument("--max_depth", help="States further away from the initial state than this number of transitions are not explored. Default: no limit", type=int, default=None)
+parser.add_argument("--project_dependent", help="Removes quantities whose values are determined by another quantity (e.g. by P+ and value constraints at all landmarks) from the simulated model, and adds them again to the outputs.", action="store_true")
+parser.add_argument("--packed_states", help="Saves explored states, states still to be explored and transitions as compact integer codes. Reduces the memory of the state graph 5-8 times for the example graphs and more than 10 times for larger ones (see benchmark.py).", action="store_true")
+parser.add_argument("--cache_size", help="Size of the cache for the successors of expanded states (number of cached transitions plus one per state). Only helps if states are expanded several times, e.g. by other reasoners or the simulation after behaviors. 0 disables the cache. Default: 0", type=int, default=0)
+parser.add_argument("--envisionment_cache", help="Filename of a cache for the simulated state graphs. If the model and options did not change, the state graph is loaded from this file instead of simulated. Default: no cache", type=str, default=None)
+parser.add_argument("--stats", help="Collects statistics of the phases of the reasoner and prints a summary line.", action="store_true")
+parser.add_argument("--stats_file", help="Filename for saving the statistics as JSON (implies --stats). Default: no file", type=str, default=None)
+parser.add_argument("--outputs", help="Comma separated list of outputs to write. Options: " + ", ".join(SINK_TYPES.keys()) + ". Default: dot,transitions,intra,inter", type=str, default="dot,transitions,intra,inter")
+parser.add_argument("--output_workers", help="Number of threads for writing the outputs concurrently. Default: 1", type=int, default=1)
+parser.add_argument("--condensed_graph", help="Filename for the condensed dot file of output \"condensed\". Default: \"state_graph_condensed.dot\"", type=str, default="state_graph_condensed.dot")
+parser.add_argument("--group_by", help="Comma separated list of quantities. The condensed graph merges states with the same values of these quantities. Default: none", type=str, default="")
+parser.add_argument("--no_scc", help="Does not merge strongly connected components (cycles) in the condensed graph.", action="store_true")
+parser.add_argument("--max_nodes", help="Maximum number of nodes in the condensed graph. Smallest groups of states are merged into a summary node. Default: 200", type=int, default=200)
+parser.add_argument("--component_files", help="Writes one dot file per merged group of states of the condensed graph.", action="store_true")
+parser.add_argument("--render", help="Format to which the dot file is converted by Graphviz in the background (e.g. pdf, png), or \"none\". Default: pdf", type=str, default="pdf")
+parser.add_argument("--render_max_states", help="Graphs with more states are not rendered, instead the Graphviz command is printed. Default: 1000", type=int, default=1000)
+parser.add_argument("--render_wait", help="Waits until Graphviz finished rendering before exiting, without time limit (see --render_timeout).", action="store_true")
+parser.add_argument("--render_timeout", help="Seconds to wait at exit for Graphviz renderings that are still running. Failed renderings are reported, renderings that take longer keep running in the background. Default: 60", type=float, default=60)
+parser.add_argument("--behaviors", help="Filename for a list of behaviors (paths from the initial state to terminal states or cycles). Default: not written", type=str, default=None)
+parser.add_argument("--max_behaviors", help="Maximum number of behaviors that are written. Default: 1000", type=int, default=1000)
+parser.add_argument("--max_behavior_length", help="Behaviors are stopped after this number of transitions. Default: no limit", type=int, default=None)
+parser.add_argument("--sample_behaviors", help="Writes randomly sampled behaviors instead of enumerating them.", action="store_true")
 parser.add_argument("--state_graph", help="Filename for state graph dot file. Default: \"state_graph.dot\"", type=str, default="state_graph.dot")
+parser.add_argument("--binary_graph", help="Filename for the compact binary state graph (see binary_graph.py). Adds the binary output if given. Default: none, the output \"binary\" of --outputs writes \"state_graph.bin\"", type=str, default=None)
+parser.add_argument("--json_graph", help="Filename for the JSON state graph. Default: \"state_graph.json\"", type=str, default="state_graph.json")
 parser.add_argument("--intra_state", help="Filename for intra state description file. Default: \"intra_state_description.txt\"", type=str, default="intra_state_description.txt")
 parser.add_argument("--inter_state", help="Filename for inter state description file. Default: \"inter_state_description.txt\"", type=str, default="inter_state_description.txt")
 parser.add_argument("--state_trans", help="Filename for state transition description file. Default: \"transition_description.txt\"", type=str, default="transition_description.txt")
 
-args = parser.parse_args()
+# Only executed when running this file, not in the worker processes of a parallel exploration
+if __name__ == '__main__':
+	args = parser.parse_args()
+	set_debugging(args.debug)
 
-graph = None
-if args.graph == 1:
-	graph = create_default_graph(bidirectional_vc=False)
-elif args.graph == 2:
-	graph = create_default_graph(bidirectional_vc=True)
-elif args.graph == 3:
-	graph = create_extended_graph()
+	graph = None
+	if args.model is not None:
+		graph = load_model(args.model)
+	elif args.graph == 1:
+		graph = create_default_graph(bidirectional_vc=False)
+	elif args.graph == 2:
+		graph = create_default_graph(bidirectional_vc=True)
+	elif args.graph == 3:
+		graph = create_extended_graph()
 
-set_debugging(args.debug)
+	output_names = [name.strip() for name in args.outputs.split(",") if len(name.strip()) > 0]
+	if args.binary_graph is not None and "binary" not in output_names:
+		output_names.append("binary")
+	for name in output_names:
+		if name not in SINK_TYPES:
+			parser.error("unknown output \"" + name + "\". Options: " + ", ".join(SINK_TYPES.keys()))
+	renderer = GraphvizRenderer(args.render, args.render_max_states, args.render_timeout)
+	output_filenames = {"dot": args.state_graph, "transitions": args.state_trans, "intra": args.intra_state, "inter": args.inter_state,
+						"binary": args.binary_graph if args.binary_graph is not None else "state_graph.bin", "json": args.json_graph}
+	sinks = [SINK_TYPES[name](output_filenames[name]) for name in output_names if name not in ["dot", "condensed"]]
+	if "dot" in output_names:
+		sinks.insert(0, DotSink(args.state_graph, renderer if args.render != "none" else None))
+	if "condensed" in output_names:
+		group_quantities = [q_name.strip() for q_name in args.group_by.split(",") if len(q_name.strip()) > 0]
+		unknown_quantities = [q_name for q_name in group_quantities if q_name not in [q.name for q in graph[1]]]
+		if len(unknown_quantities) > 0:
+			parser.error("unknown quantities in --group_by: " + ", ".join(unknown_quantities))
+		if args.max_nodes < 1:
+			parser.error("--max_nodes has to be at least 1, got " + str(args.max_nodes))
+		sinks.append(CondensedDotSink(args.condensed_graph, collapse_scc=not args.no_scc, group_quantities=group_quantities, max_nodes=args.max_nodes, 
+									  component_files=args.component_files, renderer=renderer if args.render != "none" else None))
 
-reasoner = QualitativeReasoner(graph)
-reasoner.simulate(generate_all_states=args.all_states, 
-				  filename_state_graph=args.state_graph, 
-				  filename_state_transitions=args.state_trans,
-				  filename_intra_state=args.intra_state,
-				  filename_inter_state=args.inter_state)
-os.system("dot -Tpdf " + args.state_graph + " -o " + args.state_graph.rsplit(".",1)[0] + ".pdf")
\ No newline at end of file
+	if args.target is not None:
+		try:
+			check_pattern_quantities(parse_state_pattern(args.target), [q.name for q in graph[1]])
+		except ValueError as e:
+			parser.error(str(e))
+
+	envisionment_cache = EnvisionmentCache(args.envisionment_cache) if args.envisionment_cache is not None else None
+	collect_statistics = args.stats or args.stats_file is not None
+	reasoner = QualitativeReasoner(graph, packed_states=args.packed_states, successor_cache=SuccessorCache(args.cache_size), collect_statistics=collect_statistics, project_dependent=args.project_dependent)
+	if reasoner.projection is not None:
+		print("Dependent quantities: " + ", ".join([q_name + " (determined by " + root + ")" for q_name, root in reasoner.projection.roots.items()]))
+	# Behaviors expand the states they reach themselves, so they are written before the state graph is simulated
+	if args.behaviors is not None:
+		behaviors = generate_behaviors(reasoner, max_length=args.max_behavior_length, sample=args.max_behaviors if args.sample_behaviors else None)
+		num_behaviors = save_behaviors(args.behaviors, itertools.islice(behaviors, args.max_behaviors))
+		print("Saved " + str(num_behaviors) + " behaviors to " + args.behaviors)
+	reasoner.simulate(generate_all_states=args.all_states, 
+					  filename_state_graph=args.state_graph, 
+					  filename_state_transitions=args.state_trans,
+					  filename_intra_state=args.intra_state,
+					  filename_inter_state=args.inter_state,
+					  exploration_order=args.exploration,
+					  vectorized=args.vectorized,
+					  workers=args.workers,
+					  envisionment_cache=envisionment_cache,
+					  sinks=sinks,
+					  output_workers=args.output_workers,
+					  target=args.target,
+					  max_depth=args.max_depth)
+	if collect_statistics:
+		print(reasoner.stats.summary_line())
+		if args.stats_file is not None:
+			with open(args.stats_file, "w") as f:
+				json.dump(reasoner.get_statistics(), f, indent=1)
+	if args.render_wait:
+		renderer.wait()
\ No newline at end of file
@@ -0,0 +1,60 @@
+##############################################
+## Differences between two versions of a model ##
+##############################################
+
+
+#################
+## Compares two compiled models (before and after an edit). Quantities are compared by name, and their relations by the
+## compiled tables of incoming relations. Used for deciding which results of a previous simulation can be reused
+#################
+class ModelDiff:
+
+	def __init__(self, old_model, old_quantities, new_model, new_quantities):
+		old_quants = {q.name: q for q in old_quantities}
+		new_quants = {q.name: q for q in new_quantities}
+		self.added_quantities = [name for name in new_model.quantity_names if name not in old_quants]
+		self.removed_quantities = [name for name in old_model.quantity_names if name not in new_quants]
+		# Quantities whose definition (quantity spaces, landmarks, modelling of 2nd order derivative, exogenous) changed.
+		# Landmarks decide which states are valid and which terminations exist, so they change the state space as well
+		self.changed_quantities = [name for name in new_model.quantity_names if name in old_quants and \
+								   (ModelDiff.get_quantity_definition(old_quants[name]) != ModelDiff.get_quantity_definition(new_quants[name]) or \
+									ModelDiff.get_landmark_definition(old_quants[name]) != ModelDiff.get_landmark_definition(new_quants[name]))]
+		self.same_order = old_model.quantity_names == new_model.quantity_names
+		# Quantities whose incoming relations changed (added, removed or modified relations)
+		self.affected_quantities = list()
+		for name in new_model.quantity_names:
+			if name not in old_quants:
+				continue
+			old_rels = [ModelDiff.get_relation_definition(r, old_model) for r in old_model.incoming_relations[old_model.get_index(name)]]
+			new_rels = [ModelDiff.get_relation_definition(r, new_model) for r in new_model.incoming_relations[new_model.get_index(name)]]
+			if old_rels != new_rels:
+				self.affected_quantities.append(name)
+
+	# States of the old model are states of the new model as well, if the quantities are the same (and in the same order)
+	def same_state_space(self):
+		return self.same_order and len(self.added_quantities) == 0 and len(self.removed_quantities) == 0 and len(self.changed_quantities) == 0
+
+	def is_empty(self):
+		return self.same_state_space() and len(self.affected_quantities) == 0
+
+	def to_string(self):
+		s = ""
+		for title, names in [("Added quantities", self.added_quantities), ("Removed quantities", self.removed_quantities), 
+							 ("Changed quantities", self.changed_quantities), ("Quantities with changed relations", self.affected_quantities)]:
+			if len(names) > 0:
+				s += title + ": " + ", ".join(names) + "\n"
+		return s
+
+	@staticmethod
+	def get_quantity_definition(q):
+		return (tuple(q.magn_space), tuple(q.deriv_space), tuple(q.deriv_2nd_space), q.model_2nd_derivative, q.exogenous)
+
+	# Which values of the quantity spaces are landmarks for the quantity
+	@staticmethod
+	def get_landmark_definition(q):
+		return tuple([q.is_landmark_value(v) for v in q.magn_space + q.deriv_space + q.deriv_2nd_space])
+
+	# Relation entry of the compiled model with the name of the source quantity instead of its index
+	@staticmethod
+	def get_relation_definition(rel_entry, model):
+		return (rel_entry[0], model.quantity_names[rel_entry[1]]) + tuple(rel_entry[2:])
@@ -0,0 +1,212 @@
+#########################################
+## Loading models from JSON/TOML files ##
+#########################################
+
+from state_graph import Entity, Quantity, Relationship
+from tracing import WARNINGS
+import tracing
+import json
+import os
+
+# TOML is only part of the standard library since Python 3.11. JSON files can be used without it
+try:
+	import tomllib
+except ImportError:
+	tomllib = None
+
+# Relation types in model files, written as in the output of Relationship.to_string
+RELATION_TYPES = {
+	"P+": (Relationship.PROPORTIONAL, True),
+	"P-": (Relationship.PROPORTIONAL, False),
+	"I+": (Relationship.INFLUENCE, True),
+	"I-": (Relationship.INFLUENCE, False),
+	"VC": (Relationship.VALUE_EQ, True)
+}
+
+# Increase if the format of the compiled files changes. Older compiled files are then created again
+COMPILED_FORMAT_VERSION = 3
+
+#################
+## Model file format (JSON or TOML with the same structure):
+## {
+##   "landmarks": {"max": true, "+": false},     (optional, landmark information of the values of this model's quantities)
+##   "entities": ["Tab", "Container"],
+##   "quantities": [{"name": "Inflow", "entity": "Tab", "magn_space": ["0", "+"], "deriv_space": ["-", "0", "+"],
+##                   "deriv_2nd_space": ["-", "0", "+"], "model_2nd_derivative": false, "exogenous": true}, ...],
+##   "relations": [{"type": "I+", "q1": "Inflow", "q2": "Volume"},
+##                 {"type": "VC", "q1": "Volume", "q2": "Outflow", "values": ["max", "max"]}, ...]
+## }
+## Only name and entity are required for a quantity, the other fields have the defaults of the Quantity class.
+## The order of the quantities in the file is the order of the quantities in the model
+#################
+
+# Loads a model file and returns it as graph (entities, quantities, relations) like create_default_graph.
+# The checked model is saved in a compiled file next to the model file (flat tuples of names and indices, see compile_model_description,
+# saved as JSON so that loading it cannot run code).
+# As long as the model file does not change, later calls load the compiled file instead of parsing and checking the model again
+def load_model(filename, use_compiled=True):
+	compiled_filename = get_compiled_filename(filename)
+	stamp = get_file_stamp(filename)
+	compiled = load_compiled_model(compiled_filename, stamp) if use_compiled else None
+	if compiled is None:
+		compiled = compile_model_description(read_model_description(filename))
+		if use_compiled:
+			try:
+				with open(compiled_filename, "w") as f:
+					json.dump([COMPILED_FORMAT_VERSION, stamp, compiled], f)
+			except OSError:
+				WARNINGS.emit(tracing.WARNING, "Warning: could not save compiled model to \"%s\"", compiled_filename)
+	return create_graph_from_compiled(compiled)
+
+def get_compiled_filename(filename):
+	return filename + ".compiled"
+
+# Modification time and size of a file. Compiled files are only used if the stamp of the model file is unchanged
+def get_file_stamp(filename):
+	stat = os.stat(filename)
+	return (stat.st_mtime_ns, stat.st_size)
+
+# Returns the compiled model from a compiled file, or None if it does not exist or belongs to another version of the model file
+def load_compiled_model(compiled_filename, stamp):
+	if not os.path.isfile(compiled_filename):
+		return None
+	try:
+		with open(compiled_filename, "r") as f:
+			version, compiled_stamp, compiled = json.load(f)
+	except (OSError, ValueError, TypeError):
+		return None
+	if version != COMPILED_FORMAT_VERSION or not isinstance(compiled_stamp, list) or tuple(compiled_stamp) != tuple(stamp):
+		return None
+	return to_tuples(compiled)
+
+# JSON has no tuples, so the lists of a loaded compiled model are converted back into tuples
+def to_tuples(value):
+	if isinstance(value, list):
+		return tuple([to_tuples(v) for v in value])
+	return value
+
+def read_model_description(filename):
+	if filename.endswith(".toml"):
+		if tomllib is None:
+			raise ValueError("Reading TOML model files requires Python 3.11 or newer. Please use a JSON model file instead")
+		with open(filename, "rb") as f:
+			return tomllib.load(f)
+	with open(filename, "r") as f:
+		return json.load(f)
+
+# Checks a parsed model file and converts it into flat tuples: (landmarks, entity names, quantities, relations).
+# Quantities are (name, entity index, magnitude space, derivative space, 2nd order derivative space, model 2nd derivative, exogenous),
+# relations (relation option, index of q1, index of q2, positive, additional parameters).
+# Missing or malformed fields raise a ValueError naming the field and the quantity or relation
+def compile_model_description(description):
+	entity_names = tuple(get_string_list(get_required_field(description, "entities", "model"), "entities", "model"))
+	landmarks = tuple(get_landmarks(description.get("landmarks", dict())).items())
+	check_unique_names(entity_names, "entity")
+	entity_indices = {name: i for i, name in enumerate(entity_names)}
+	default_quantity = Quantity(name=None)
+	quantities = list()
+	for i, q_desc in enumerate(get_required_field(description, "quantities", "model")):
+		name = get_required_field(q_desc, "name", "quantity " + str(i + 1))
+		q_label = "quantity \"" + str(name) + "\""
+		entity = get_required_field(q_desc, "entity", q_label)
+		if entity not in entity_indices:
+			raise ValueError("Unknown entity \"" + str(entity) + "\" of " + q_label)
+		quantities.append((name, entity_indices[entity],
+						   tuple(get_string_list(q_desc.get("magn_space", default_quantity.magn_space), "magn_space", q_label)),
+						   tuple(get_string_list(q_desc.get("deriv_space", default_quantity.deriv_space), "deriv_space", q_label)),
+						   tuple(get_string_list(q_desc.get("deriv_2nd_space", default_quantity.deriv_2nd_space), "deriv_2nd_space", q_label)),
+						   get_bool_field(q_desc, "model_2nd_derivative", True, q_label), get_bool_field(q_desc, "exogenous", False, q_label)))
+	check_unique_names([q[0] for q in quantities], "quantity")
+	quantity_indices = {q[0]: i for i, q in enumerate(quantities)}
+	relations = list()
+	for i, r_desc in enumerate(description.get("relations", list())):
+		r_label = "relation " + str(i + 1)
+		r_type = get_required_field(r_desc, "type", r_label)
+		if r_type not in RELATION_TYPES:
+			raise ValueError("Unknown relation type \"" + str(r_type) + "\" of " + r_label + ". Options: " + ", ".join(RELATION_TYPES.keys()))
+		r_label += " (" + r_type + ")"
+		q_names = [get_required_field(r_desc, field, r_label) for field in ["q1", "q2"]]
+		for q_name in q_names:
+			if q_name not in quantity_indices:
+				raise ValueError("Unknown quantity \"" + str(q_name) + "\" in " + r_label)
+		rel_opt, positive = RELATION_TYPES[r_type]
+		add_params = tuple(get_string_list(get_required_field(r_desc, "values", r_label), "values", r_label)) if rel_opt == Relationship.VALUE_EQ else None
+		relations.append((rel_opt, quantity_indices[q_names[0]], quantity_indices[q_names[1]], positive, add_params))
+	return landmarks, entity_names, tuple(quantities), tuple(relations)
+
+# Field of an entry in a model file (the model, a quantity or a relation) that has to be given
+def get_required_field(desc, field, label):
+	if not isinstance(desc, dict):
+		raise ValueError("Expected an object for " + label + ", got " + json.dumps(desc, default=str))
+	if field not in desc:
+		raise ValueError("Missing field \"" + field + "\" of " + label)
+	return desc[field]
+
+# Checks that a field of a model file (e.g. a quantity space) is a list of strings
+def get_string_list(value, field, label):
+	if not isinstance(value, list) or not all([isinstance(v, str) for v in value]):
+		raise ValueError("Field \"" + field + "\" of " + label + " has to be a list of strings, got " + json.dumps(value, default=str))
+	return value
+
+# Checks that an optional field of a model file is true or false. Strings like "false" are not accepted, as they would count as true
+def get_bool_field(desc, field, default, label):
+	value = desc.get(field, default)
+	if not isinstance(value, bool):
+		raise ValueError("Field \"" + field + "\" of " + label + " has to be true or false, got " + json.dumps(value, default=str))
+	return value
+
+# Checks that the landmarks of a model file are an object from value names to true or false
+def get_landmarks(value):
+	if not isinstance(value, dict) or not all([isinstance(v, bool) for v in value.values()]):
+		raise ValueError("Field \"landmarks\" of model has to be an object from values to true or false, got " + json.dumps(value, default=str))
+	return value
+
+# Entities and quantities are referred to by their names, so names must not be given twice
+def check_unique_names(names, kind):
+	seen = set()
+	for name in names:
+		if name in seen:
+			raise ValueError("Duplicate " + kind + " name \"" + str(name) + "\"")
+		seen.add(name)
+
+# Creates entities, quantities and relations from a compiled model. Landmarks are saved in the quantities of the model, so that they
+# do not change the landmark information of other models
+def create_graph_from_compiled(compiled):
+	landmarks, entity_names, quantity_defs, relation_defs = compiled
+	landmarks = dict(landmarks) if len(landmarks) > 0 else None
+	entities = [Entity(name=name) for name in entity_names]
+	quantities = list()
+	for name, e_index, magn_space, deriv_space, deriv_2nd_space, model_2nd_derivative, exogenous in quantity_defs:
+		q = Quantity(name=name, magn_space=list(magn_space), deriv_space=list(deriv_space), deriv_2nd_space=list(deriv_2nd_space),
+					 model_2nd_derivative=model_2nd_derivative, exogenous=exogenous, landmarks=landmarks)
+		entities[e_index].add_quantity(q)
+		quantities.append(q)
+	relations = [Relationship(rel_opt=rel_opt, q1=quantities[q1_index], q2=quantities[q2_index], positive=positive, add_params=add_params, verbose=False) \
+				 for rel_opt, q1_index, q2_index, positive, add_params in relation_defs]
+	return entities, quantities, relations
+
+# Saves a graph (entities, quantities, relations) as JSON model file
+def save_model(filename, graph):
+	entities, quantities, relations = graph
+	q_entities = {q.name: e.name for e in entities for q in e.quantities}
+	description = {"entities": [e.name for e in entities], "quantities": list(), "relations": list()}
+	for q in quantities:
+		description["quantities"].append({"name": q.name, "entity": q_entities[q.name], "magn_space": q.magn_space, "deriv_space": q.deriv_space,
+										  "deriv_2nd_space": q.deriv_2nd_space, "model_2nd_derivative": q.model_2nd_derivative, "exogenous": q.exogenous})
+	for r in relations:
+		r_desc = {"type": r.to_string() if r.rel_opt != Relationship.VALUE_EQ else "VC", "q1": r.q1.name, "q2": r.q2.name}
+		if r.rel_opt == Relationship.VALUE_EQ:
+			r_desc["values"] = list(r.add_params)
+		description["relations"].append(r_desc)
+	# One entity, quantity or relation per line to keep the files readable
+	lines = list()
+	landmarks = dict()
+	for q in quantities:
+		if q.landmarks is not None:
+			landmarks.update(q.landmarks)
+	if len(landmarks) > 0:
+		lines.append("\t\"landmarks\": " + json.dumps(landmarks))
+	for key, entries in description.items():
+		lines.append("\t\"" + key + "\": [\n" + ",\n".join(["\t\t" + json.dumps(entry) for entry in entries]) + "\n\t]")
+	with open(filename, "w") as f:
+		f.write("{\n" + ",\n".join(lines) + "\n}\n")
@@ -0,0 +1,226 @@
+###################################################
+## Projection of dependent quantities of a model ##
+###################################################
+
+from state_graph import Entity, Relationship, State, Termination
+from collections.abc import Mapping
+from copy import copy
+
+
+#################
+## Finds quantities whose values are a function of another quantity, and creates a reduced model without them.
+## A quantity D is dependent on a quantity S if it is not exogenous, its only proportional or influence relation is P+ from S,
+## it has the same quantity spaces as S, and value constraints between S and D tie every magnitude of S to the same magnitude of D
+## (e.g. Height and Pressure in the extended graph, which have bidirectional value constraints at zero and max).
+## In every valid state, D then has exactly the values of S, as its derivatives only have the one influence of S.
+## Chains of dependent quantities are followed to their root, the first quantity that is not dependent.
+## In the reduced model, all other relations of a dependent quantity are moved to its root. Quantities are only projected
+## if this does not create a relation of the root with itself (e.g. a dependent quantity influencing its own root) or a second
+## influence/proportional relation between the same quantities, and if the derivative of the root is not set by proportional relations.
+## Without these restrictions, the order in which the engine resolves the values of a transition can differ from the full model
+#################
+class ModelProjection:
+
+	# Termination types of a root that dependent quantities have as well (see expand_termination)
+	DEPENDENT_TERMINATIONS = [Termination.EPSILON, Termination.VALUE]
+	# Order in which the terminations are combined to a transition
+	TERMINATION_ORDER = {Termination.EPSILON: 0, Termination.VALUE: 1, Termination.EXOGENOUS: 2, Termination.AMBIGUOUS: 3}
+
+	def __init__(self, entities, quantities, relations):
+		self.entities = entities
+		self.quantities = quantities
+		self.relations = relations
+		# Dependent quantity name -> name of its root quantity
+		self.roots = dict()
+		self.reduced_relations = list()
+		# Quantities closer to the start of a chain are projected first, so that the end of a chain stays in the model if the
+		# chain cannot be projected completely
+		sources = {q.name: self.get_source(q) for q in quantities}
+		chain_lengths = {q.name: ModelProjection.get_chain_length(q.name, sources) for q in quantities}
+		for q in sorted([q for q in quantities if sources[q.name] is not None], key=lambda q: chain_lengths[q.name]):
+			source = sources[q.name]
+			root = self.roots.get(source.name, source.name)
+			if root == q.name or not self.is_root_candidate(root):
+				continue
+			roots = {name: (root if r == q.name else r) for name, r in self.roots.items()}
+			roots[q.name] = root
+			reduced_relations = ModelProjection.move_relations(relations, roots)
+			if reduced_relations is not None:
+				self.roots = roots
+				self.reduced_relations = reduced_relations
+		if len(self.roots) == 0:
+			self.reduced_relations = [(rel.rel_opt, rel.q1.name, rel.q2.name, rel.positive, rel.add_params) for rel in relations]
+		self.quantity_index = {q.name: i for i, q in enumerate(quantities)}
+		# For every root, the original quantities that are reconstructed from it (in the order of the quantities)
+		self.dependents = dict()
+		for q in quantities:
+			if q.name in self.roots:
+				self.dependents.setdefault(self.roots[q.name], list()).append(q)
+
+	def has_dependents(self):
+		return len(self.roots) > 0
+
+	# Returns the quantity on which q is dependent, or None if q is not dependent
+	def get_source(self, q):
+		if q.exogenous:
+			return None
+		causal = [rel for rel in q.relations if rel.q2.name == q.name and rel.q1.name != q.name and rel.rel_opt != Relationship.VALUE_EQ]
+		if len(causal) != 1 or causal[0].rel_opt != Relationship.PROPORTIONAL or not causal[0].positive:
+			return None
+		s = causal[0].q1
+		if s.magn_space != q.magn_space or s.deriv_space != q.deriv_space or s.deriv_2nd_space != q.deriv_2nd_space or \
+		   s.model_2nd_derivative != q.model_2nd_derivative or \
+		   any([s.is_landmark_value(v) != q.is_landmark_value(v) for v in s.magn_space + s.deriv_space + s.deriv_2nd_space]):
+			return None
+		# Magnitudes of q that are allowed by the value constraints between s and q, for every magnitude of s
+		constraints = [rel for rel in q.relations if rel.rel_opt == Relationship.VALUE_EQ and set([rel.q1.name, rel.q2.name]) == set([s.name, q.name])]
+		for s_val in s.magn_space:
+			allowed = list()
+			for q_val in q.magn_space:
+				values = {s.name: s_val, q.name: q_val}
+				if all(values[rel.q1.name] != rel.add_params[0] or values[rel.q2.name] == rel.add_params[1] for rel in constraints):
+					allowed.append(q_val)
+			if allowed != [s_val]:
+				return None
+		return s
+
+	# The derivative of a root may only be determined by influences, not by proportional relations
+	def is_root_candidate(self, q_name):
+		return all(rel.rel_opt != Relationship.PROPORTIONAL for rel in self.relations if rel.q2.name == q_name and rel.q1.name != q_name)
+
+	# Number of dependent quantities from the start of the chain to the quantity. Cycles of proportional relations are cut
+	@staticmethod
+	def get_chain_length(q_name, sources):
+		length = 0
+		visited = set()
+		while sources[q_name] is not None and q_name not in visited:
+			visited.add(q_name)
+			q_name = sources[q_name].name
+			length += 1
+		return length
+
+	# Moves all relations of dependent quantities to their roots. Returns a list of (relation option, q1 name, q2 name, positive,
+	# additional parameters), or None if a root would get a relation with itself that cannot be removed
+	@staticmethod
+	def move_relations(relations, roots):
+		reduced_relations = list()
+		causal_pairs = set()
+		for rel in relations:
+			q1_name = roots.get(rel.q1.name, rel.q1.name)
+			q2_name = roots.get(rel.q2.name, rel.q2.name)
+			if q1_name != q2_name:
+				if rel.rel_opt != Relationship.VALUE_EQ:
+					if (q1_name, q2_name) in causal_pairs:
+						return None
+					causal_pairs.add((q1_name, q2_name))
+				reduced_relations.append((rel.rel_opt, q1_name, q2_name, rel.positive, rel.add_params))
+			elif rel.rel_opt == Relationship.PROPORTIONAL and rel.positive and rel.q2.name in roots:
+				# Relation that makes the quantity dependent
+				continue
+			elif rel.rel_opt != Relationship.VALUE_EQ or rel.add_params[0] != rel.add_params[1]:
+				return None
+		return reduced_relations
+
+	# Creates the reduced model (entities, quantities, relations) with new objects. The original model is not changed
+	def create_reduced_graph(self):
+		quantities = list()
+		quantity_copies = dict()
+		for q in self.quantities:
+			if q.name in self.roots:
+				continue
+			q_copy = copy(q)
+			q_copy.relations = list()
+			q_copy.incoming_relations = None
+			quantities.append(q_copy)
+			quantity_copies[q.name] = q_copy
+		entities = list()
+		for e in self.entities:
+			e_copy = Entity(e.name)
+			for q in e.quantities:
+				if q.name in quantity_copies:
+					e_copy.add_quantity(quantity_copies[q.name])
+			entities.append(e_copy)
+		relations = [Relationship(rel_opt, quantity_copies[q1_name], quantity_copies[q2_name], positive, add_params, verbose=False)
+					 for rel_opt, q1_name, q2_name, positive, add_params in self.reduced_relations]
+		return entities, quantities, relations
+
+	# Values of all original quantities from the values of the reduced model (quantity name -> tuple of values)
+	def expand_value_dict(self, value_dict):
+		return {q.name: value_dict[self.roots.get(q.name, q.name)] for q in self.quantities}
+
+	def expand_state(self, state):
+		return State.from_value_dict(self.expand_value_dict(state.value_dict))
+
+	# Adds the changes of dependent quantities to a transition of the reduced model, as the full model would have created them.
+	# A dependent quantity has the values and landmarks of its root in the source and the next state, so it has the same epsilon
+	# and value terminations. Changes of the root by exogenous and ambiguous terminations are only followed by the dependent
+	# quantity because of its P+ relation (not by a termination of its own), so they are not part of the transition of the full model.
+	# The quantities of the transition hold the values of the source state, which are copied to the dependent quantities
+	def expand_termination(self, t):
+		changes = list(zip(t.quantities, t.vals, t.types))
+		for q, q_vals, q_types in zip(t.quantities, t.vals, t.types):
+			for dependent in self.dependents.get(q.name, list()):
+				d_vals = [v if typ in ModelProjection.DEPENDENT_TERMINATIONS else Termination.UNCHANGED for v, typ in zip(q_vals, q_types)]
+				if all([v == Termination.UNCHANGED for v in d_vals]):
+					continue
+				d = copy(dependent)
+				d.set_value(q.magnitude, q.derivative, q.derivative_2nd)
+				changes.append((d, d_vals, [typ if v != Termination.UNCHANGED else None for v, typ in zip(d_vals, q_types)]))
+		# Order of the full model: quantities with epsilon terminations first, then in the order of their value, exogenous and
+		# ambiguous terminations (see QualitativeReasoner.create_cross_product), each in the order of the quantities of the model
+		changes.sort(key=lambda change: (min([ModelProjection.TERMINATION_ORDER.get(typ, 4) for typ in change[2] if typ is not None] + [4]), self.quantity_index[change[0].name]))
+		return Termination([c[0] for c in changes], [c[1][:] for c in changes], [c[2][:] for c in changes])
+	# Parsed state pattern (see state_query.py) of the original quantities as pattern of the reduced model
+	def project_conditions(self, conditions):
+		return tuple([(self.roots.get(q_name, q_name), v_index, v) for q_name, v_index, v in conditions])
+
+
+#################
+## State list of the reduced model that returns the states with the values of all original quantities.
+## States are expanded when they are accessed, so the state graph is only saved with the independent quantities
+#################
+class ProjectedStateList:
+
+	def __init__(self, state_list, projection):
+		self.state_list = state_list
+		self.projection = projection
+
+	def __len__(self):
+		return len(self.state_list)
+
+	def __getitem__(self, index):
+		return self.projection.expand_state(self.state_list[index])
+
+	def __iter__(self):
+		for s in self.state_list:
+			yield self.projection.expand_state(s)
+
+# Transitions of the reduced model (target state -> source state -> transition), expanded when they are accessed
+class ProjectedTransitions(Mapping):
+
+	def __init__(self, state_transitions, projection):
+		self.state_transitions = state_transitions
+		self.projection = projection
+
+	def __getitem__(self, goal_state):
+		return {source: self.projection.expand_termination(t) for source, t in self.state_transitions[goal_state].items()}
+
+	def __iter__(self):
+		return iter(self.state_transitions)
+
+	def __len__(self):
+		return len(self.state_transitions)
+
+
+#################
+## State graph of a reasoner that simulated a reduced model, with the states, transitions, quantities and relations of the
+## original model. Has the same attributes as the reasoner that are used by the output sinks (see output_sinks.py)
+#################
+class ProjectedStateGraph:
+
+	def __init__(self, reasoner, projection):
+		self.quantities = projection.quantities
+		self.relations = projection.relations
+		self.state_list = ProjectedStateList(reasoner.state_list, projection)
+		self.state_connections = reasoner.state_connections
+		self.state_transitions = ProjectedTransitions(reasoner.state_transitions, projection)
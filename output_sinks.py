@@ -0,0 +1,174 @@
+#########################################
+## Output sinks for simulation results ##
+#########################################
+
+from visualization import visualize_state_graph, save_transitions, save_intra_state_trace, save_inter_state_trace, save_json_state_graph
+from binary_graph import save_binary_state_graph
+from condensed_graph import CondensedGraph
+from tracing import WARNINGS
+from concurrent.futures import ThreadPoolExecutor
+from abc import ABC, abstractmethod
+import atexit
+import subprocess
+import time
+import tracing
+
+
+#################
+## Output sink writing one file of the simulation results. Every sink type has a name which is used to select it (e.g. from the CLI)
+#################
+class OutputSink(ABC):
+
+	NAME = None
+
+	def __init__(self, filename):
+		self.filename = filename
+
+	# Writes the state graph of a reasoner after simulating
+	@abstractmethod
+	def write(self, reasoner):
+		pass
+
+
+# Graphviz dot file of the state graph. If a renderer is given, the dot file is converted after writing (see GraphvizRenderer)
+class DotSink(OutputSink):
+
+	NAME = "dot"
+
+	def __init__(self, filename, renderer=None):
+		OutputSink.__init__(self, filename)
+		self.renderer = renderer
+
+	def write(self, reasoner):
+		visualize_state_graph(self.filename, reasoner.state_list, reasoner.state_connections)
+		if self.renderer is not None:
+			self.renderer.render(self.filename, len(reasoner.state_list))
+
+class TransitionsSink(OutputSink):
+
+	NAME = "transitions"
+
+	def write(self, reasoner):
+		save_transitions(self.filename, reasoner.state_list, reasoner.state_connections, reasoner.state_transitions)
+
+class IntraStateSink(OutputSink):
+
+	NAME = "intra"
+
+	def write(self, reasoner):
+		save_intra_state_trace(self.filename, reasoner.relations, reasoner.state_list)
+
+class InterStateSink(OutputSink):
+
+	NAME = "inter"
+
+	def write(self, reasoner):
+		save_inter_state_trace(self.filename, reasoner.state_list, reasoner.state_connections, reasoner.state_transitions)
+
+class BinarySink(OutputSink):
+
+	NAME = "binary"
+
+	def write(self, reasoner):
+		save_binary_state_graph(self.filename, reasoner.quantities, reasoner.state_list, reasoner.state_connections, reasoner.state_transitions)
+
+class JsonSink(OutputSink):
+
+	NAME = "json"
+
+	def write(self, reasoner):
+		save_json_state_graph(self.filename, reasoner.state_list, reasoner.state_connections, reasoner.state_transitions)
+
+# Condensed dot file for large state graphs (see CondensedGraph). Optionally writes one dot file per merged group of states.
+# If a renderer is given, the condensed graph is rendered, as long as it has not more nodes than the renderer allows states
+class CondensedDotSink(OutputSink):
+
+	NAME = "condensed"
+
+	def __init__(self, filename, collapse_scc=True, group_quantities=None, max_nodes=200, component_files=False, renderer=None):
+		OutputSink.__init__(self, filename)
+		self.collapse_scc = collapse_scc
+		self.group_quantities = group_quantities
+		self.max_nodes = max_nodes
+		self.component_files = component_files
+		self.renderer = renderer
+
+	def write(self, reasoner):
+		condensed = CondensedGraph(reasoner.state_list, reasoner.state_connections, self.collapse_scc, self.group_quantities, self.max_nodes)
+		condensed.save_dot(self.filename)
+		if self.component_files:
+			condensed.save_component_files(self.filename, reasoner.state_connections)
+		if self.renderer is not None:
+			self.renderer.render(self.filename, len(condensed))
+
+SINK_TYPES = {sink_type.NAME: sink_type for sink_type in [DotSink, TransitionsSink, IntraStateSink, InterStateSink, BinarySink, JsonSink, CondensedDotSink]}
+
+# Writes all sinks. With more than one worker, the sinks are written concurrently in a thread pool.
+# Sinks only read the state graph, so they can share it between threads
+def write_outputs(sinks, reasoner, workers=1):
+	if workers > 1 and len(sinks) > 1:
+		with ThreadPoolExecutor(max_workers=workers) as executor:
+			# Iterating over the results raises exceptions of the sinks
+			list(executor.map(lambda sink: sink.write(reasoner), sinks))
+	else:
+		for sink in sinks:
+			sink.write(reasoner)
+
+
+#################
+## Converts dot files with Graphviz in a subprocess that runs in the background. Graphs with more than max_states states
+## are not rendered, as Graphviz would take very long for them. Instead, the command is printed so that it can be run later.
+## Renderings that are still running when the program exits are waited for up to exit_timeout seconds (None for no limit),
+## so that failures are reported
+#################
+class GraphvizRenderer:
+
+	def __init__(self, output_format="pdf", max_states=1000, exit_timeout=60):
+		self.output_format = output_format
+		self.max_states = max_states
+		self.exit_timeout = exit_timeout
+		self.processes = list()
+		self.wait_at_exit = False
+
+	def get_command(self, dot_filename):
+		return ["dot", "-T" + self.output_format, dot_filename, "-o", dot_filename.rsplit(".", 1)[0] + "." + self.output_format]
+
+	# Starts rendering a dot file without waiting for it. Returns the process, or None if rendering is skipped
+	def render(self, dot_filename, num_states):
+		command = self.get_command(dot_filename)
+		if dot_filename.endswith(".gz"):
+			WARNINGS.emit(tracing.WARNING, "Warning: Graphviz cannot read compressed dot files, skipped rendering of \"%s\"", dot_filename)
+			return None
+		if self.max_states is not None and num_states > self.max_states:
+			WARNINGS.emit(tracing.INFO, "State graph has %d states (more than %d), skipped rendering. Run \"%s\" to render it", num_states, self.max_states, " ".join(command))
+			return None
+		try:
+			process = subprocess.Popen(command)
+		except OSError:
+			WARNINGS.emit(tracing.WARNING, "Warning: could not run Graphviz (\"dot\"). Is it installed?")
+			return None
+		self.processes.append(process)
+		if not self.wait_at_exit:
+			atexit.register(self.wait, self.exit_timeout)
+			self.wait_at_exit = True
+		return process
+
+	# Waits for all started renderings, at most timeout seconds in total (None for no limit). Renderings that did not finish in time
+	# keep running and are waited for by the next call. Returns True if all of them finished successfully
+	def wait(self, timeout=None):
+		success = True
+		deadline = time.time() + timeout if timeout is not None else None
+		running = list()
+		for process in self.processes:
+			try:
+				exit_code = process.wait(timeout=max(deadline - time.time(), 0) if deadline is not None else None)
+			except subprocess.TimeoutExpired:
+				WARNINGS.emit(tracing.WARNING, "Warning: Graphviz did not finish within %d seconds, still running \"%s\"", timeout, " ".join(process.args))
+				running.append(process)
+				success = False
+				continue
+			if exit_code != 0:
+				WARNINGS.emit(tracing.WARNING, "Warning: Graphviz failed with exit code %d for command \"%s\"", exit_code, " ".join(process.args))
+				success = False
+		self.processes = running
+		return success
@@ -2,125 +2,628 @@
 ## Main file for reasoning engine ##
 ####################################
 
-from state_graph import Entity, Quantity, Relationship, State, Termination, create_default_graph, debugging_active
-from visualization import visualize_state_graph, save_transitions, save_intra_state_trace, save_inter_state_trace
+from state_graph import Entity, Quantity, Relationship, State, Termination, CompiledModel, create_default_graph
+from state_store import PackedStateList, PackedTransitions, PackedConnections, QuantityCodec
+from output_sinks import DotSink, TransitionsSink, IntraStateSink, InterStateSink, BinarySink, write_outputs
+from vectorized_checks import VectorizedValidityChecker, numpy_available
+from successor_cache import SuccessorCache
+from model_diff import ModelDiff
+from envisionment_cache import EnvisionmentCache
+from engine_stats import EngineStatistics, NO_STATISTICS
+from model_projection import ModelProjection, ProjectedStateGraph
+from state_query import StateGraphQuery, parse_state_pattern, check_pattern_quantities, count_unmatched, state_matches
+import tracing
+from tracing import STATE_ADDED, TRANSITION_ACCEPTED, TRANSITION_REJECTED, PROGRESS, WARNINGS, MESSAGES
 from copy import copy
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import heapq
 import sys 
 
 
+################
+## Frontier of states that still have to be expanded. Replaces the recursion between add_to_state_list and find_next_states
+## Entries are (state index, depth, quantities), with the quantities encoded as integer (see QuantityCodec) for packed states. The order in which the entries are popped depends on the exploration order
+################
+class StateFrontier:
+
+	def __init__(self, exploration_order, priority_function=None, state_list=None):
+		self.exploration_order = exploration_order
+		self.priority_function = priority_function
+		self.state_list = state_list
+		self.entries = list() if exploration_order != QualitativeReasoner.BREADTH_FIRST else deque()
+		self.counter = 0
+
+	def push(self, s_index, depth, quantities):
+		if self.exploration_order == QualitativeReasoner.PRIORITY:
+			priority = depth if self.priority_function is None else self.priority_function(self.state_list[s_index], depth)
+			# Counter as tie breaker, so that equal priorities are expanded in the order of discovery
+			heapq.heappush(self.entries, (priority, self.counter, s_index, depth, quantities))
+			self.counter += 1
+		else:
+			self.entries.append((s_index, depth, quantities))
+
+	def pop(self):
+		if self.exploration_order == QualitativeReasoner.PRIORITY:
+			return heapq.heappop(self.entries)[2:]
+		elif self.exploration_order == QualitativeReasoner.BREADTH_FIRST:
+			return self.entries.popleft()
+		else:
+			return self.entries.pop()
+
+	def __len__(self):
+		return len(self.entries)
+
+
 ################
 ## Qualitative Reasoning engine
 ################
 class QualitativeReasoner:
 
-	def __init__(self, graph=None):
+	# Options for the order in which new states are explored
+	DEPTH_FIRST = "dfs"
+	BREADTH_FIRST = "bfs"
+	PRIORITY = "priority"
+	EXPLORATION_ORDERS = [DEPTH_FIRST, BREADTH_FIRST, PRIORITY]
+
+	# If packed_states is True, visited states, states on the frontier and transitions are saved as integer codes and shared tuples
+	# (see state_store.py) instead of State, Quantity and Termination objects
+	# The successors of expanded states can be kept in a successor cache (see SuccessorCache), which can also be shared with other
+	# reasoners of the same model (a cache used for another model raises a ValueError). Without a cache, every state is expanded again whenever it is needed
+	# If collect_statistics is True, counters and times of the phases are recorded (see EngineStatistics and get_statistics)
+	# If project_dependent is True, quantities whose values are determined by another quantity are removed from the model that is
+	# simulated, and added again to the results (see ModelProjection and get_result_graph)
+	def __init__(self, graph=None, packed_states=False, successor_cache=None, collect_statistics=False, project_dependent=False):
 		if graph is None:
 			entities, quantities, relations = create_default_graph()
 		else:
 			entities, quantities, relations = graph
-		self.state_list = list()
-		self.state_connections = dict()
-		self.state_transitions = dict()
+		self.projection = None
+		if project_dependent:
+			projection = ModelProjection(entities, quantities, relations)
+			if projection.has_dependents():
+				self.projection = projection
+				entities, quantities, relations = projection.create_reduced_graph()
+		self.packed_states = packed_states
+		self.codec = QuantityCodec(quantities)
+		self.reset_state_graph(quantities)
+		self.successor_cache = successor_cache if successor_cache is not None else SuccessorCache()
+		self.entities = entities
 		self.quantities = quantities
 		self.relations = relations
+		self.model = CompiledModel(entities, quantities, relations)
+		self.successor_cache.bind(EnvisionmentCache.get_fingerprint(self.model, self.quantities, dict()))
+		self.frontier = StateFrontier(QualitativeReasoner.DEPTH_FIRST, state_list=self.state_list)
+		# Previous reasoner and model differences for incremental simulation (see simulate_incremental)
+		self.previous_reasoner = None
+		self.model_diff = None
+		self.affecting_quantities = set()
+		self.reused_transitions = 0
+		self.checked_transitions = 0
+		# Statistics of the phases. None if not collected
+		self.stats = EngineStatistics() if collect_statistics else None
+		# Process pool for parallel exploration. None if states are expanded in this process
+		self.executor = None
+		self.num_workers = 1
+		# Goal directed exploration: parsed target pattern and maximum depth of expanded states (see simulate). None if not used
+		self.target_conditions = None
+		self.max_depth = None
+		self.witness_path = None
 
 	# Main function. Start reasoning process
 	def simulate(self, generate_all_states=False, 
 				 filename_state_graph="test_states.dot", 
 				 filename_state_transitions="test_states_transitions.txt",
 				 filename_intra_state="intra_state_trace.txt",
-				 filename_inter_state="inter_state_trace.txt"):
-		self.add_to_state_list(self.quantities, None)
-		if generate_all_states:
-			self.try_all_states()
+				 filename_inter_state="inter_state_trace.txt",
+				 exploration_order=DEPTH_FIRST,
+				 priority_function=None,
+				 vectorized=False,
+				 workers=1,
+				 envisionment_cache=None,
+				 filename_binary=None,
+				 sinks=None,
+				 output_workers=1,
+				 target=None,
+				 max_depth=None):
+		# Priority function is called with (state, depth) and returns a value, lower values are explored first. Default: depth
+		# If a filename for the binary state graph is given, the graph is additionally saved in the binary format (see binary_graph.py)
+		# Sinks are the outputs that are written (see output_sinks.py). Default: dot file, transitions, intra and inter state trace 
+		# with the given filenames. With more than one output worker, the sinks are written concurrently
+		# If an envisionment cache is given, the state graph is loaded from it if the model and options did not change since the last run
+		# Target is a state pattern (see state_query.py), e.g. "Volume=(max,+)". Exploration stops as soon as a matching state is found,
+		# and the shortest path to it is returned (witness path, also saved in self.witness_path). States that are max_depth transitions
+		# away from the initial state (on the shortest path) are not expanded, with priority exploration states found again by a shorter path
+		# are expanded again. In this goal directed mode, depth first search is replaced by breadth first search,
+		# so that the witness path is a shortest one. Priority exploration without priority function expands states matching most of the target first
+		goal_directed = target is not None or max_depth is not None
+		self.target_conditions = None
+		self.max_depth = max_depth
+		self.witness_path = None
+		if target is not None:
+			self.target_conditions = parse_state_pattern(target)
+			if self.projection is None:
+				check_pattern_quantities(self.target_conditions, [q.name for q in self.quantities])
+			else:
+				check_pattern_quantities(self.target_conditions, [q.name for q in self.projection.quantities])
+				self.target_conditions = self.projection.project_conditions(self.target_conditions)
+		if goal_directed:
+			if generate_all_states:
+				WARNINGS.emit(tracing.WARNING, "Warning: goal directed exploration starts from the initial state only, all states are not generated")
+				generate_all_states = False
+			if exploration_order == QualitativeReasoner.DEPTH_FIRST:
+				exploration_order = QualitativeReasoner.BREADTH_FIRST
+			elif exploration_order == QualitativeReasoner.PRIORITY and priority_function is None and self.target_conditions is not None:
+				priority_function = lambda state, depth, conditions=self.target_conditions: (count_unmatched(state, conditions), depth)
+		if exploration_order not in QualitativeReasoner.EXPLORATION_ORDERS:
+			WARNINGS.emit(tracing.WARNING, "Warning: unknown exploration order \"%s\". Using depth first search instead", exploration_order)
+			exploration_order = QualitativeReasoner.DEPTH_FIRST
+		# Parallel exploration always uses breadth first search. Like in goal directed mode, depth first search (default) is replaced silently
+		if workers > 1 and exploration_order != QualitativeReasoner.BREADTH_FIRST:
+			if exploration_order == QualitativeReasoner.PRIORITY:
+				WARNINGS.emit(tracing.WARNING, "Warning: parallel exploration always uses breadth first search, priority exploration is not used")
+			exploration_order = QualitativeReasoner.BREADTH_FIRST
+		self.reset_state_graph()
+		if self.stats is not None:
+			self.stats.reset()
+		# A custom priority function cannot be fingerprinted, so its results are not cached
+		# Goal directed exploration only creates a part of the state graph, so it is not cached either
+		fingerprint = None
+		if envisionment_cache is not None and priority_function is None and not goal_directed:
+			fingerprint = EnvisionmentCache.get_fingerprint(self.model, self.quantities, {"all_states": generate_all_states, "exploration_order": exploration_order, "vectorized": vectorized})
+		cached_data = envisionment_cache.load(fingerprint) if fingerprint is not None else None
+		if cached_data is not None:
+			print("Loaded state graph from envisionment cache " + str(envisionment_cache.filename))
+			self.load_state_graph_data(cached_data)
+		else:
+			self.frontier = StateFrontier(exploration_order, priority_function, self.state_list)
+			self.start_workers(workers)
+			try:
+				self.add_to_state_list(self.quantities, None)
+				self.explore()
+				if generate_all_states:
+					self.try_all_states(vectorized=vectorized)
+			finally:
+				self.stop_workers()
+			if fingerprint is not None:
+				envisionment_cache.save(fingerprint, self.get_state_graph_data())
 		print("Found " + str(len(self.state_list)) + " states")
 		print("Found " + str(sum([len(val) for key, val in self.state_connections.items()])) + " transitions")
-		visualize_state_graph(filename_state_graph, self.state_list, self.state_connections)
-		save_transitions(filename_state_transitions, self.state_list, self.state_connections, self.state_transitions)
-		save_intra_state_trace(filename_intra_state, self.relations, self.state_list)
-		save_inter_state_trace(filename_inter_state, self.state_list, self.state_connections, self.state_transitions)
-
-	# Extension for generating all possible states. First creates all possible states, filters those that are not possible, and continues by reasoning from those
-	def try_all_states(self):
-		poss_vals = []
-		for q in self.quantities:
-			poss_vals.append(len(q.magn_space))
-			poss_vals.append(len(q.deriv_space))
-			if q.model_2nd_derivative:
-				poss_vals.append(len(q.deriv_2nd_space))
-		combs = QualitativeReasoner.generate_all_combinations(len(poss_vals), poss_vals)
-		if debugging_active():
-			print("Creating all possible states\n" + "="*30)
-			print("Number of possible combinations: " + str(len(combs)))
-			print("Possible values: " + str(poss_vals))
-
-		for c_index, c in enumerate(combs):
-			if c_index % 1000 == 0:
-				print("Checked %4.2f%% of all states" % (100*c_index/len(combs)), end="\r")
-			index = 0
+		if self.target_conditions is not None:
+			if self.target_state is not None:
+				self.witness_path = self.get_query(closure_max_states=0).get_shortest_path(0, self.target_state)
+				print("Reached target in state " + str(self.target_state) + " after " + str(len(self.witness_path) - 1) + " transitions: " + " -> ".join([str(s) for s in self.witness_path]))
+			elif max_depth is not None:
+				print("Target not reached within " + str(max_depth) + " transitions")
+			else:
+				print("Target is not reachable from the initial state")
+		if sinks is None:
+			sinks = [DotSink(filename_state_graph), TransitionsSink(filename_state_transitions), IntraStateSink(filename_intra_state), InterStateSink(filename_inter_state)]
+			if filename_binary is not None:
+				sinks.append(BinarySink(filename_binary))
+		write_outputs(sinks, self.get_result_graph(), workers=output_workers)
+		return self.witness_path
+
+	# Query interface for the simulated state graph (reachability, paths, states with certain values, see state_query.py)
+	def get_query(self, **kwargs):
+		return StateGraphQuery.from_reasoner(self.get_result_graph(), **kwargs)
+
+	# State graph with the values of all quantities of the model. If dependent quantities are projected, the states and transitions
+	# of the reduced model are expanded when they are accessed (see ProjectedStateGraph). Otherwise, the reasoner itself.
+	# With project_dependent, state_list, state_connections and state_transitions of the reasoner only contain the quantities of
+	# the reduced model, so callers that need the states of the full model (like get_query and the output sinks) must use this graph instead
+	def get_result_graph(self):
+		return self if self.projection is None else ProjectedStateGraph(self, self.projection)
+
+	# Statistics of the last simulation as dictionary (see EngineStatistics.to_dict), including the successor cache. None if not collected.
+	# States expanded in worker processes (parallel exploration) are not part of the statistics of the phases
+	def get_statistics(self):
+		if self.stats is None:
+			return None
+		statistics = self.stats.to_dict()
+		statistics["num_states"] = len(self.state_list)
+		statistics["num_transitions"] = sum([len(sources) for sources in self.state_connections.values()])
+		statistics["successor_cache"] = self.successor_cache.get_statistics()
+		return statistics
+
+	# Incremental simulation after an edit of the model. The previous reasoner must have simulated the model before the edit.
+	# For states that the previous reasoner has in its successor cache, the next states of all transitions that cannot be affected 
+	# by the edit are taken over, and only the other transitions are checked again (see find_next_states). The successor cache is
+	# disabled by default, so the previous reasoner has to be created with one, e.g. SuccessorCache(None). Otherwise a warning is
+	# given and everything is simulated again. If the quantities themselves changed, the state space is different and everything is simulated again
+	def simulate_incremental(self, previous_reasoner, **kwargs):
+		if not previous_reasoner.successor_cache.is_enabled():
+			WARNINGS.emit(tracing.WARNING, "Warning: The previous reasoner has no successor cache. No transitions can be reused, create it with e.g. SuccessorCache(None)")
+		self.model_diff = ModelDiff(previous_reasoner.model, previous_reasoner.quantities, self.model, self.quantities)
+		if MESSAGES.enabled(tracing.DEBUG):
+			MESSAGES.emit(tracing.DEBUG, lambda diff: "Model changes:\n" + diff.to_string(), self.model_diff)
+		self.previous_reasoner = previous_reasoner if self.model_diff.same_state_space() else None
+		self.reused_transitions = 0
+		self.checked_transitions = 0
+		if self.previous_reasoner is not None:
+			self.affecting_quantities = self.find_affecting_quantities(previous_reasoner.model)
+		try:
+			self.simulate(**kwargs)
+		finally:
+			self.previous_reasoner = None
+		print("Reused " + str(self.reused_transitions) + " of " + str(self.reused_transitions + self.checked_transitions) + " transitions from previous simulation")
+
+	# Finds all quantities that influence (directly or indirectly, in the old or new model) a quantity with changed relations.
+	# If a transition changes none of those, creating the next state never evaluates a changed relation
+	def find_affecting_quantities(self, previous_model):
+		influencing = [set() for _ in self.quantities]
+		for model in [self.model, previous_model]:
+			for q_index, dependents in enumerate(model.dependents):
+				for dep_index in dependents:
+					influencing[dep_index].add(q_index)
+		affecting = set([self.model.get_index(name) for name in self.model_diff.affected_quantities])
+		frontier = list(affecting)
+		while len(frontier) > 0:
+			for q_index in influencing[frontier.pop()]:
+				if q_index not in affecting:
+					affecting.add(q_index)
+					frontier.append(q_index)
+		return affecting
+
+	# Next states of the previous model per transition for a state, as dictionary changes of the transition -> code of the next state.
+	# Only available if the state was expanded by the previous reasoner (the successor cache of the previous reasoner is used for this)
+	# and is valid in both models (validity of the state decides which quantities are checked in create_next_state). Otherwise None.
+	# As both models have the same state space, codes of states are the same in both reasoners
+	def get_previous_next_states(self, quantities, key):
+		prev_successors = self.previous_reasoner.successor_cache.peek(key)
+		if prev_successors is None:
+			return None
+		prev_quantities = self.previous_reasoner.codec.decode(key)
+		if not all([q.is_quantity_valid(quantities) for q in quantities]) or not all([q.is_quantity_valid(prev_quantities) for q in prev_quantities]):
+			return None
+		return dict(prev_successors)
+
+	# Extension for generating all possible states. Enumerates all possible states, filters those that are not possible, and continues by reasoning from those
+	# States are enumerated by backtracking over the quantities. As soon as all quantities a constraint depends on are assigned, the constraint is checked
+	# and all states sharing the invalid partial assignment are skipped. Valid states are found in the same order as by trying all combinations
+	# If vectorized is True and NumPy is installed, all combinations are checked in batches instead (see try_all_states_vectorized)
+	def try_all_states(self, vectorized=False):
+		quants = QualitativeReasoner.copy_quantities(self.quantities)
+		if len(quants) == 0:
+			return
+		if vectorized:
+			if not numpy_available():
+				WARNINGS.emit(tracing.WARNING, "Warning: NumPy is not installed. Checking states without vectorization")
+			elif self.try_all_states_vectorized():
+				return
+		value_options = [QualitativeReasoner.get_quantity_value_options(q) for q in quants]
+		checks = QualitativeReasoner.create_backtracking_checks(quants)
+		poss_vals = [len(v) for v in value_options]
+		num_combs = QualitativeReasoner.count_all_combinations(len(poss_vals), poss_vals)
+		# Number of full combinations below a partial assignment at each level. Used for the progress output when subtrees are pruned
+		num_remaining = [QualitativeReasoner.count_all_combinations(len(poss_vals) - i - 1, poss_vals[i+1:]) for i in range(len(poss_vals))]
+		if MESSAGES.enabled(tracing.DEBUG):
+			MESSAGES.emit(tracing.DEBUG, "Creating all possible states\n" + "="*30 + "\nNumber of possible combinations: %d\nPossible values: %s", num_combs, poss_vals)
+
+		checked_combs = 0
+		last_progress = -1
+		level = 0
+		value_iters = [iter(value_options[0])] + [None] * (len(quants) - 1)
+		while level >= 0:
+			if PROGRESS.enabled(tracing.INFO) and checked_combs // 1000 != last_progress:
+				last_progress = checked_combs // 1000
+				PROGRESS.emit(tracing.INFO, tracing.format_progress, checked_combs, num_combs)
+			vals = next(value_iters[level], None)
+			if vals is None:
+				level -= 1
+				continue
+			q = quants[level]
+			q.set_value(*vals)
+			if not q.check_quantity_space_boundaries() or not all(quants[c].check_causal_relations(quants) for c in checks[level]):
+				checked_combs += num_remaining[level]
+				continue
+			if level == len(quants) - 1:
+				checked_combs += 1
+				self.add_to_state_list(QualitativeReasoner.copy_quantities(quants), None)
+				self.explore()
+			else:
+				level += 1
+				value_iters[level] = iter(value_options[level])
+
+	# Checks all combinations of values in batches with NumPy and continues reasoning from the valid ones. Same result as the backtracking search.
+	# Returns False if the number of combinations is too large to be indexed (backtracking has to be used then)
+	def try_all_states_vectorized(self, batch_size=65536):
+		checker = VectorizedValidityChecker(self.quantities, self.model)
+		if not checker.is_feasible():
+			WARNINGS.emit(tracing.WARNING, "Warning: too many combinations for vectorized checks. Checking states without vectorization")
+			return False
+		if MESSAGES.enabled(tracing.DEBUG):
+			MESSAGES.emit(tracing.DEBUG, "Creating all possible states (vectorized)\n" + "="*30 + "\nNumber of possible combinations: %d\nPossible values: %s", checker.num_combs, checker.slot_sizes)
+		for c in checker.iterate_valid_combinations(batch_size):
 			quants = QualitativeReasoner.copy_quantities(self.quantities)
-			for q in quants:
-				q.set_value(magnitude=q.magn_space[c[index]])
-				index += 1
-				q.set_value(derivative=q.deriv_space[c[index]])
-				index += 1
-				if q.model_2nd_derivative:
-					q.set_value(derivative_2nd=q.deriv_2nd_space[c[index]])
-					index += 1
-			if all([q.is_quantity_valid(quants) for q in quants]):
-				self.add_to_state_list(quants, None)
+			for q, slots in zip(quants, checker.slots):
+				q.set_value(magnitude=q.magn_space[c[slots[0]]], derivative=q.deriv_space[c[slots[1]]])
+				if slots[2] is not None:
+					q.set_value(derivative_2nd=q.deriv_2nd_space[c[slots[2]]])
+			self.add_to_state_list(quants, None)
+			self.explore()
+		return True
+
+	# All value combinations (magnitude, derivative[, 2nd order derivative]) of a single quantity, in the order of the quantity spaces
+	@staticmethod
+	def get_quantity_value_options(q):
+		if q.model_2nd_derivative:
+			return list(itertools.product(q.magn_space, q.deriv_space, q.deriv_2nd_space))
+		else:
+			return list(itertools.product(q.magn_space, q.deriv_space))
+
+	# Determines for the backtracking in try_all_states after which quantity the causal relations of each quantity can be checked.
+	# This is the case when the quantity itself and all quantities influencing it got a value. Returns list of quantity indices to check per level
+	@staticmethod
+	def create_backtracking_checks(quantities):
+		q_indices = {q.name: i for i, q in enumerate(quantities)}
+		checks = [list() for _ in quantities]
+		for i, q in enumerate(quantities):
+			ready_level = max([i] + [q_indices[rel.q1.name] for rel in q.relations if rel.q1.name != q.name])
+			checks[ready_level].append(i)
+		return checks
+
+	# Expands states until the frontier is empty or the target of a goal directed exploration is found (see simulate).
+	# New states are added to the frontier by add_to_state_list
+	def explore(self):
+		if self.executor is not None:
+			self.explore_parallel()
+			return
+		# For depth first search, states that are being expanded stay on a stack and only one successor is taken at a time,
+		# so that states are numbered as in a recursive search
+		expanding = list()
+		while (len(self.frontier) > 0 or len(expanding) > 0) and self.target_state is None:
+			if len(self.frontier) > 0:
+				s_index, depth, quantities = self.frontier.pop()
+				# States that were found again by a shorter path are expanded with the shorter depth (see add_to_state_list)
+				if self.max_depth is not None and (depth >= self.max_depth or depth > self.state_depth[s_index]):
+					continue
+				if self.packed_states:
+					quantities = self.codec.decode(quantities)
+				if self.frontier.exploration_order == QualitativeReasoner.DEPTH_FIRST:
+					expanding.append((s_index, depth, iter(self.get_successors(quantities))))
+				else:
+					for t, next_state_quant in self.get_successors(quantities):
+						self.add_to_state_list(next_state_quant, s_index, t, depth + 1)
+						if self.target_state is not None:
+							break
+			else:
+				s_index, depth, successors = expanding[-1]
+				next_state = next(successors, None)
+				if next_state is None:
+					expanding.pop()
+				else:
+					self.add_to_state_list(next_state[1], s_index, next_state[0], depth + 1)
+
+	# Breadth first exploration where the successors of all states in the frontier are created by the worker processes.
+	# Results are processed in the order of the frontier, so state indices are the same as for a breadth first search in a single process
+	# States whose successors are in the successor cache are not sent to the workers
+	def explore_parallel(self):
+		while len(self.frontier) > 0 and self.target_state is None:
+			batch = [self.frontier.pop() for _ in range(len(self.frontier))]
+			if self.max_depth is not None:
+				batch = [b for b in batch if b[1] < self.max_depth]
+			if self.packed_states:
+				batch = [(s_index, depth, self.codec.decode(code)) for s_index, depth, code in batch]
+			batch_keys = [self.codec.encode(b[2]) for b in batch]
+			batch_successors = [self.successor_cache.get(key) if self.successor_cache.is_enabled() else None for key in batch_keys]
+			to_expand = [i for i, successors in enumerate(batch_successors) if successors is None]
+			chunksize = max(1, len(to_expand) // (4 * self.num_workers))
+			results = self.executor.map(expand_state_in_worker, [batch_keys[i] for i in to_expand], chunksize=chunksize)
+			for i, worker_successors in zip(to_expand, results):
+				batch_successors[i] = worker_successors
+				if self.successor_cache.is_enabled():
+					self.successor_cache.put(batch_keys[i], worker_successors)
+			for (s_index, depth, quantities), successors in zip(batch, batch_successors):
+				for t, next_state_quant in self.decode_successors(quantities, successors):
+					self.add_to_state_list(next_state_quant, s_index, t, depth + 1)
+					if self.target_state is not None:
+						return
+
+	# List of (transition, quantities of next state) for a state. Uses the successor cache if the state was expanded before.
+	# States are keyed by their code (see QuantityCodec), which includes all values (also 2nd order derivatives that are not modelled)
+	# as they influence the successors
+	def get_successors(self, quantities):
+		cache_enabled = self.successor_cache.is_enabled()
+		key = self.codec.encode(quantities) if cache_enabled or self.previous_reasoner is not None else None
+		if cache_enabled:
+			cached_successors = self.successor_cache.get(key)
+			if cached_successors is not None:
+				return self.decode_successors(quantities, cached_successors)
+		previous_next_states = self.get_previous_next_states(quantities, key) if self.previous_reasoner is not None else None
+		successors = list(self.find_next_states(quantities, None, previous_next_states))
+		if cache_enabled:
+			self.successor_cache.put(key, self.encode_successors(successors))
+		return successors
+
+	# Compact form of the successors of a state for the successor cache and for parallel exploration: tuple of (changes of the 
+	# transition, code of the next state)
+	def encode_successors(self, successors):
+		return tuple([(self.get_transition_changes(t), self.codec.encode(next_state_quant)) for t, next_state_quant in successors])
+
+	def decode_successors(self, quantities, successors):
+		return [(QualitativeReasoner.create_transition(quantities, changes), self.codec.decode(code)) for changes, code in successors]
+
+	# Changes of a transition as tuple of (quantity index, new values, termination types)
+	def get_transition_changes(self, t):
+		return tuple([(self.model.get_index(q.name), tuple(v), tuple(typ)) for q, v, typ in zip(t.quantities, t.vals, t.types)])
+
+	# Creates a transition from its changes (see get_transition_changes) on the quantities of its source state
+	@staticmethod
+	def create_transition(quantities, changes):
+		return Termination([quantities[c[0]] for c in changes], [list(c[1]) for c in changes], [list(c[2]) for c in changes])
+
+	# Removes all states and transitions, e.g. before a new simulation
+	def reset_state_graph(self, quantities=None):
+		if quantities is None:
+			quantities = self.quantities
+		self.state_list = list() if not self.packed_states else PackedStateList(quantities)
+		self.state_index = dict()
+		self.state_transitions = dict() if not self.packed_states else PackedTransitions(self.codec)
+		# For packed states, the connections are read from the transitions (see add_transition)
+		self.state_connections = dict() if not self.packed_states else PackedConnections(self.state_transitions)
+		# First state matching the target of a goal directed exploration
+		self.target_state = None
+		# Shortest known depth of every state, only saved if the exploration is limited by max_depth
+		self.state_depth = list()
+
+	# Starts process pool for parallel exploration if more than one worker is requested
+	def start_workers(self, workers):
+		self.num_workers = workers
+		if workers > 1:
+			self.executor = ProcessPoolExecutor(max_workers=workers, initializer=init_exploration_worker, initargs=((self.entities, self.quantities, self.relations),))
+
+	def stop_workers(self):
+		if self.executor is not None:
+			self.executor.shutdown()
+			self.executor = None
+		self.num_workers = 1
+
+	# State graph in a compact form without quantity and termination objects, for saving it in the envisionment cache.
+	# States are tuples of values in the order of the quantities, transitions lists of changes (quantity index, values, types) 
+	# in the same order as the connections of a state
+	def get_state_graph_data(self):
+		data = {"states": list(), "connections": list(), "transitions": list()}
+		for s_index, state in enumerate(self.state_list):
+			data["states"].append(tuple([state.value_dict[name] for name in self.model.quantity_names]))
+			data["connections"].append(list(self.state_connections[s_index]))
+			data["transitions"].append([[(self.model.get_index(q.name), v, typ) for q, v, typ in zip(t.quantities, t.vals, t.types)] \
+										for t in [self.state_transitions[s_index][source] for source in self.state_connections[s_index]]])
+		return data
+
+	# Restores a state graph saved by get_state_graph_data. The quantities of a transition have the values of its source state, 
+	# as they have after exploring
+	def load_state_graph_data(self, data):
+		self.reset_state_graph()
+		for s_index, values in enumerate(data["states"]):
+			s = State.from_value_dict(dict(zip(self.model.quantity_names, values)))
+			if self.packed_states:
+				s_key = self.state_list.encode_state(s)
+				self.state_list.append_code(s_key)
+				self.state_transitions.add_state(self.codec.encode(self.create_quantities_from_values(values)))
+			else:
+				s_key = s.key
+				self.state_list.append(s)
+			self.state_index[s_key] = s_index
+		source_quantities = dict()
+		for s_index, (connections, transitions) in enumerate(zip(data["connections"], data["transitions"])):
+			if not self.packed_states:
+				self.state_connections[s_index] = list(connections)
+			self.state_transitions[s_index] = dict()
+			for source, changes in zip(connections, transitions):
+				if source not in source_quantities:
+					source_quantities[source] = self.create_quantities_from_values(data["states"][source])
+				self.state_transitions[s_index][source] = QualitativeReasoner.create_transition(source_quantities[source], changes)
+
+	# Creates copy of the quantities of the model with the given values
+	def create_quantities_from_values(self, values):
+		quants = QualitativeReasoner.copy_quantities(self.quantities)
+		for q, v in zip(quants, values):
+			q.set_value(*v)
+		return quants
 
 	# Finds the next state of a given state by the three steps described in the report
-	def find_next_states(self, quantities, orig_state):
+	# Generator of (transition, quantities of next state), so that successors can be processed one at a time
+	# For incremental simulation, previous_next_states are the next states per transition in the model before the edit (see get_previous_next_states)
+	def find_next_states(self, quantities, orig_index, previous_next_states=None):
+		stats = self.stats if self.stats is not None else NO_STATISTICS
+		stats.count("expanded_states")
 		# Step 1: Create terminations
-		epsilon_terminations = self.create_epsilon_terminations(quantities)
-		value_terminations = self.create_value_terminations(quantities)
-		exogenous_terminations = self.create_exogenous_terminations(quantities)
-		ambiguous_terminations = self.create_ambiguous_terminations(quantities)
+		epsilon_terminations = stats.timed("epsilon_terminations", self.create_epsilon_terminations, quantities)
+		value_terminations = stats.timed("value_terminations", self.create_value_terminations, quantities)
+		exogenous_terminations = stats.timed("exogenous_terminations", self.create_exogenous_terminations, quantities)
+		ambiguous_terminations = stats.timed("ambiguous_terminations", self.create_ambiguous_terminations, quantities)
+		stats.count("epsilon_terminations", len(epsilon_terminations.quantities))
+		stats.count("value_terminations", len(value_terminations))
+		stats.count("exogenous_terminations", len(exogenous_terminations))
+		stats.count("ambiguous_terminations", len(ambiguous_terminations))
 		# Step 2: Combine terminations to transitions
-		poss_transitions = self.create_cross_product(epsilon_terminations, value_terminations + exogenous_terminations + ambiguous_terminations)
-		# Step 3: Check transitions to valid states
+		extra_terminations = value_terminations + exogenous_terminations + ambiguous_terminations
+		poss_transitions = stats.timed("cross_product", self.create_cross_product, epsilon_terminations, extra_terminations)
+		# Without conflict filtering, every subset of the extra terminations would be a transition
+		stats.count("cross_product_candidates", 2 ** len(extra_terminations))
+		stats.count("cross_product_transitions", len(poss_transitions))
+		# Step 3: Check transitions to valid states. If the current state is valid, only quantities affected by a transition have to be checked
+		source_valid = all([q.is_quantity_valid(quantities) for q in quantities])
 		for t in poss_transitions:
-			next_state_quant = self.create_next_state(QualitativeReasoner.copy_quantities(quantities), t)
+			if previous_next_states is not None and not any([self.model.get_index(q.name) in self.affecting_quantities for q in t.quantities]):
+				# Transition cannot be affected by the edit of the model. Invalid transitions are not part of the previous next states
+				self.reused_transitions += 1
+				prev_code = previous_next_states.get(self.get_transition_changes(t))
+				next_state_quant = self.codec.decode(prev_code) if prev_code is not None else None
+			else:
+				if previous_next_states is not None:
+					self.checked_transitions += 1
+				next_state_quant = stats.timed("create_next_state", self.create_next_state, QualitativeReasoner.copy_quantities(quantities), t, source_valid)
+			stats.count("valid_transitions" if next_state_quant is not None else "invalid_transitions")
 			if next_state_quant is not None:
-				if debugging_active():
-					print("Creating new state by the following transition: ")
-					t.print()
-				# Note: will be recursive call of this function is state is new
-				self.add_to_state_list(next_state_quant, orig_state, t)
+				if TRANSITION_ACCEPTED.enabled(tracing.DEBUG):
+					TRANSITION_ACCEPTED.emit(tracing.DEBUG, lambda term: "Creating new state by the following transition:\n" + term.to_string(), t)
+				yield t, next_state_quant
 			else:
-				if debugging_active():
-					print("Invalid transition:")
-					t.print()
+				if TRANSITION_REJECTED.enabled(tracing.DEBUG):
+					TRANSITION_REJECTED.emit(tracing.DEBUG, lambda term: "Invalid transition:\n" + term.to_string(), t)
 
-	# Adds a state to the state list if it is not in there, and starts reasoning process again
+	# Adds a state to the state list if it is not in there, and puts it on the frontier for exploration
 	# If state already in state list, just adds new transition (if also not already there)
-	def add_to_state_list(self, quantities, orig_state, transition=None):
-		s = State(quantities)
-		res = self.is_in_state_list(s)
+	# States are referred to by their index in the state list (orig_index is None for initial/seed states)
+	def add_to_state_list(self, quantities, orig_index, transition=None, depth=0):
+		if self.packed_states:
+			s = None
+			s_key = self.state_list.encode(quantities)
+		else:
+			s = State(quantities)
+			s_key = s.key
+		res = self.state_index.get(s_key, -1)
+		if self.stats is not None and res >= 0:
+			self.stats.count("state_lookup_hits")
 		if res < 0:
 			s_index = len(self.state_list)
-			if debugging_active():
-				print("Adding new state " + str(s_index))
-				s.print()
-			self.state_list.append(s)
-			self.state_connections[s_index] = list()
+			if self.packed_states:
+				self.state_list.append_code(s_key)
+				code = self.codec.encode(quantities)
+				self.state_transitions.add_state(code)
+			else:
+				self.state_list.append(s)
+			if STATE_ADDED.enabled(tracing.DEBUG):
+				STATE_ADDED.emit(tracing.DEBUG, lambda i, state: "Adding new state " + str(i) + "\n" + state.to_string(), s_index, self.state_list[s_index])
+			self.state_index[s_key] = s_index
+			if not self.packed_states:
+				self.state_connections[s_index] = list()
 			self.state_transitions[s_index] = dict()
-			if orig_state is not None:
-				self.state_connections[s_index] = [self.state_list.index(orig_state)]
-				self.state_transitions[s_index] = {self.state_list.index(orig_state): transition}
-			self.find_next_states(QualitativeReasoner.copy_quantities(quantities), s)
-		elif orig_state is not None:
-			if self.state_list.index(orig_state) not in self.state_connections[res] and res != self.state_list.index(orig_state):
-				self.state_connections[res].append(self.state_list.index(orig_state))
-				self.state_transitions[res][self.state_list.index(orig_state)] = transition
+			if self.max_depth is not None:
+				self.state_depth.append(depth)
+			if orig_index is not None:
+				self.add_transition(s_index, orig_index, transition)
+			self.frontier.push(s_index, depth, QualitativeReasoner.copy_quantities(quantities) if not self.packed_states else code)
+			if self.target_conditions is not None and state_matches(self.state_list[s_index], self.target_conditions):
+				self.target_state = s_index
+			if self.stats is not None:
+				self.stats.count("new_states")
+				self.stats.record_frontier(len(self.state_list), len(self.frontier))
+		elif orig_index is not None:
+			# The transition dictionary of a state is keyed by the source state, so it doubles as set of incoming edges
+			if orig_index not in self.state_transitions[res] and res != orig_index:
+				self.add_transition(res, orig_index, transition)
+			# With priority exploration, a state can be found by a shorter path after it was added. It is explored again with
+			# the shorter depth, so that max_depth limits the exploration to the same states as breadth first search
+			if self.max_depth is not None and depth < self.state_depth[res]:
+				self.state_depth[res] = depth
+				if depth < self.max_depth:
+					self.frontier.push(res, depth, QualitativeReasoner.copy_quantities(quantities) if not self.packed_states else self.codec.encode(quantities))
+
+	# Adds a transition between two states of the state list. For packed states, the state connections are read from the transitions
+	def add_transition(self, goal_state, source, transition):
+		if not self.packed_states:
+			self.state_connections[goal_state].append(source)
+		self.state_transitions[goal_state][source] = transition
 
 	# Checks whether certain state is already state list. If yes, returns its position
 	def is_in_state_list(self, s):
-		for i, st in enumerate(self.state_list):
-			if st == s:
-				return i
-		return -1 
+		if self.packed_states:
+			return self.state_index.get(self.state_list.encode_state(s), -1)
+		return self.state_index.get(s.key, -1)
 
 	# Deep copy of quantity list
 	@staticmethod
@@ -133,30 +636,30 @@ class QualitativeReasoner:
 		eps_term = Termination(term_type=Termination.EPSILON)
 		for q in quantities:
 			# 1st order derivative changing magnitude
-			if q.derivative != Quantity.ZERO and Quantity.is_landmark(q.magnitude):
+			if q.derivative != Quantity.ZERO and q.is_landmark_value(q.magnitude):
 				prev_index = q.magn_space.index(q.magnitude)
 				if q.derivative == Quantity.POSITIVE:
 					new_index = prev_index + 1
 				else:
 					new_index = prev_index - 1
 				if new_index < 0:
-					print("Warning: magnitude index out of bounds. Lowest magnitude landmark with negative derivative at quantity " + str(q.name))
+					WARNINGS.emit(tracing.WARNING, "Warning: magnitude index out of bounds. Lowest magnitude landmark with negative derivative at quantity %s", q.name)
 				elif new_index > len(q.magn_space):
-					print("Warning: magnitude index out of bounds. Highest magnitude landmark with positive derivative at quantity " + str(q.name))
+					WARNINGS.emit(tracing.WARNING, "Warning: magnitude index out of bounds. Highest magnitude landmark with positive derivative at quantity %s", q.name)
 				val_change = [q.magn_space[new_index], Termination.UNCHANGED, Termination.UNCHANGED]
 				eps_term.add_change(q, val_change)
 
 			# 2nd order derivative changing 1st order derivative
-			if q.derivative_2nd != Quantity.ZERO and Quantity.is_landmark(q.derivative):
+			if q.derivative_2nd != Quantity.ZERO and q.is_landmark_value(q.derivative):
 				prev_index = q.deriv_space.index(q.derivative)
 				if q.derivative_2nd == Quantity.POSITIVE:
 					new_index = prev_index + 1
 				else:
 					new_index = prev_index - 1
 				if new_index < 0:
-					print("Warning: derivative index out of bounds. Lowest derivative landmark with negative 2nd order derivative at quantity " + str(q.name))
+					WARNINGS.emit(tracing.WARNING, "Warning: derivative index out of bounds. Lowest derivative landmark with negative 2nd order derivative at quantity %s", q.name)
 				elif new_index > len(q.deriv_space):
-					print("Warning: derivative index out of bounds. Highest derivative landmark with positive 2nd oder derivative at quantity " + str(q.name))
+					WARNINGS.emit(tracing.WARNING, "Warning: derivative index out of bounds. Highest derivative landmark with positive 2nd oder derivative at quantity %s", q.name)
 				val_change = [Termination.UNCHANGED, q.deriv_space[new_index], Termination.UNCHANGED]
 				eps_term.add_change(q, val_change)
 
@@ -169,7 +672,7 @@ class QualitativeReasoner:
 		val_terms = list()
 		for q in quantities:
 			# 1st order derivative changing magnitude
-			if q.derivative != Quantity.ZERO and not Quantity.is_landmark(q.magnitude):
+			if q.derivative != Quantity.ZERO and not q.is_landmark_value(q.magnitude):
 				prev_index = q.magn_space.index(q.magnitude)
 				if q.derivative == Quantity.POSITIVE:
 					new_index = prev_index + 1
@@ -183,7 +686,7 @@ class QualitativeReasoner:
 				val_terms.append(Termination(q, val_change, term_type=Termination.VALUE))
 
 			# 2nd order derivative changing 1st order derivative
-			if q.derivative_2nd != Quantity.ZERO and not Quantity.is_landmark(q.derivative):
+			if q.derivative_2nd != Quantity.ZERO and not q.is_landmark_value(q.derivative):
 				prev_index = q.deriv_space.index(q.derivative)
 				if q.derivative_2nd == Quantity.POSITIVE:
 					new_index = prev_index + 1
@@ -211,9 +714,9 @@ class QualitativeReasoner:
 			if quantity.derivative == Quantity.POSITIVE or quantity.derivative == Quantity.NEGATIVE:
 				exog_terms.append(Termination(quantity, [Termination.UNCHANGED, Quantity.ZERO, Termination.UNCHANGED], term_type=Termination.EXOGENOUS))
 			if quantity.derivative == Quantity.ZERO:
-				if not (quantity.magnitude == quantity.magn_space[-1] and Quantity.is_landmark(quantity.magnitude)):
+				if not (quantity.magnitude == quantity.magn_space[-1] and quantity.is_landmark_value(quantity.magnitude)):
 					exog_terms.append(Termination(quantity, [Termination.UNCHANGED, Quantity.POSITIVE, Termination.UNCHANGED], term_type=Termination.EXOGENOUS))
-				if not (quantity.magnitude == quantity.magn_space[0] and Quantity.is_landmark(quantity.magnitude)):
+				if not (quantity.magnitude == quantity.magn_space[0] and quantity.is_landmark_value(quantity.magnitude)):
 					exog_terms.append(Termination(quantity, [Termination.UNCHANGED, Quantity.NEGATIVE, Termination.UNCHANGED], term_type=Termination.EXOGENOUS))
 		return exog_terms
 
@@ -239,48 +742,106 @@ class QualitativeReasoner:
 		# Combining epsilon, value, ambiguity and exogenous terminations together.
 		# All epsilon transitions always have to happen, but all possible combinations of value terminations and exogenous terminations must be generated
 		# Create set of larger transitions that summarize all possible transitions
-		# Already remove transitions that are not able (if for example one sets derivative to +, the other to -; unsure if that is even possible
-		poss_combs = QualitativeReasoner.generate_all_combinations(len(extra_terminations))
+		# Transitions that are not possible (if for example one sets derivative to +, the other to -) are not created at all:
+		# Conflicting terminations are determined first, and combinations are built up one termination at a time, skipping all combinations 
+		# that would include a conflicting pair. Transitions are returned in the same order as when trying all combinations
+		eps_conflicts, conflicts = QualitativeReasoner.find_termination_conflicts(epsilon_terminations, extra_terminations)
 		poss_terminations = list()
-		for comb in poss_combs:
-			term = epsilon_terminations.copy()
-			valid_transition = True
-			for c, extra_term in zip(comb, extra_terminations):
-				if c == 1:
-					valid_transition = valid_transition and term.combine_terminations(extra_term)
-					if not valid_transition:
-						break
-			if not valid_transition:
+		# Stack of (index of next termination to decide on, selected terminations). Including a termination is explored before excluding it
+		stack = [(0, tuple())]
+		while len(stack) > 0:
+			t_index, selected = stack.pop()
+			if t_index == len(extra_terminations):
+				term = epsilon_terminations.copy()
+				for s_index in selected:
+					term.combine_terminations(extra_terminations[s_index])
+				poss_terminations.append(term)
 				continue
-			poss_terminations.append(term)
+			stack.append((t_index + 1, selected))
+			if not eps_conflicts[t_index] and not any([s_index in conflicts[t_index] for s_index in selected]):
+				stack.append((t_index + 1, selected + (t_index,)))
 		return poss_terminations
 
+	# Finds the terminations that cannot be combined because they change the same value of a quantity to different values.
+	# Returns for every extra termination whether it conflicts with the epsilon termination, and the set of extra terminations it conflicts with
+	@staticmethod
+	def find_termination_conflicts(epsilon_terminations, extra_terminations):
+		eps_changes = epsilon_terminations.get_changes()
+		eps_conflicts = list()
+		# Changes of the extra terminations per changed value (quantity, value index) 
+		changes_per_value = dict()
+		for t_index, term in enumerate(extra_terminations):
+			term_changes = term.get_changes()
+			eps_conflicts.append(any([key in eps_changes and eps_changes[key] != v for key, v in term_changes.items()]))
+			for key, v in term_changes.items():
+				changes_per_value.setdefault(key, list()).append((t_index, v))
+		conflicts = [set() for _ in extra_terminations]
+		for value_changes in changes_per_value.values():
+			for i, (t_index_1, v_1) in enumerate(value_changes):
+				for t_index_2, v_2 in value_changes[i+1:]:
+					if v_1 != v_2:
+						conflicts[t_index_1].add(t_index_2)
+						conflicts[t_index_2].add(t_index_1)
+		return eps_conflicts, conflicts
+
 	# Given a state (quantity values) and a transition/termination, try to come to a valid state
-	def create_next_state(self, quantities, termination):
+	# If source_valid is True, the quantities (before applying the transition) are known to be a valid state. Then only quantities 
+	# affected by the transition are checked at first. Otherwise, all quantities are checked
+	def create_next_state(self, quantities, termination, source_valid=False):
 		# Apply transition and check if it leads to a valid state or not
 		# Unsure if we might need to handle ambiguity here or if it is done in the transitions
+		changed_quantities = set()
 		for q, v in zip(termination.quantities, termination.vals):
-			for quant in quantities:
-				if q.name == quant.name:
-					if v[0] != Termination.UNCHANGED:
-						quant.magnitude = v[0]
-						quant.magnitude_fixed = True
-					if v[1] != Termination.UNCHANGED:
-						quant.derivative = v[1]
-						quant.derivative_fixed = True
-					if v[2] != Termination.UNCHANGED:
-						quant.derivative_2nd = v[2]
-						quant.derivative_2nd_fixed = True
-					break
+			q_index = self.model.get_index(q.name)
+			quant = quantities[q_index]
+			if v[0] != Termination.UNCHANGED:
+				quant.magnitude = v[0]
+				quant.magnitude_fixed = True
+			if v[1] != Termination.UNCHANGED:
+				quant.derivative = v[1]
+				quant.derivative_fixed = True
+			if v[2] != Termination.UNCHANGED:
+				quant.derivative_2nd = v[2]
+				quant.derivative_2nd_fixed = True
+			changed_quantities.add(q_index)
 
-		valid_state = all([q.is_quantity_valid(quantities) for q in quantities])
+		# Resolving constraints in sweeps over all quantities until the state is valid. The validity of every quantity is remembered and
+		# only checked again if the quantity itself or one of the quantities influencing it (P/I/VC relations) changed (dirty quantities).
+		# Quantities that are known to be valid are skipped in the sweep, as make_quantity_valid would not change them
+		if source_valid:
+			dirty_quantities = set(changed_quantities)
+			for q_index in changed_quantities:
+				dirty_quantities.update(self.model.dependents[q_index])
+		else:
+			dirty_quantities = set(range(len(quantities)))
+		quantity_valid = [True] * len(quantities)
 		invalid_state = False
-		while not valid_state and not invalid_state:
-			for q in quantities:
+		sweeps = 0
+		while True:
+			sweeps += 1
+			for q_index in dirty_quantities:
+				quantity_valid[q_index] = quantities[q_index].is_quantity_valid(quantities)
+			if all(quantity_valid):
+				break
+			dirty_quantities = set()
+			values_changed = False
+			for q_index, q in enumerate(quantities):
+				if quantity_valid[q_index] and q_index not in dirty_quantities:
+					continue
+				prev_vals = (q.magnitude, q.derivative, q.derivative_2nd)
 				if not q.make_quantity_valid(quantities):
 					invalid_state = True
 					break
-			valid_state = all([q.is_quantity_valid(quantities) for q in quantities])
+				dirty_quantities.add(q_index)
+				if prev_vals != (q.magnitude, q.derivative, q.derivative_2nd):
+					values_changed = True
+					dirty_quantities.update(self.model.dependents[q_index])
+			# If no value changed in the sweep, every further sweep would be exactly the same. State cannot be made valid
+			if invalid_state or not values_changed:
+				invalid_state = True
+				break
+		if self.stats is not None:
+			self.stats.count("fixpoint_sweeps", sweeps)
 		
 		if invalid_state:
 			return None
@@ -299,18 +860,42 @@ class QualitativeReasoner:
 	# Function for generating all possible combinations of terminations and states
 	@staticmethod
 	def generate_all_combinations(num, poss=2):
-		all_combs = [list()]
+		return [list(c) for c in QualitativeReasoner.iterate_all_combinations(num, poss)]
+
+	# Lazy version of generate_all_combinations. Yields one combination (tuple) at a time in the same order, so memory stays constant
+	# Works as mixed-radix counter where the last position changes fastest. For poss=2, every position goes through the values 1 and 0
+	@staticmethod
+	def iterate_all_combinations(num, poss=2):
+		if not isinstance(poss, list):
+			digits = [(1, 0)] * num
+		else:
+			digits = [range(poss[i]) for i in range(num)]
+		return itertools.product(*digits)
+
+	# Number of combinations that iterate_all_combinations yields
+	@staticmethod
+	def count_all_combinations(num, poss=2):
+		if not isinstance(poss, list):
+			return 2 ** num
+		num_combs = 1
 		for i in range(num):
-			new_combs = list()
-			for c in all_combs:
-				if not isinstance(poss, list):
-					for r in [1,0]:
-						new_combs.append(c + [r])
-				else:
-					for r in range(poss[i]):
-						new_combs.append(c + [r])
-			all_combs = new_combs
-		return all_combs
+			num_combs *= poss[i]
+		return num_combs
+
+
+################
+## Parallel exploration. Every worker process has its own reasoner for the model and expands the states it gets
+################
+WORKER_REASONER = None
+
+def init_exploration_worker(graph):
+	global WORKER_REASONER
+	WORKER_REASONER = QualitativeReasoner(graph)
+
+# Returns the successors of the state with the given code in the compact form of the successor cache (see encode_successors),
+# so that the coordinator can recreate the transitions on its own quantities
+def expand_state_in_worker(code):
+	return WORKER_REASONER.encode_successors(WORKER_REASONER.find_next_states(WORKER_REASONER.codec.decode(code), None))
 
 
 if __name__ == '__main__':
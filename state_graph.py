@@ -1,10 +1,15 @@
 
-# Parameter for enabling debugging (printing transitions, states, ...) or not
+import tracing
+from tracing import WARNINGS, MESSAGES, RELATION_ADDED
+
+# Parameter for enabling debugging (printing transitions, states, ...) or not. Debug events are printed by subscribing
+# the console to all tracing channels (see tracing.py)
 DEBUG = False
 
 def set_debugging(debug_active=False):
 	global DEBUG
 	DEBUG = debug_active
+	tracing.set_console_level(tracing.DEBUG if debug_active else tracing.INFO)
 
 def debugging_active():
 	global DEBUG
@@ -66,11 +71,20 @@ class Termination:
 					self.types[index][v_index] = term_type[v_index]
 				elif val[v_index] != Termination.UNCHANGED and val[v_index] != self.vals[index][v_index]:
 					# Cannot be combined, two different values to which it should be changed
-					if DEBUG:
-						print("Warning: two value changed cannot be combined. Index " + str(index) + ", previously \"" + str(self.vals[index][v_index]) + "\", new value \"" + str(val[v_index]) + "\"")
+					if MESSAGES.enabled(tracing.DEBUG):
+						MESSAGES.emit(tracing.DEBUG, "Warning: two value changed cannot be combined. Index %d, previously \"%s\", new value \"%s\"", index, self.vals[index][v_index], val[v_index])
 					return False
 		return True
 
+	# Dictionary of all changes of this termination: (quantity, value index) -> new value
+	def get_changes(self):
+		changes = dict()
+		for q, q_vals in zip(self.quantities, self.vals):
+			for v_index, v in enumerate(q_vals):
+				if v != Termination.UNCHANGED:
+					changes[(q, v_index)] = v
+		return changes
+
 	# Combines two terminations by copying the changes of one to the existing one here
 	def combine_terminations(self, other_term):
 		truth_val = True
@@ -139,7 +153,9 @@ class Quantity:
 		MIN_VAL: True
 	}
 
-	def __init__(self, name, magn_space=None, deriv_space=None, deriv_2nd_space=None, model_2nd_derivative=True, exogenous=False):
+	# Landmarks are landmark information (value name -> is landmark) for the values of this quantity, e.g. from a model file.
+	# Values without landmark information here use the default landmark information
+	def __init__(self, name, magn_space=None, deriv_space=None, deriv_2nd_space=None, model_2nd_derivative=True, exogenous=False, landmarks=None):
 		self.name = name
 		if magn_space is None:
 			magn_space = [Quantity.ZERO, Quantity.POSITIVE, Quantity.MAX_VAL]
@@ -158,11 +174,16 @@ class Quantity:
 		self.derivative_2nd_fixed = False
 		self.model_2nd_derivative = model_2nd_derivative
 		self.exogenous = exogenous
+		self.landmarks = landmarks
 		self.relations = list()
+		# Integer indexed version of the incoming relations. Set by CompiledModel, None if model is not compiled (yet)
+		self.incoming_relations = None
 
-	def add_relation(self, rel):
+	def add_relation(self, rel, verbose=True):
 		self.relations.append(rel)
-		print("Adding relation " + rel.to_string() + " to " + self.name)
+		self.incoming_relations = None
+		if verbose and RELATION_ADDED.enabled(tracing.DEBUG):
+			RELATION_ADDED.emit(tracing.DEBUG, lambda r, q: "Adding relation " + r.to_string() + " to " + q.name, rel, self)
 
 	def set_value(self, magnitude=None, derivative=None, derivative_2nd=None):
 		if magnitude is not None:
@@ -185,14 +206,16 @@ class Quantity:
 	# Assumption: we do not allow any derivatives pointing outside the value space
 	def check_quantity_space_boundaries(self):
 		# For simplicity, we do not check the same for derivative and 2nd order derivative
-		if (self.derivative == Quantity.POSITIVE or (self.derivative == Quantity.ZERO and self.derivative_2nd == Quantity.POSITIVE)) and self.magn_space.index(self.magnitude) == (len(self.magn_space) - 1) and Quantity.is_landmark(self.magnitude):
+		if (self.derivative == Quantity.POSITIVE or (self.derivative == Quantity.ZERO and self.derivative_2nd == Quantity.POSITIVE)) and self.magn_space.index(self.magnitude) == (len(self.magn_space) - 1) and self.is_landmark_value(self.magnitude):
 			return False
-		if (self.derivative == Quantity.NEGATIVE or (self.derivative == Quantity.ZERO and self.derivative_2nd == Quantity.NEGATIVE)) and self.magn_space.index(self.magnitude) == 0 and Quantity.is_landmark(self.magnitude):
+		if (self.derivative == Quantity.NEGATIVE or (self.derivative == Quantity.ZERO and self.derivative_2nd == Quantity.NEGATIVE)) and self.magn_space.index(self.magnitude) == 0 and self.is_landmark_value(self.magnitude):
 			return False
 		return True
 
 	# Collects all influences on values of this quantity. Used for checking relations
 	def get_influences_on_quantity(self, quantities):
+		if self.incoming_relations is not None:
+			return self.get_compiled_influences_on_quantity(quantities)
 		magn_constraints = []
 		deriv_influences = []
 		deriv_2nd_influences = []
@@ -219,6 +242,31 @@ class Quantity:
 					magn_constraints.append(rel.get_val(self))
 		return magn_constraints, deriv_influences, deriv_2nd_influences
 
+	# Same as get_influences_on_quantity, but uses the relation table of the compiled model.
+	# Assumes that the quantities are in the same order as when the model was compiled
+	def get_compiled_influences_on_quantity(self, quantities):
+		magn_constraints = []
+		deriv_influences = []
+		deriv_2nd_influences = []
+		for rel_opt, q1_index, positive, q1_val, self_val in self.incoming_relations:
+			q1 = quantities[q1_index]
+			if rel_opt == Relationship.PROPORTIONAL:
+				deriv_influence = q1.derivative
+				deriv_2nd_influence = q1.derivative_2nd
+			elif rel_opt == Relationship.INFLUENCE:
+				deriv_influence = Quantity.POSITIVE if q1.magnitude == Quantity.POSITIVE or q1.magnitude == Quantity.MAX_VAL else Quantity.ZERO
+				deriv_2nd_influence = q1.derivative
+			else:
+				if q1.magnitude == q1_val:
+					magn_constraints.append(self_val)
+				continue
+			if not positive:
+				deriv_influence = Quantity.inver_derivative(deriv_influence)
+				deriv_2nd_influence = Quantity.inver_derivative(deriv_2nd_influence)
+			deriv_influences.append(deriv_influence)
+			deriv_2nd_influences.append(deriv_2nd_influence)
+		return magn_constraints, deriv_influences, deriv_2nd_influences
+
 	# Check whether all causal relations are fulfilled (ambiguity allowed)
 	def check_causal_relations(self, quantities):
 		magn_constraints, deriv_influences, deriv_2nd_influences = self.get_influences_on_quantity(quantities)
@@ -260,7 +308,7 @@ class Quantity:
 
 	# Tries to resolve quantity space derivatives that point outside valid values. Discontinuity not allowed
 	def resolve_quantity_space_issues(self):
-		if self.magn_space.index(self.magnitude) == (len(self.magn_space) - 1) and Quantity.is_landmark(self.magnitude):
+		if self.magn_space.index(self.magnitude) == (len(self.magn_space) - 1) and self.is_landmark_value(self.magnitude):
 			if self.derivative == Quantity.POSITIVE:
 				if self.derivative_fixed:
 					return False
@@ -274,7 +322,7 @@ class Quantity:
 					self.derivative_2nd = Quantity.ZERO
 					self.derivative_2nd_fixed = True
 
-		if self.magn_space.index(self.magnitude) == 0 and Quantity.is_landmark(self.magnitude):
+		if self.magn_space.index(self.magnitude) == 0 and self.is_landmark_value(self.magnitude):
 			if self.derivative == Quantity.NEGATIVE:
 				if self.derivative_fixed:
 					return False
@@ -370,19 +418,25 @@ class Quantity:
 		elif d == Quantity.NEGATIVE:
 			return Quantity.POSITIVE
 		else:
-			print("Warning: unknown derivative \"" + str(d) + "\" could not be inverted")
+			WARNINGS.emit(tracing.WARNING, "Warning: unknown derivative \"%s\" could not be inverted", d)
 			return d
 
 	# Function for checking whether a value is a landmark or not. Assumes that all values are uniquely defined by a name
 	@staticmethod
 	def is_landmark(val):
 		if val not in Quantity.IS_LANDMARK:
-			print("Warning: Asking for space value \"" + str(val) + "\" being a landmark, but no information was saved")
+			WARNINGS.emit(tracing.WARNING, "Warning: Asking for space value \"%s\" being a landmark, but no information was saved", val)
 			return False
 		else:
 			return Quantity.IS_LANDMARK[val]
 
-	# Adds a new quantity value and saves landmark information
+	# Checks whether a value is a landmark for this quantity. The landmark information of the quantity is used before the default one
+	def is_landmark_value(self, val):
+		if self.landmarks is not None and val in self.landmarks:
+			return self.landmarks[val]
+		return Quantity.is_landmark(val)
+
+	# Adds a new quantity value and saves landmark information for all quantities
 	@staticmethod
 	def add_landmark_information(val_name, is_landmark):
 		Quantity.IS_LANDMARK[val_name] = is_landmark;
@@ -397,17 +451,18 @@ class Relationship:
 	INFLUENCE = 2
 	VALUE_EQ = 3
 
-	def __init__(self, rel_opt, q1, q2, positive=True, add_params=None):
+	# If verbose is False, adding the relation to the quantities is not printed (e.g. when loading models from files)
+	def __init__(self, rel_opt, q1, q2, positive=True, add_params=None, verbose=True):
 		self.rel_opt = rel_opt
 		if self.rel_opt not in [Relationship.PROPORTIONAL, Relationship.INFLUENCE, Relationship.VALUE_EQ]:
-			print("Warning: unknown relation option: " + str(self.rel_opt))
+			WARNINGS.emit(tracing.WARNING, "Warning: unknown relation option: %s", self.rel_opt)
 		self.positive = positive
 		self.q1 = q1
 		self.q2 = q2
 		self.add_params = add_params
 
-		self.q1.add_relation(self)
-		self.q2.add_relation(self)
+		self.q1.add_relation(self, verbose)
+		self.q2.add_relation(self, verbose)
 
 	def to_string(self):
 		s = ""
@@ -418,7 +473,7 @@ class Relationship:
 		elif self.rel_opt == Relationship.VALUE_EQ:
 			s = "VC(" + str(self.add_params[0]) + ", " + str(self.add_params[1]) + ")"
 		else:
-			print("Warning: unknown relation option: " + str(self.rel_opt))
+			WARNINGS.emit(tracing.WARNING, "Warning: unknown relation option: %s", self.rel_opt)
 		return s
 
 	def counter_part(self, q):
@@ -427,7 +482,7 @@ class Relationship:
 		elif q.name == self.q2.name:
 			return self.q1
 		else:
-			print("Warning: counter part could not be found in relationship")
+			WARNINGS.emit(tracing.WARNING, "Warning: counter part could not be found in relationship")
 			return None
 
 	def get_val(self, q):
@@ -436,9 +491,48 @@ class Relationship:
 		elif q.name == self.q2.name:
 			return self.add_params[1]
 		else:
-			print("Warning: value could not been found in relationship")
+			WARNINGS.emit(tracing.WARNING, "Warning: value could not been found in relationship")
 			return None
 
+#################
+## Compiled version of a graph. Replaces the name based lookup of relations by integer indexed tables
+## For every quantity, the incoming relations are saved in their original order as 
+## (relation type, index of source quantity, positive, VC value of source, VC value of quantity)
+#################
+class CompiledModel:
+
+	def __init__(self, entities, quantities, relations):
+		self.quantity_names = [q.name for q in quantities]
+		self.quantity_indices = {q.name: i for i, q in enumerate(quantities)}
+		self.entity_names = [None] * len(quantities)
+		for e in entities:
+			for q in e.quantities:
+				if q.name in self.quantity_indices:
+					self.entity_names[self.quantity_indices[q.name]] = e.name
+		self.relations = relations
+		self.incoming_relations = [list() for _ in quantities]
+		# For every quantity, the indices of the quantities it influences (reverse of incoming relations)
+		self.dependents = [list() for _ in quantities]
+		for q_index, q in enumerate(quantities):
+			for rel in q.relations:
+				if rel.q1.name == q.name:
+					continue
+				q1_index = self.quantity_indices[rel.q1.name]
+				if rel.rel_opt == Relationship.PROPORTIONAL or rel.rel_opt == Relationship.INFLUENCE:
+					self.incoming_relations[q_index].append((rel.rel_opt, q1_index, rel.positive, None, None))
+				elif rel.rel_opt == Relationship.VALUE_EQ:
+					self.incoming_relations[q_index].append((rel.rel_opt, q1_index, True, rel.add_params[0], rel.add_params[1]))
+				else:
+					continue
+				if q_index not in self.dependents[q1_index]:
+					self.dependents[q1_index].append(q_index)
+			q.incoming_relations = self.incoming_relations[q_index]
+
+	# Index of a quantity in the compiled model
+	def get_index(self, q_name):
+		return self.quantity_indices[q_name]
+
+
 #################
 ## Class for defining a state
 ## Saves all values at a state
@@ -452,9 +546,26 @@ class State:
 				self.value_dict[q.name] = (q.magnitude, q.derivative, q.derivative_2nd)
 			else:
 				self.value_dict[q.name] = (q.magnitude, q.derivative)
+		self.key = State.create_key(self.value_dict)
 
 	def __eq__(self, other):
-		return self.value_dict == other.value_dict
+		return self.key == other.key
+
+	def __hash__(self):
+		return hash(self.key)
+
+	# Canonical, hashable representation of the state values. Independent of the order of the quantities
+	@staticmethod
+	def create_key(value_dict):
+		return tuple(sorted(value_dict.items()))
+
+	# Creates a state directly from its values (quantity name -> tuple of values)
+	@staticmethod
+	def from_value_dict(value_dict):
+		s = State([])
+		s.value_dict = value_dict
+		s.key = State.create_key(value_dict)
+		return s
 
 	def print(self):
 		global DEBUG
@@ -463,10 +574,12 @@ class State:
 		print("="*30)
 		print("State")
 		print("-"*30)
-		for q_name, vals in self.value_dict.items():
-			print(q_name + " (" + ",".join(vals) + ")")
+		print(self.to_string(), end="")
 		print("="*30)
 
+	def to_string(self):
+		return "".join([q_name + " (" + ",".join(vals) + ")\n" for q_name, vals in self.value_dict.items()])
+
 
 
 
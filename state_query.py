@@ -0,0 +1,239 @@
+########################################
+## Queries on a simulated state graph ##
+########################################
+
+from condensed_graph import get_successor_lists, find_strongly_connected_components
+from collections import OrderedDict, deque
+import heapq
+import re
+
+# Condition in a state pattern: quantity name, "=", single value or values in parentheses
+PATTERN_CONDITION = re.compile(r"\s*(\w+)\s*=\s*(\([^)]*\)|[^,\s()]+)\s*(,|$)")
+ANY_VALUE = "*"
+# Magnitude, derivative and 2nd order derivative
+MAX_PATTERN_VALUES = 3
+
+
+# Parses a pattern of quantity values, e.g. "Volume=max" or "Volume=(max,+), Inflow=(+,*)". A single value is the magnitude,
+# values in parentheses are magnitude, derivative and 2nd order derivative, "*" matches any value.
+# Dictionaries (quantity name -> value or tuple of values) are accepted as well. Returns a tuple of (quantity name, value index, value)
+def parse_state_pattern(pattern):
+	if isinstance(pattern, dict):
+		items = [(q_name, tuple(vals) if isinstance(vals, (tuple, list)) else (vals,)) for q_name, vals in pattern.items()]
+	else:
+		items = list()
+		position = 0
+		while position < len(pattern):
+			match = PATTERN_CONDITION.match(pattern, position)
+			if match is None or match.end() == position:
+				raise ValueError("Invalid state pattern \"" + str(pattern) + "\" at position " + str(position) + ". Example: \"Volume=(max,+), Inflow=+\"")
+			vals = match.group(2)
+			vals = tuple([v.strip() for v in vals[1:-1].split(",")]) if vals.startswith("(") else (vals,)
+			items.append((match.group(1), vals))
+			position = match.end()
+	conditions = list()
+	for q_name, vals in items:
+		if len(vals) > MAX_PATTERN_VALUES:
+			raise ValueError("Too many values for quantity \"" + str(q_name) + "\" in state pattern \"" + str(pattern) + "\". At most magnitude, derivative and 2nd order derivative can be given")
+		for v_index, v in enumerate(vals):
+			if v != ANY_VALUE:
+				conditions.append((q_name, v_index, v))
+	return tuple(conditions)
+
+# Raises a ValueError if a parsed pattern refers to quantities that are not in the list of names, so that misspelled names
+# do not silently match no state
+def check_pattern_quantities(conditions, q_names):
+	for q_name, _, _ in conditions:
+		if q_name not in q_names:
+			raise ValueError("Unknown quantity \"" + str(q_name) + "\" in state pattern. Options: " + ", ".join(q_names))
+
+# Number of conditions of a parsed pattern that a state does not fulfill
+def count_unmatched(state, conditions):
+	values = state.value_dict
+	return sum([1 for q_name, v_index, v in conditions if v_index >= len(values.get(q_name, tuple())) or values[q_name][v_index] != v])
+
+# Checks whether a state has all values of a parsed pattern
+def state_matches(state, conditions):
+	values = state.value_dict
+	for q_name, v_index, v in conditions:
+		q_vals = values.get(q_name)
+		if q_vals is None or v_index >= len(q_vals) or q_vals[v_index] != v:
+			return False
+	return True
+
+
+#################
+## Queries on a finished state graph: reachability, shortest paths, initial and terminal states and states with certain values.
+## Builds forward and reverse adjacency lists once. For graphs with at most closure_max_states states, the reachability of all
+## pairs of states is precomputed (one bitset per strongly connected component). Results of repeated queries are cached.
+## States are referred to by their index in the state list, paths are lists of state indices.
+## Targets of path queries are a state index, a list of state indices or a state pattern (see parse_state_pattern)
+#################
+class StateGraphQuery:
+
+	CLOSURE_MAX_STATES = 5000
+
+	def __init__(self, state_list, state_connections, closure_max_states=CLOSURE_MAX_STATES, max_cache_size=1024):
+		self.state_list = state_list
+		self.num_states = len(state_list)
+		self.successors = get_successor_lists(state_connections, self.num_states)
+		self.predecessors = [list(state_connections.get(s_index, list())) for s_index in range(self.num_states)]
+		self.max_cache_size = max_cache_size
+		self.cache = OrderedDict()
+		self.closure = None
+		if closure_max_states is not None and self.num_states <= closure_max_states:
+			self.closure = self.compute_closure()
+
+	@staticmethod
+	def from_reasoner(reasoner, **kwargs):
+		return StateGraphQuery(reasoner.state_list, reasoner.state_connections, **kwargs)
+
+	# Strongly connected components are found in reverse topological order, so the components reachable from a component
+	# are always finished before it. Returns the component index of every state and the bitset of reachable states of every component
+	def compute_closure(self):
+		components, component_index = find_strongly_connected_components(self.successors)
+		reachable = list()
+		for c_index, component in enumerate(components):
+			bits = 0
+			for s_index in component:
+				bits |= 1 << s_index
+				for succ in self.successors[s_index]:
+					if component_index[succ] != c_index:
+						bits |= reachable[component_index[succ]]
+			reachable.append(bits)
+		return component_index, reachable
+
+	# Least recently used cache of query results. The function is only called if the result is not cached yet
+	def cached(self, key, function, *args):
+		if key in self.cache:
+			self.cache.move_to_end(key)
+			return self.cache[key]
+		result = function(*args)
+		self.cache[key] = result
+		if len(self.cache) > self.max_cache_size:
+			self.cache.popitem(last=False)
+		return result
+
+	def clear_cache(self):
+		self.cache = OrderedDict()
+
+	def parse_pattern(self, pattern):
+		conditions = parse_state_pattern(pattern)
+		if self.num_states > 0:
+			check_pattern_quantities(conditions, list(self.state_list[0].value_dict.keys()))
+		return conditions
+
+	def get_successors(self, s_index):
+		return list(self.successors[s_index])
+
+	def get_predecessors(self, s_index):
+		return list(self.predecessors[s_index])
+
+	# States without transitions to other states
+	def get_terminal_states(self):
+		return list(self.cached(("terminal",), lambda: [s for s in range(self.num_states) if all(succ == s for succ in self.successors[s])]))
+
+	# States without transitions from other states
+	def get_initial_states(self):
+		return list(self.cached(("initial",), lambda: [s for s in range(self.num_states) if all(pred == s for pred in self.predecessors[s])]))
+
+	# Indices of all states matching the pattern
+	def find_states(self, pattern):
+		conditions = self.parse_pattern(pattern)
+		return list(self.cached(("find", conditions), lambda: [s for s in range(self.num_states) if state_matches(self.state_list[s], conditions)]))
+
+	# Every state can reach itself
+	def is_reachable(self, source, target):
+		if self.closure is not None:
+			component_index, reachable = self.closure
+			return (reachable[component_index[source]] >> target) & 1 == 1
+		return target in self.cached(("reachable", source), self.search_reachable, self.successors, source)
+
+	# Sorted indices of all states reachable from the source (including itself)
+	def get_reachable_states(self, source):
+		if self.closure is not None:
+			component_index, reachable = self.closure
+			bits = reachable[component_index[source]]
+			return [s for s in range(self.num_states) if (bits >> s) & 1]
+		return sorted(self.cached(("reachable", source), self.search_reachable, self.successors, source))
+
+	# Sorted indices of all states from which the target can be reached (including itself)
+	def get_states_reaching(self, target):
+		return sorted(self.cached(("reaching", target), self.search_reachable, self.predecessors, target))
+
+	@staticmethod
+	def search_reachable(adjacency, start):
+		visited = {start}
+		stack = [start]
+		while len(stack) > 0:
+			for n in adjacency[stack.pop()]:
+				if n not in visited:
+					visited.add(n)
+					stack.append(n)
+		return visited
+
+	# Returns a function checking whether a state index is a target, and a hashable key of the target for caching
+	def get_target(self, target):
+		if isinstance(target, int):
+			return (lambda s: s == target), ("state", target)
+		if isinstance(target, (list, tuple, set)):
+			targets = frozenset(target)
+			return (lambda s: s in targets), ("states", targets)
+		conditions = self.parse_pattern(target)
+		return (lambda s: state_matches(self.state_list[s], conditions)), ("pattern", conditions)
+
+	# Shortest path from the source to the target, None if the target is not reachable
+	def get_shortest_path(self, source, target):
+		is_target, target_key = self.get_target(target)
+		path = self.cached(("shortest", source, target_key), self.search_path, source, is_target)
+		return list(path) if path is not None else None
+
+	# Up to k shortest paths without repeated states from the source to the target, ordered by length (Yen's algorithm)
+	def get_k_shortest_paths(self, source, target, k):
+		is_target, target_key = self.get_target(target)
+		return [list(path) for path in self.cached(("k_shortest", source, target_key, k), self.search_k_paths, source, is_target, k)]
+
+	# Breadth first search for the shortest path to the first target. Removed states and transitions are ignored
+	def search_path(self, source, is_target, removed_states=None, removed_transitions=None):
+		if is_target(source):
+			return [source]
+		parents = {source: None}
+		queue = deque([source])
+		while len(queue) > 0:
+			s_index = queue.popleft()
+			for succ in self.successors[s_index]:
+				if succ in parents or (removed_states is not None and succ in removed_states) or \
+				   (removed_transitions is not None and (s_index, succ) in removed_transitions):
+					continue
+				parents[succ] = s_index
+				if is_target(succ):
+					path = [succ]
+					while parents[path[-1]] is not None:
+						path.append(parents[path[-1]])
+					return path[::-1]
+				queue.append(succ)
+		return None
+
+	def search_k_paths(self, source, is_target, k):
+		first_path = self.search_path(source, is_target)
+		if first_path is None or k < 1:
+			return list()
+		paths = [first_path]
+		candidates = list()
+		seen = {tuple(first_path)}
+		while len(paths) < k:
+			previous = paths[-1]
+			for i in range(len(previous) - 1):
+				root = previous[:i+1]
+				# Transitions that would lead to an already found path from the same root
+				removed_transitions = set([(p[i], p[i+1]) for p in paths if len(p) > i + 1 and p[:i+1] == root])
+				spur_path = self.search_path(previous[i], is_target, set(root[:-1]), removed_transitions)
+				if spur_path is not None:
+					path = tuple(root[:-1] + spur_path)
+					if path not in seen:
+						seen.add(path)
+						heapq.heappush(candidates, (len(path), path))
+			if len(candidates) == 0:
+				break
+			paths.append(list(heapq.heappop(candidates)[1]))
+		return paths
@@ -0,0 +1,307 @@
+#########################################
+## Compact storage of explored states ##
+#########################################
+
+from state_graph import Quantity, State, Termination
+from collections.abc import Mapping, MutableMapping
+from copy import copy
+from array import array
+
+
+# Values that the reasoner can set for derivatives, even if they are not in the quantity space (e.g. exogenous changes)
+DERIVATIVE_VALUES = [Quantity.NEGATIVE, Quantity.ZERO, Quantity.POSITIVE]
+
+# Value spaces of a quantity that can be encoded: magnitude space, and derivative spaces extended by all derivative values
+def get_value_spaces(q):
+	return [list(q.magn_space)] + [list(space) + [v for v in DERIVATIVE_VALUES if v not in space] for space in [q.deriv_space, q.deriv_2nd_space]]
+
+
+#################
+## List of states where every state is saved as a single integer (mixed-radix code of the value indices in the quantity spaces)
+## Behaves like a read-only list of State objects. States are only created when they are accessed, e.g. for writing the output files
+#################
+class PackedStateList:
+
+	def __init__(self, quantities):
+		# Value spaces per quantity (see get_value_spaces). 2nd order derivative is only part of the state if it is modelled
+		spaces = list()
+		for q in quantities:
+			q_spaces = get_value_spaces(q)
+			spaces.append(q_spaces if q.model_2nd_derivative else q_spaces[:2])
+		self.set_spaces([q.name for q in quantities], spaces)
+
+	# Creates an empty list for the given quantity names and value spaces, e.g. when reading codes from a file
+	@staticmethod
+	def from_spaces(quantity_names, spaces):
+		state_list = PackedStateList([])
+		state_list.set_spaces(quantity_names, spaces)
+		return state_list
+
+	def set_spaces(self, quantity_names, spaces):
+		self.quantity_names = quantity_names
+		self.spaces = spaces
+		self.value_indices = [[{v: i for i, v in enumerate(space)} for space in q_spaces] for q_spaces in self.spaces]
+		# Multiplier per value slot. The first slot is the least significant one
+		self.multipliers = list()
+		num_codes = 1
+		for q_spaces in self.spaces:
+			q_multipliers = list()
+			for space in q_spaces:
+				q_multipliers.append(num_codes)
+				num_codes *= len(space)
+			self.multipliers.append(q_multipliers)
+		self.num_codes = num_codes
+		# Codes are saved in a typed array as long as they fit in 64 bits. Otherwise we fall back to a list of Python integers
+		self.codes = array('Q') if num_codes <= 2**64 else list()
+
+	# Encodes the values of a quantity list into an integer
+	def encode(self, quantities):
+		code = 0
+		for q, q_indices, q_multipliers in zip(quantities, self.value_indices, self.multipliers):
+			code += q_indices[0][q.magnitude] * q_multipliers[0] + q_indices[1][q.derivative] * q_multipliers[1]
+			if len(q_multipliers) > 2:
+				code += q_indices[2][q.derivative_2nd] * q_multipliers[2]
+		return code
+
+	# Encodes a State object into an integer
+	def encode_state(self, state):
+		code = 0
+		for q_name, q_indices, q_multipliers in zip(self.quantity_names, self.value_indices, self.multipliers):
+			for v, v_indices, multiplier in zip(state.value_dict[q_name], q_indices, q_multipliers):
+				code += v_indices[v] * multiplier
+		return code
+
+	# Creates the State object belonging to a code
+	def decode(self, code):
+		value_dict = dict()
+		for q_name, q_spaces in zip(self.quantity_names, self.spaces):
+			vals = list()
+			for space in q_spaces:
+				code, v_index = divmod(code, len(space))
+				vals.append(space[v_index])
+			value_dict[q_name] = tuple(vals)
+		return State.from_value_dict(value_dict)
+
+	def append_code(self, code):
+		self.codes.append(code)
+
+	def __len__(self):
+		return len(self.codes)
+
+	def __getitem__(self, index):
+		return self.decode(self.codes[index])
+
+	def __iter__(self):
+		for code in self.codes:
+			yield self.decode(code)
+
+
+#################
+## Encodes all values of a quantity list into a single integer and creates quantity lists from codes. Unlike PackedStateList,
+## the 2nd order derivative is always included (also if it is not modelled), as it influences the successors of a state.
+## Used for the states on the frontier and the next states in the successor cache
+#################
+class QuantityCodec:
+
+	def __init__(self, quantities):
+		self.quantities = quantities
+		self.spaces = [get_value_spaces(q) for q in quantities]
+		self.value_indices = [[{v: i for i, v in enumerate(space)} for space in q_spaces] for q_spaces in self.spaces]
+		self.multipliers = list()
+		num_codes = 1
+		for q_spaces in self.spaces:
+			self.multipliers.append([num_codes, num_codes * len(q_spaces[0]), num_codes * len(q_spaces[0]) * len(q_spaces[1])])
+			num_codes *= len(q_spaces[0]) * len(q_spaces[1]) * len(q_spaces[2])
+		self.num_codes = num_codes
+
+	def encode(self, quantities):
+		code = 0
+		for q, q_indices, q_multipliers in zip(quantities, self.value_indices, self.multipliers):
+			code += q_indices[0][q.magnitude] * q_multipliers[0] + q_indices[1][q.derivative] * q_multipliers[1] + q_indices[2][q.derivative_2nd] * q_multipliers[2]
+		return code
+
+	# Copy of the quantities with the values of the code
+	def decode(self, code):
+		quantities = list()
+		for q, q_spaces in zip(self.quantities, self.spaces):
+			vals = list()
+			for space in q_spaces:
+				code, v_index = divmod(code, len(space))
+				vals.append(space[v_index])
+			q_copy = copy(q)
+			q_copy.set_value(*vals)
+			quantities.append(q_copy)
+		return quantities
+
+
+#################
+## Transitions of a packed state graph (target state -> source state -> transition). The transitions to every state are saved as a
+## linked list of edges in flat arrays (source state, changes and next edge of the same target state). The changes of a transition are
+## saved once for all transitions with the same changes, as bytes of 64 bit codes (quantity index, value indices and termination types).
+## The quantities of a transition have the values of the source state, which are saved once per state as code of a QuantityCodec.
+## Transitions are created again when they are accessed, so they can be used like the transition dictionaries of the reasoner
+#################
+class PackedTransitions(MutableMapping):
+
+	# First edge of a state without transition dictionary
+	MISSING = -2
+
+	def __init__(self, codec):
+		self.codec = codec
+		self.q_indices = {q.name: i for i, q in enumerate(codec.quantities)}
+		# Number of values per value index of a change, including "unchanged"
+		self.radix = max([len(space) for q_spaces in codec.spaces for space in q_spaces] + [0]) + 1
+		# Combinations of termination types of a change (with None for unchanged values)
+		self.types = list()
+		self.type_indices = dict()
+		# Changes of the transitions by their index, and the index of every changes tuple
+		self.changes = list()
+		self.change_indices = dict()
+		# Codes of the quantities of every state (by state index)
+		self.state_codes = array('Q') if codec.num_codes <= 2**64 else list()
+		# Per state the first edge of its transitions, per edge its source state, changes and the next edge to the same state (-1 at the end)
+		self.first_edge = array('i')
+		self.edge_sources = array('I')
+		self.edge_changes = array('I')
+		self.next_edge = array('i')
+
+	def add_state(self, code):
+		self.state_codes.append(code)
+		self.first_edge.append(PackedTransitions.MISSING)
+
+	# Index of the changes of a transition
+	def encode(self, t):
+		changes = array('Q', [self.encode_change(self.q_indices[q.name], v, typ) for q, v, typ in zip(t.quantities, t.vals, t.types)]).tobytes()
+		if changes not in self.change_indices:
+			self.change_indices[changes] = len(self.changes)
+			self.changes.append(changes)
+		return self.change_indices[changes]
+
+	def encode_change(self, q_index, vals, types):
+		types = tuple(types)
+		if types not in self.type_indices:
+			self.type_indices[types] = len(self.types)
+			self.types.append(types)
+		code = self.type_indices[types] * len(self.q_indices) + q_index
+		for v, value_indices in zip(vals, self.codec.value_indices[q_index]):
+			code = code * self.radix + (value_indices[v] if v != Termination.UNCHANGED else self.radix - 1)
+		return code
+
+	def decode(self, source, change_index):
+		quantities = self.codec.decode(self.state_codes[source])
+		t_quantities, t_vals, t_types = list(), list(), list()
+		codes = array('Q')
+		codes.frombytes(self.changes[change_index])
+		for code in codes:
+			v_indices = [0, 0, 0]
+			for v_pos in [2, 1, 0]:
+				code, v_indices[v_pos] = divmod(code, self.radix)
+			type_index, q_index = divmod(code, len(self.q_indices))
+			t_quantities.append(quantities[q_index])
+			t_vals.append([space[v_index] if v_index != self.radix - 1 else Termination.UNCHANGED for space, v_index in zip(self.codec.spaces[q_index], v_indices)])
+			t_types.append(list(self.types[type_index]))
+		return Termination(t_quantities, t_vals, t_types)
+
+	# Edges to a state as list of (edge, source state) in the order in which they were added
+	def get_edges(self, goal_state):
+		edges = list()
+		edge = self.first_edge[goal_state]
+		while edge >= 0:
+			edges.append((edge, self.edge_sources[edge]))
+			edge = self.next_edge[edge]
+		edges.reverse()
+		return edges
+
+	def add_edge(self, goal_state, source, change_index):
+		self.edge_sources.append(source)
+		self.edge_changes.append(change_index)
+		self.next_edge.append(max(self.first_edge[goal_state], -1))
+		self.first_edge[goal_state] = len(self.edge_sources) - 1
+
+	# Transitions to a state as dictionary (source state -> transition)
+	def __getitem__(self, goal_state):
+		if goal_state < 0 or goal_state >= len(self.first_edge) or self.first_edge[goal_state] == PackedTransitions.MISSING:
+			raise KeyError(goal_state)
+		return PackedStateTransitions(self, goal_state)
+
+	def __setitem__(self, goal_state, transitions):
+		while len(self.first_edge) <= goal_state:
+			self.first_edge.append(PackedTransitions.MISSING)
+		self.first_edge[goal_state] = -1
+		for source, t in transitions.items():
+			self.add_edge(goal_state, source, self.encode(t))
+
+	def __delitem__(self, goal_state):
+		self[goal_state]
+		self.first_edge[goal_state] = PackedTransitions.MISSING
+
+	def __iter__(self):
+		return iter([goal for goal in range(len(self.first_edge)) if self.first_edge[goal] != PackedTransitions.MISSING])
+
+	def __len__(self):
+		return sum([1 for edge in self.first_edge if edge != PackedTransitions.MISSING])
+
+# Transitions to one state of PackedTransitions. Changes are written through to the packed transitions
+class PackedStateTransitions(MutableMapping):
+
+	def __init__(self, transitions, goal_state):
+		self.transitions = transitions
+		self.goal_state = goal_state
+
+	def find_edge(self, source):
+		edge = self.transitions.first_edge[self.goal_state]
+		while edge >= 0 and self.transitions.edge_sources[edge] != source:
+			edge = self.transitions.next_edge[edge]
+		return edge
+
+	def __getitem__(self, source):
+		edge = self.find_edge(source)
+		if edge < 0:
+			raise KeyError(source)
+		return self.transitions.decode(source, self.transitions.edge_changes[edge])
+
+	def __setitem__(self, source, t):
+		edge = self.find_edge(source)
+		if edge < 0:
+			self.transitions.add_edge(self.goal_state, source, self.transitions.encode(t))
+		else:
+			self.transitions.edge_changes[edge] = self.transitions.encode(t)
+
+	# Removes the edge from the linked list of the state. Its entries in the edge arrays are not used anymore
+	def __delitem__(self, source):
+		transitions = self.transitions
+		previous = -1
+		edge = transitions.first_edge[self.goal_state]
+		while edge >= 0 and transitions.edge_sources[edge] != source:
+			previous, edge = edge, transitions.next_edge[edge]
+		if edge < 0:
+			raise KeyError(source)
+		if previous < 0:
+			transitions.first_edge[self.goal_state] = transitions.next_edge[edge]
+		else:
+			transitions.next_edge[previous] = transitions.next_edge[edge]
+
+	def __contains__(self, source):
+		return self.find_edge(source) >= 0
+
+	def __iter__(self):
+		return iter([source for _, source in self.transitions.get_edges(self.goal_state)])
+
+	def __len__(self):
+		return len(self.transitions.get_edges(self.goal_state))
+
+# Sources of the transitions to every state (target state -> list of source states) of PackedTransitions, in the order in which the
+# transitions were added. Used as state connections of a packed state graph, so that the edges are only saved once. Read-only
+class PackedConnections(Mapping):
+
+	def __init__(self, transitions):
+		self.transitions = transitions
+
+	def __getitem__(self, goal_state):
+		return list(self.transitions[goal_state].keys())
+
+	def __iter__(self):
+		return iter(self.transitions)
+
+	def __len__(self):
+		return len(self.transitions)
@@ -0,0 +1,109 @@
+##################################################
+## Cache for the successors of already seen states ##
+##################################################
+
+from collections import OrderedDict
+
+
+#################
+## Least recently used cache from the code of a state (see QuantityCodec) to its successors. Successors are saved in a compact
+## form as tuple of (changes of the transition, code of the next state), see QualitativeReasoner.encode_successors. Identical changes
+## are shared between the entries, and released when the last entry using them is evicted.
+## Can be shared between multiple simulations and reasoners of the same model. The cache is bound to the fingerprint of the first
+## model it is used for (see bind), and using it for another model raises a ValueError. Cached entries must not be changed by the caller.
+## The size of the cache is the number of cached successors plus one per state, so that states with many successors count more.
+## A single simulation expands every state only once, so the cache only pays off if states are expanded again (e.g. in another
+## simulation, an incremental simulation or when generating behaviors). It is disabled by default
+#################
+class SuccessorCache:
+
+	# max_size is the maximum size of the cache. None for no limit, 0 disables the cache
+	def __init__(self, max_size=0):
+		self.max_size = max_size
+		self.entries = OrderedDict()
+		self.size = 0
+		# Changes of transitions -> [shared changes, number of entries using them], so that identical changes in different entries are saved only once
+		self.shared_changes = dict()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		# Fingerprint of the model the cached successors belong to (see EnvisionmentCache.get_fingerprint). None until bound
+		self.model_fingerprint = None
+
+	def is_enabled(self):
+		return self.max_size != 0
+
+	# Binds the cache to a model. Codes of states are only meaningful for one model, so a cache cannot be used for different models
+	def bind(self, model_fingerprint):
+		if self.model_fingerprint is None:
+			self.model_fingerprint = model_fingerprint
+		elif self.model_fingerprint != model_fingerprint:
+			raise ValueError("Successor cache is already used for a different model. Use a separate cache per model or clear it before")
+
+	@staticmethod
+	def get_entry_size(successors):
+		return len(successors) + 1
+
+	# Returns the cached successors of a state or None if they are not in the cache
+	def get(self, key):
+		successors = self.entries.get(key)
+		if successors is None:
+			self.misses += 1
+			return None
+		self.hits += 1
+		self.entries.move_to_end(key)
+		return successors
+
+	# Returns the cached successors of a state without counting a lookup or changing the order of eviction, e.g. for comparing with another model
+	def peek(self, key):
+		return self.entries.get(key)
+
+	def put(self, key, successors):
+		entry_size = SuccessorCache.get_entry_size(successors)
+		if self.max_size == 0 or (self.max_size is not None and entry_size > self.max_size):
+			return
+		if key in self.entries:
+			self.release(self.entries.pop(key))
+		self.entries[key] = tuple([(self.share_changes(changes), code) for changes, code in successors])
+		self.size += entry_size
+		while self.max_size is not None and self.size > self.max_size:
+			_, evicted = self.entries.popitem(last=False)
+			self.release(evicted)
+			self.evictions += 1
+
+	def share_changes(self, changes):
+		shared = self.shared_changes.get(changes)
+		if shared is None:
+			shared = [changes, 0]
+			self.shared_changes[changes] = shared
+		shared[1] += 1
+		return shared[0]
+
+	# Removes the size of an entry that is no longer in the cache, and the changes that no other entry uses
+	def release(self, successors):
+		self.size -= SuccessorCache.get_entry_size(successors)
+		for changes, _ in successors:
+			shared = self.shared_changes[changes]
+			shared[1] -= 1
+			if shared[1] == 0:
+				del self.shared_changes[changes]
+
+	# Removes all entries. Afterwards, the cache can be used for another model
+	def clear(self):
+		self.entries.clear()
+		self.shared_changes.clear()
+		self.size = 0
+		self.model_fingerprint = None
+
+	def get_statistics(self):
+		lookups = self.hits + self.misses
+		return {"states": len(self.entries),
+				"size": self.size,
+				"max_size": self.max_size,
+				"hits": self.hits,
+				"misses": self.misses,
+				"evictions": self.evictions,
+				"hit_rate": (self.hits / lookups) if lookups > 0 else 0.0}
+
+	def __len__(self):
+		return len(self.entries)
@@ -1,6 +1,22 @@
-from state_graph import Entity, Quantity, Relationship, State, Termination, DEBUG
-from qreasoner import QualitativeReasoner
+from state_graph import Entity, Quantity, Relationship, State, Termination, CompiledModel, DEBUG, create_default_graph, create_extended_graph
+from qreasoner import QualitativeReasoner, StateFrontier
+from successor_cache import SuccessorCache
+from envisionment_cache import EnvisionmentCache
+from model_file import load_model, save_model, get_compiled_filename, compile_model_description, read_model_description, load_compiled_model, get_file_stamp, create_graph_from_compiled
+from visualization import save_transitions
+from binary_graph import save_binary_state_graph, BinaryStateGraph
+from output_sinks import SINK_TYPES, OutputSink, GraphvizRenderer, write_outputs
+from benchmark import generate_synthetic_model, benchmark_model, get_state_graph_memory
+from condensed_graph import CondensedGraph, find_strongly_connected_components, get_successor_lists
+from vectorized_checks import numpy_available
+from behaviors import generate_behaviors
+import tracing
+from copy import copy
 import sys
+import os
+import gzip
+import shutil
+import tempfile
 
 # Class for testing basic functionalities of reasoner
 # Is purely based on checking outputs in terminal currently
@@ -14,7 +30,32 @@ class ReasonerTest:
 				 self.test_value_terminations,
 				 self.test_exogenous_terminations,
 				 self.test_cross_product,
-				 self.test_quantity_valid_checking]
+				 self.test_quantity_valid_checking,
+				 self.test_exploration_orders,
+				 self.test_all_states_backtracking,
+				 self.test_lazy_combinations,
+				 self.test_compiled_influences,
+				 self.test_packed_states,
+				 self.test_vectorized_checks,
+				 self.test_parallel_exploration,
+				 self.test_successor_cache,
+				 self.test_cross_product_conflicts,
+				 self.test_next_state_propagation,
+				 self.test_incremental_simulation,
+				 self.test_envisionment_cache,
+				 self.test_model_file,
+				 self.test_compressed_output,
+				 self.test_binary_state_graph,
+				 self.test_output_sinks,
+				 self.test_condensed_graph,
+				 self.test_synthetic_models,
+				 self.test_engine_statistics,
+				 self.test_tracing_events,
+				 self.test_state_graph_query,
+				 self.test_goal_directed_exploration,
+				 self.test_priority_max_depth,
+				 self.test_dependent_projection,
+				 self.test_behavior_generator]
 
 		print("="*30)
 		print("Starting " + str(len(tests)) + " tests...")
@@ -151,6 +192,587 @@ class ReasonerTest:
 
 		return True
 
+	def test_exploration_orders(self):
+		# All exploration orders have to find the same states, only the numbering may differ
+		found_states = list()
+		for order in QualitativeReasoner.EXPLORATION_ORDERS:
+			reasoner = QualitativeReasoner()
+			reasoner.frontier = StateFrontier(order)
+			reasoner.add_to_state_list(reasoner.quantities, None)
+			reasoner.explore()
+			found_states.append(set([s.key for s in reasoner.state_list]))
+			print("Exploration order " + order + ": found " + str(len(reasoner.state_list)) + " states")
+		return all([f == found_states[0] for f in found_states])
+
+	def test_all_states_backtracking(self):
+		# Backtracking search has to find the same valid states as checking every combination
+		reasoner = QualitativeReasoner()
+		reasoner.try_all_states()
+
+		brute_force_states = set()
+		options = [QualitativeReasoner.get_quantity_value_options(q) for q in reasoner.quantities]
+		for c in QualitativeReasoner.iterate_all_combinations(len(options), [len(o) for o in options]):
+			quants = QualitativeReasoner.copy_quantities(reasoner.quantities)
+			for q, o_index, o in zip(quants, c, options):
+				q.set_value(*o[o_index])
+			if all([q.is_quantity_valid(quants) for q in quants]):
+				brute_force_states.add(State(quants).key)
+		print("Found " + str(len(brute_force_states)) + " valid states")
+		return brute_force_states == set(reasoner.state_index.keys())
+
+	def test_lazy_combinations(self):
+		# Lazy enumeration has to give the same combinations in the same order as building the list of all combinations.
+		# Includes no positions, empty value spaces and single values
+		for num, poss in [(0, 2), (1, 2), (3, 2), (0, []), (1, [1]), (1, [3]), (3, [2, 1, 3]), (3, [2, 0, 3]), (2, [0, 0]), (4, [1, 1, 1, 1])]:
+			combs = [list(c) for c in QualitativeReasoner.iterate_all_combinations(num, poss)]
+			if combs != ReasonerTest.generate_combinations_list(num, poss) or len(combs) != QualitativeReasoner.count_all_combinations(num, poss):
+				print("Different combinations for " + str(num) + " positions and values " + str(poss))
+				return False
+		return QualitativeReasoner.generate_all_combinations(2) == [[1, 1], [1, 0], [0, 1], [0, 0]]
+
+	def test_compiled_influences(self):
+		# Influences from the compiled relation tables must be the same as the ones found by name
+		reasoner = QualitativeReasoner()
+		options = [QualitativeReasoner.get_quantity_value_options(q) for q in reasoner.quantities]
+		for c in QualitativeReasoner.iterate_all_combinations(len(options), [len(o) for o in options]):
+			quants = QualitativeReasoner.copy_quantities(reasoner.quantities)
+			for q, o_index, o in zip(quants, c, options):
+				q.set_value(*o[o_index])
+			for q in quants:
+				uncompiled_q = copy(q)
+				uncompiled_q.incoming_relations = None
+				if q.get_influences_on_quantity(quants) != uncompiled_q.get_influences_on_quantity(quants):
+					return False
+		return True
+
+	def test_packed_states(self):
+		# Packed states have to give the same states in the same order, the same connections and the same transitions as State and 
+		# Termination objects. The state graph has to take several times less memory for the extended graph (with all states) and
+		# more than ten times less for a larger synthetic model
+		correct = True
+		for name, create_graph, generate_all_states, min_factor in [("extended graph", create_extended_graph, True, 6), 
+																	 ("synthetic mesh", lambda: generate_synthetic_model(5, "mesh", density=0.3, seed=3), False, 10),
+																	 ("restricted derivative graph", ReasonerTest.create_restricted_derivative_graph, False, 1)]:
+			state_keys = list()
+			connections = list()
+			transition_strings = list()
+			memory = list()
+			for packed_states in [False, True]:
+				reasoner = QualitativeReasoner(create_graph(), packed_states=packed_states)
+				reasoner.add_to_state_list(reasoner.quantities, None)
+				reasoner.explore()
+				if generate_all_states:
+					reasoner.try_all_states()
+				state_keys.append([s.key for s in reasoner.state_list])
+				connections.append(dict(reasoner.state_connections.items()))
+				transition_strings.append([[(source, t.to_string()) for source, t in reasoner.state_transitions[s_index].items()] for s_index in range(len(reasoner.state_list))])
+				memory.append(get_state_graph_memory(reasoner))
+			print("State graph memory of the %s: %.1f KiB, packed: %.1f KiB (%.1f times less)" % (name, memory[0] / 1024, memory[1] / 1024, memory[0] / memory[1]))
+			correct = correct and state_keys[0] == state_keys[1] and connections[0] == connections[1] and \
+					  transition_strings[0] == transition_strings[1] and memory[1] * min_factor < memory[0]
+		return correct
+
+	def test_vectorized_checks(self):
+		# Vectorized checks have to find the same states in the same order as the backtracking search
+		if not numpy_available():
+			print("NumPy not installed, skipping vectorized checks")
+			return True
+		state_keys = list()
+		for vectorized in [False, True]:
+			reasoner = QualitativeReasoner()
+			reasoner.try_all_states(vectorized=vectorized)
+			state_keys.append([s.key for s in reasoner.state_list])
+		return state_keys[0] == state_keys[1]
+
+	def test_parallel_exploration(self):
+		# Parallel exploration has to create the same state graph (including numbering) as a breadth first search
+		reasoners = list()
+		for workers in [1, 2]:
+			reasoner = QualitativeReasoner()
+			reasoner.frontier = StateFrontier(QualitativeReasoner.BREADTH_FIRST)
+			reasoner.start_workers(workers)
+			reasoner.add_to_state_list(reasoner.quantities, None)
+			reasoner.explore()
+			reasoner.stop_workers()
+			reasoners.append(reasoner)
+		# Only an explicitly requested priority exploration is warned about, depth first search (default) is replaced silently
+		output_dir = tempfile.mkdtemp()
+		filenames = {"filename_" + f: os.path.join(output_dir, f + ".txt") for f in ["state_graph", "state_transitions", "intra_state", "inter_state"]}
+		warnings = list()
+		handler = lambda event: warnings.append(event)
+		tracing.subscribe(handler, [tracing.WARNINGS.name])
+		num_warnings = list()
+		for exploration_order in [QualitativeReasoner.DEPTH_FIRST, QualitativeReasoner.PRIORITY]:
+			QualitativeReasoner().simulate(exploration_order=exploration_order, workers=2, **filenames)
+			num_warnings.append(len(warnings))
+		tracing.unsubscribe(handler)
+		shutil.rmtree(output_dir)
+		return [s.key for s in reasoners[0].state_list] == [s.key for s in reasoners[1].state_list] and \
+			   reasoners[0].state_connections == reasoners[1].state_connections and num_warnings == [0, 1]
+
+	def test_successor_cache(self):
+		# Second exploration of the same model has to take all successors from an unbounded cache and find the same states and transitions.
+		# A bounded cache must not grow over its size, and without a cache (default) the same state graph has to be found
+		state_graphs = list()
+		caches = [SuccessorCache(None), SuccessorCache(50), None]
+		max_sizes = list()
+		for successor_cache in caches:
+			reasoner = QualitativeReasoner(successor_cache=successor_cache)
+			max_size = 0
+			for _ in range(2):
+				reasoner.reset_state_graph()
+				reasoner.add_to_state_list(reasoner.quantities, None)
+				reasoner.explore()
+				state_graphs.append(([s.key for s in reasoner.state_list], [[t.to_string() for t in reasoner.state_transitions[s_index].values()] for s_index in range(len(reasoner.state_list))]))
+				max_size = max(max_size, reasoner.successor_cache.size)
+			max_sizes.append(max_size)
+			print("Successor cache: " + str(reasoner.successor_cache.get_statistics()))
+		num_states = len(state_graphs[0][0])
+		# Changes of evicted entries have to be released, so the shared changes of a full cache stay within its size
+		small_cache = SuccessorCache(10)
+		small_reasoner = QualitativeReasoner(generate_synthetic_model(4, "mesh", density=0.3, num_exogenous=2, seed=1), successor_cache=small_cache)
+		small_reasoner.add_to_state_list(small_reasoner.quantities, None)
+		max_shared = 0
+		while len(small_reasoner.frontier) > 0:
+			s_index, depth, quantities = small_reasoner.frontier.pop()
+			for t, next_state_quant in small_reasoner.get_successors(quantities):
+				small_reasoner.add_to_state_list(next_state_quant, s_index, t, depth + 1)
+			max_shared = max(max_shared, len(small_cache.shared_changes))
+		cached_changes = set([changes for successors in small_cache.entries.values() for changes, _ in successors])
+		# A cache can be shared between reasoners of the same model, but not with a reasoner of another model
+		shared_cache = SuccessorCache(None)
+		QualitativeReasoner(create_default_graph(bidirectional_vc=False), successor_cache=shared_cache)
+		QualitativeReasoner(create_default_graph(bidirectional_vc=False), successor_cache=shared_cache)
+		try:
+			QualitativeReasoner(create_default_graph(bidirectional_vc=True), successor_cache=shared_cache)
+			other_model_rejected = False
+		except ValueError:
+			other_model_rejected = True
+		# Peeking at an entry must not count as lookup
+		lookups = caches[0].hits + caches[0].misses
+		peeked = caches[0].peek(next(iter(caches[0].entries))) is not None and caches[0].hits + caches[0].misses == lookups
+		return all([g == state_graphs[0] for g in state_graphs]) and caches[0].hits == num_states and caches[0].misses == num_states and \
+			   max_sizes[1] <= 50 and caches[1].evictions > 0 and max_sizes[2] == 0 and reasoner.successor_cache.hits == 0 and \
+			   small_cache.evictions > 0 and max_shared <= 10 and set(small_cache.shared_changes.keys()) == cached_changes and \
+			   other_model_rejected and peeked
+
+	def test_cross_product_conflicts(self):
+		# Pruning conflicting terminations has to give the same transitions as combining all subsets of terminations
+		reasoner = QualitativeReasoner()
+		reasoner.try_all_states()
+		for state_index in range(len(reasoner.state_list)):
+			state = reasoner.state_list[state_index]
+			quantities = QualitativeReasoner.copy_quantities(reasoner.quantities)
+			for q in quantities:
+				q.set_value(*state.value_dict[q.name])
+			eps_term = reasoner.create_epsilon_terminations(quantities)
+			extra_terms = reasoner.create_value_terminations(quantities) + reasoner.create_exogenous_terminations(quantities) + reasoner.create_ambiguous_terminations(quantities)
+			all_terms = list()
+			for comb in QualitativeReasoner.iterate_all_combinations(len(extra_terms)):
+				term = eps_term.copy()
+				if all([term.combine_terminations(t) for c, t in zip(comb, extra_terms) if c == 1]):
+					all_terms.append(term.to_string())
+			if all_terms != [t.to_string() for t in reasoner.create_cross_product(eps_term, extra_terms)]:
+				return False
+		return True
+
+	def test_next_state_propagation(self):
+		# Only checking quantities affected by a transition must give the same next states as checking all quantities
+		reasoner = QualitativeReasoner()
+		reasoner.try_all_states()
+		for state in reasoner.state_list:
+			quantities = QualitativeReasoner.copy_quantities(reasoner.quantities)
+			for q in quantities:
+				q.set_value(*state.value_dict[q.name])
+			eps_term = reasoner.create_epsilon_terminations(quantities)
+			extra_terms = reasoner.create_value_terminations(quantities) + reasoner.create_exogenous_terminations(quantities) + reasoner.create_ambiguous_terminations(quantities)
+			for t in reasoner.create_cross_product(eps_term, extra_terms):
+				next_states = [reasoner.create_next_state(QualitativeReasoner.copy_quantities(quantities), t, source_valid) for source_valid in [False, True]]
+				next_states = [(State(n).key if n is not None else None) for n in next_states]
+				if next_states[0] != next_states[1]:
+					return False
+		return True
+
+	def test_incremental_simulation(self):
+		# Simulating after adding relations has to find the same state graph as simulating the edited model from scratch
+		output_dir = tempfile.mkdtemp()
+		filenames = {"filename_" + f: os.path.join(output_dir, f + ".txt") for f in ["state_graph", "state_transitions", "intra_state", "inter_state"]}
+		previous_reasoner = QualitativeReasoner(create_default_graph(bidirectional_vc=False), successor_cache=SuccessorCache(None))
+		previous_reasoner.simulate(**filenames)
+		reasoners = [QualitativeReasoner(create_default_graph(bidirectional_vc=True)) for _ in range(2)]
+		reasoners[0].simulate(**filenames)
+		reasoners[1].simulate_incremental(previous_reasoner, **filenames)
+		# Editing only the landmarks of a quantity changes the state space, so nothing may be reused
+		landmark_reasoners = [QualitativeReasoner(create_default_graph(bidirectional_vc=False)) for _ in range(2)]
+		for reasoner in landmark_reasoners:
+			[q for q in reasoner.quantities if q.name == "Volume"][0].landmarks = {"max": False}
+		landmark_reasoners[0].simulate(**filenames)
+		landmark_reasoners[1].simulate_incremental(previous_reasoner, **filenames)
+		# Without a successor cache of the previous reasoner nothing can be reused, which has to be warned about
+		warnings = list()
+		handler = lambda event: warnings.append(event)
+		tracing.subscribe(handler, [tracing.WARNINGS.name])
+		QualitativeReasoner(create_default_graph(bidirectional_vc=True)).simulate_incremental(QualitativeReasoner(create_default_graph(bidirectional_vc=False)), **filenames)
+		tracing.unsubscribe(handler)
+		shutil.rmtree(output_dir)
+		return [s.key for s in reasoners[0].state_list] == [s.key for s in reasoners[1].state_list] and \
+			   reasoners[0].state_connections == reasoners[1].state_connections and reasoners[1].reused_transitions > 0 and \
+			   [s.key for s in landmark_reasoners[0].state_list] == [s.key for s in landmark_reasoners[1].state_list] and \
+			   landmark_reasoners[0].state_connections == landmark_reasoners[1].state_connections and \
+			   landmark_reasoners[1].reused_transitions == 0 and landmark_reasoners[1].model_diff.changed_quantities == ["Volume"] and \
+			   any("successor cache" in e.message() for e in warnings)
+
+	def test_envisionment_cache(self):
+		# Second simulation of the same model has to load the same state graph from the cache. A changed model must not use it
+		output_dir = tempfile.mkdtemp()
+		filenames = {"filename_" + f: os.path.join(output_dir, f + ".txt") for f in ["state_graph", "state_transitions", "intra_state", "inter_state"]}
+		cache = EnvisionmentCache(os.path.join(output_dir, "cache.db"))
+		reasoners = [QualitativeReasoner(create_default_graph(bidirectional_vc=bidirectional_vc)) for bidirectional_vc in [False, False, True]]
+		transition_strings = list()
+		for reasoner in reasoners:
+			reasoner.simulate(envisionment_cache=cache, **filenames)
+			transition_strings.append([[t.to_string() for t in reasoner.state_transitions[s_index].values()] for s_index in range(len(reasoner.state_list))])
+		num_entries = len(cache)
+		# Entries that cannot be read as state graph data are treated as missing
+		with cache.connect() as connection:
+			connection.execute("INSERT INTO envisionments VALUES (?, 0, 0, 0, ?)", ("broken", b"not a state graph"))
+		broken_ignored = cache.load("broken") is None
+		shutil.rmtree(output_dir)
+		# Different landmarks of a quantity have to change the fingerprint
+		landmark_reasoner = QualitativeReasoner(create_default_graph(bidirectional_vc=False))
+		[q for q in landmark_reasoner.quantities if "max" in q.magn_space][0].landmarks = {"max": False}
+		fingerprints = [EnvisionmentCache.get_fingerprint(r.model, r.quantities, dict()) for r in [reasoners[0], landmark_reasoner]]
+		return [s.key for s in reasoners[0].state_list] == [s.key for s in reasoners[1].state_list] and \
+			   reasoners[0].state_connections == reasoners[1].state_connections and transition_strings[0] == transition_strings[1] and num_entries == 2 and \
+			   fingerprints[0] != fingerprints[1] and broken_ignored
+
+	def test_model_file(self):
+		# Saving the default graph as model file and loading it (parsed and compiled) has to give the same model
+		output_dir = tempfile.mkdtemp()
+		filename = os.path.join(output_dir, "model.json")
+		graph = create_default_graph()
+		save_model(filename, graph)
+		models = [CompiledModel(*graph)] + [CompiledModel(*load_model(filename)) for _ in range(2)]
+		compiled_exists = os.path.isfile(get_compiled_filename(filename))
+		# The compiled file (JSON) has to give exactly the compiled tuples
+		compiled_equal = load_compiled_model(get_compiled_filename(filename), get_file_stamp(filename)) == compile_model_description(read_model_description(filename))
+		# Landmarks of a model file only apply to the quantities of that model
+		with open(filename, "r") as f:
+			description = f.read()
+		landmark_filename = os.path.join(output_dir, "landmarks.json")
+		with open(landmark_filename, "w") as f:
+			f.write(description.replace("{\n", "{\n\t\"landmarks\": {\"max\": false},\n", 1))
+		landmark_quantities = load_model(landmark_filename)[1]
+		save_model(landmark_filename, load_model(landmark_filename))
+		saved_quantities = load_model(landmark_filename, use_compiled=False)[1]
+		shutil.rmtree(output_dir)
+		# Missing or malformed fields are reported with the field and the quantity or relation
+		quantity = {"name": "Volume", "entity": "Container"}
+		relation = {"type": "VC", "q1": "Volume", "q2": "Volume", "values": ["max", "max"]}
+		invalid_descriptions = [({"quantities": [quantity]}, "\"entities\" of model"),
+								({"entities": ["Container"], "quantities": [{"entity": "Container"}]}, "\"name\" of quantity 1"),
+								({"entities": ["Container"], "quantities": [{"name": "Volume"}]}, "\"entity\" of quantity \"Volume\""),
+								({"entities": ["Container"], "quantities": [dict(quantity, magn_space="0+")]}, "\"magn_space\" of quantity \"Volume\""),
+								({"entities": ["Container"], "quantities": [dict(quantity, deriv_space=[0, 1])]}, "\"deriv_space\" of quantity \"Volume\""),
+								({"entities": ["Container"], "quantities": [quantity], "relations": [{"type": "I+", "q1": "Volume"}]}, "\"q2\" of relation 1 (I+)"),
+								({"entities": ["Container"], "quantities": [quantity], "relations": [dict(relation, values=None)]}, "\"values\" of relation 1 (VC)"),
+								({"entities": ["Container"], "quantities": [quantity], "landmarks": ["max"]}, "\"landmarks\" of model"),
+								({"entities": ["Container"], "quantities": [quantity], "landmarks": {"max": "false"}}, "\"landmarks\" of model"),
+								({"entities": ["Container"], "quantities": [dict(quantity, exogenous="false")]}, "\"exogenous\" of quantity \"Volume\""),
+								({"entities": ["Container"], "quantities": [dict(quantity, model_2nd_derivative=1)]}, "\"model_2nd_derivative\" of quantity \"Volume\""),
+								({"entities": ["Container"], "quantities": [quantity, quantity]}, "Duplicate quantity name \"Volume\""),
+								({"entities": ["Container", "Container"], "quantities": [quantity]}, "Duplicate entity name \"Container\"")]
+		messages = list()
+		for invalid_description, expected_message in invalid_descriptions:
+			try:
+				compile_model_description(invalid_description)
+				messages.append(None)
+			except ValueError as e:
+				messages.append(expected_message in str(e))
+		valid = compile_model_description({"entities": ["Container"], "quantities": [quantity], "relations": [relation]})
+		landmarks_separate = not any([q.is_landmark_value(Quantity.MAX_VAL) for q in landmark_quantities + saved_quantities]) and \
+							 Quantity.is_landmark(Quantity.MAX_VAL) and all([q.is_landmark_value(Quantity.MAX_VAL) for q in create_default_graph()[1]])
+		return compiled_exists and compiled_equal and landmarks_separate and all(messages) and len(valid[3]) == 1 and all([m.quantity_names == models[0].quantity_names and m.incoming_relations == models[0].incoming_relations for m in models])
+
+	def test_compressed_output(self):
+		# Output files written with gzip have to contain the same text as the uncompressed files
+		output_dir = tempfile.mkdtemp()
+		reasoner = QualitativeReasoner()
+		reasoner.add_to_state_list(reasoner.quantities, None)
+		reasoner.explore()
+		contents = list()
+		for filename in ["transitions.txt", "transitions.txt.gz"]:
+			filename = os.path.join(output_dir, filename)
+			save_transitions(filename, reasoner.state_list, reasoner.state_connections, reasoner.state_transitions)
+			with (gzip.open(filename, "rt") if filename.endswith(".gz") else open(filename, "r")) as f:
+				contents.append(f.read())
+		shutil.rmtree(output_dir)
+		return contents[0] == contents[1] and len(contents[0]) > 0
+
+	def test_binary_state_graph(self):
+		# States and transitions read from the binary file have to match the explored state graph. This includes derivative values
+		# that are not in the derivative space of a quantity, but can be set by the engine (restricted derivative graph)
+		output_dir = tempfile.mkdtemp()
+		filename = os.path.join(output_dir, "state_graph.bin")
+		correct = True
+		for graph in [create_default_graph(), ReasonerTest.create_restricted_derivative_graph()]:
+			reasoner = QualitativeReasoner(graph)
+			reasoner.add_to_state_list(reasoner.quantities, None)
+			reasoner.explore()
+			# Transitions are not necessarily ordered by goal state, so the reversed order has to be found as well
+			reversed_transitions = {goal_state: reasoner.state_transitions[goal_state] for goal_state in reversed(list(reasoner.state_transitions.keys()))}
+			for state_transitions in [reasoner.state_transitions, reversed_transitions]:
+				save_binary_state_graph(filename, reasoner.quantities, reasoner.state_list, reasoner.state_connections, state_transitions)
+				with BinaryStateGraph(filename) as binary_graph:
+					correct = correct and [binary_graph.get_state(i).key for i in range(len(binary_graph))] == [s.key for s in reasoner.state_list]
+					for goal_state, connections in reasoner.state_transitions.items():
+						for source_state, transition in connections.items():
+							edge_index = binary_graph.find_edge(source_state, goal_state)
+							changes = sorted([(q.name, v) for q, vals in zip(transition.quantities, transition.vals) for v in vals if v != Termination.UNCHANGED])
+							correct = correct and edge_index >= 0 and changes == sorted([(c[0], c[2]) for c in binary_graph.get_edge_causes(edge_index)])
+					correct = correct and binary_graph.num_edges == sum([len(c) for c in reasoner.state_connections.values()])
+		shutil.rmtree(output_dir)
+		return correct
+
+	def test_output_sinks(self):
+		# Writing the sinks concurrently has to give the same files as writing them one after another
+		output_dir = tempfile.mkdtemp()
+		reasoner = QualitativeReasoner()
+		reasoner.add_to_state_list(reasoner.quantities, None)
+		reasoner.explore()
+		contents = list()
+		for workers in [1, 4]:
+			sinks = [SINK_TYPES[name](os.path.join(output_dir, name + str(workers))) for name in ["dot", "transitions", "inter", "json", "binary"]]
+			write_outputs(sinks, reasoner, workers=workers)
+			file_contents = list()
+			for sink in sinks:
+				with open(sink.filename, "rb") as f:
+					file_contents.append(f.read())
+			contents.append(file_contents)
+		shutil.rmtree(output_dir)
+		try:
+			OutputSink("file")
+			abstract = False
+		except TypeError:
+			abstract = True
+		# Failed renderings and renderings that take longer than the timeout are reported, running ones are waited for again
+		renderer = GraphvizRenderer()
+		renderer.get_command = lambda dot_filename: [sys.executable, "-c", dot_filename]
+		renderer.render("import sys; sys.exit(1)", 1)
+		failed = renderer.wait(timeout=10) == False and len(renderer.processes) == 0
+		running = renderer.render("import time; time.sleep(10)", 1)
+		timed_out = renderer.wait(timeout=0.1) == False and renderer.processes == [running]
+		running.kill()
+		renderer.wait()
+		return contents[0] == contents[1] and abstract and failed and timed_out and len(renderer.processes) == 0
+
+	def test_condensed_graph(self):
+		# Every state has to be in exactly one node, states of a cycle in the same node (without grouping), and the node budget has to be kept
+		reasoner = QualitativeReasoner()
+		reasoner.add_to_state_list(reasoner.quantities, None)
+		reasoner.explore()
+		reasoner.try_all_states()
+		components = find_strongly_connected_components(get_successor_lists(reasoner.state_connections, len(reasoner.state_list)))[0]
+		correct = True
+		for options in [dict(), dict(group_quantities=["Volume"]), dict(collapse_scc=False, group_quantities=["Volume"]), dict(max_nodes=1), dict(max_nodes=2), dict(max_nodes=4)]:
+			condensed = CondensedGraph(reasoner.state_list, reasoner.state_connections, **options)
+			correct = correct and sorted([s for node in condensed.nodes for s in node]) == list(range(len(reasoner.state_list)))
+			if options.get("collapse_scc", True) and "group_quantities" not in options:
+				correct = correct and all([len(set([condensed.node_index[s] for s in c])) == 1 for c in components])
+			if "max_nodes" in options:
+				correct = correct and len(condensed) == options["max_nodes"]
+			print("Condensed graph with options " + str(options) + ": " + str(len(condensed)) + " nodes, " + str(len(condensed.edges)) + " edges")
+		return correct
+
+	def test_synthetic_models(self):
+		# Synthetic benchmark models have to be reproducible and give results for all phases
+		correct = True
+		for topology in ["chain", "mesh"]:
+			graphs = [generate_synthetic_model(4, topology, density=0.5, seed=1) for _ in range(2)]
+			correct = correct and CompiledModel(*graphs[0]).incoming_relations == CompiledModel(*graphs[1]).incoming_relations
+			result = benchmark_model(graphs[0], repeat=1, track_memory=False)
+			print("Synthetic " + topology + " model: " + str(result["num_states"]) + " states, phases " + ", ".join(result["phases"].keys()))
+			correct = correct and result["num_states"] > 1 and len(result["phases"]) == 4
+		# Every quantity (also every exogenous one) has to be part of a relation
+		for num_exogenous in [1, 3]:
+			entities, quantities, relations = generate_synthetic_model(6, "chain", num_exogenous=num_exogenous, seed=1)
+			related = set([r.q1.name for r in relations] + [r.q2.name for r in relations])
+			correct = correct and all([q.name in related for q in quantities])
+		return correct
+
+	def test_engine_statistics(self):
+		# Collecting statistics must not change the state graph, and the counters have to match it
+		reasoners = [QualitativeReasoner(collect_statistics=collect) for collect in [False, True]]
+		for reasoner in reasoners:
+			reasoner.reset_state_graph()
+			reasoner.add_to_state_list(reasoner.quantities, None)
+			reasoner.explore()
+		statistics = reasoners[1].get_statistics()
+		print(reasoners[1].stats.summary_line())
+		counters = statistics["counters"]
+		return reasoners[0].get_statistics() is None and [s.key for s in reasoners[0].state_list] == [s.key for s in reasoners[1].state_list] and \
+			   counters["new_states"] == len(reasoners[1].state_list) and counters["expanded_states"] == len(reasoners[1].state_list) and \
+			   counters["valid_transitions"] + counters["invalid_transitions"] == counters["cross_product_transitions"] and \
+			   counters["cross_product_transitions"] <= counters["cross_product_candidates"]
+
+	def test_tracing_events(self):
+		# Every added state has to be reported once with its index, and channels without handlers have to be inactive again
+		events = list()
+		handler = lambda event: events.append(event)
+		tracing.subscribe(handler, [tracing.STATE_ADDED.name, tracing.TRANSITION_REJECTED.name])
+		reasoner = QualitativeReasoner()
+		reasoner.reset_state_graph()
+		reasoner.add_to_state_list(reasoner.quantities, None)
+		reasoner.explore()
+		tracing.unsubscribe(handler)
+		added = [e.args[0] for e in events if e.channel == tracing.STATE_ADDED.name]
+		rejected = [e for e in events if e.channel == tracing.TRANSITION_REJECTED.name]
+		# Handlers subscribed with a higher level do not enable debug events. Progress events carry the done and total number of combinations
+		progress_events = list()
+		progress_handler = lambda event: progress_events.append(event)
+		tracing.subscribe(progress_handler, [tracing.STATE_ADDED.name, tracing.PROGRESS.name], level=tracing.INFO)
+		debug_disabled = not tracing.STATE_ADDED.enabled(tracing.DEBUG) and tracing.STATE_ADDED.enabled(tracing.INFO)
+		QualitativeReasoner().try_all_states()
+		tracing.unsubscribe(progress_handler)
+		progress = [e.args for e in progress_events if e.channel == tracing.PROGRESS.name]
+		return added == list(range(len(reasoner.state_list))) and len(rejected) > 0 and \
+			   all(e.message().startswith("Adding new state") for e in events if e.channel == tracing.STATE_ADDED.name) and \
+			   not tracing.STATE_ADDED.active and not tracing.TRANSITION_REJECTED.active and debug_disabled and \
+			   len(progress) > 0 and all(len(args) == 2 and 0 <= args[0] <= args[1] for args in progress) and \
+			   all(e.channel == tracing.PROGRESS.name for e in progress_events)
+
+	def test_state_graph_query(self):
+		# Reachability with and without precomputed closure has to be the same, and paths have to follow transitions to matching states
+		reasoner = QualitativeReasoner(create_extended_graph())
+		reasoner.reset_state_graph()
+		reasoner.add_to_state_list(reasoner.quantities, None)
+		reasoner.explore()
+		queries = [reasoner.get_query(), reasoner.get_query(closure_max_states=0)]
+		num_states = len(reasoner.state_list)
+		same_reachability = all(queries[0].is_reachable(a, b) == queries[1].is_reachable(a, b) for a in range(num_states) for b in range(num_states))
+		targets = queries[0].find_states("Volume=max")
+		paths = queries[0].get_k_shortest_paths(0, "Volume=max", 5)
+		valid_paths = all(p[0] == 0 and p[-1] in targets and len(set(p)) == len(p) and
+						  all(p[i] in reasoner.state_connections[p[i+1]] for i in range(len(p) - 1)) for p in paths)
+		try:
+			queries[0].find_states("Volum=max")
+			unknown_rejected = False
+		except ValueError:
+			unknown_rejected = True
+		# More values than magnitude, derivative and 2nd order derivative would never match any state
+		too_many_rejected = list()
+		for pattern in ["Volume=(max,+,+,+)", {"Volume": ("max", "+", "+", "+")}]:
+			try:
+				queries[0].find_states(pattern)
+				too_many_rejected.append(False)
+			except ValueError:
+				too_many_rejected.append(True)
+		return same_reachability and len(targets) > 0 and valid_paths and len(paths) == 5 and \
+			   paths[0] == queries[1].get_shortest_path(0, "Volume=max") and [len(p) for p in paths] == sorted([len(p) for p in paths]) and \
+			   queries[0].get_reachable_states(0) == queries[1].get_reachable_states(0) and unknown_rejected and all(too_many_rejected)
+
+	def test_goal_directed_exploration(self):
+		# Depth bounded exploration has to find exactly the states within the bound, and the witness path has to be as short
+		# as the shortest path to a target state in the full state graph
+		full = QualitativeReasoner(create_extended_graph())
+		full.simulate(exploration_order=QualitativeReasoner.BREADTH_FIRST, sinks=[])
+		query = full.get_query()
+		distances = [len(query.get_shortest_path(0, s_index)) - 1 for s_index in range(len(full.state_list))]
+		bounded = QualitativeReasoner(create_extended_graph())
+		bounded.simulate(max_depth=3, sinks=[])
+		same_states = set([s.key for s in bounded.state_list]) == set([s.key for s, d in zip(full.state_list, distances) if d <= 3])
+		goal = QualitativeReasoner(create_extended_graph())
+		witness = goal.simulate(target="Volume=max", sinks=[])
+		shortest = query.get_shortest_path(0, "Volume=max")
+		return same_states and witness is not None and len(witness) == len(shortest) and len(goal.state_list) < len(full.state_list) and \
+			   all(witness[i] in goal.state_connections[witness[i+1]] for i in range(len(witness) - 1)) and \
+			   goal.state_list[witness[-1]].value_dict["Volume"][0] == "max"
+
+	def test_priority_max_depth(self):
+		# Priority exploration can find a state by a long path first. With max_depth, it still has to find the same states and
+		# transitions as breadth first search
+		results = list()
+		for exploration_order, priority_function in [(QualitativeReasoner.BREADTH_FIRST, None), (QualitativeReasoner.PRIORITY, lambda state, depth: -depth)]:
+			for packed_states in [False, True]:
+				reasoner = QualitativeReasoner(generate_synthetic_model(4, "mesh", density=0.3, num_exogenous=2, seed=1), packed_states=packed_states)
+				reasoner.simulate(exploration_order=exploration_order, priority_function=priority_function, max_depth=4, sinks=[])
+				states = [s.key for s in reasoner.state_list]
+				results.append((set(states), set([(states[source], states[s_index]) for s_index, sources in reasoner.state_connections.items() for source in sources])))
+		return len(results[0][0]) > 1 and all([r == results[0] for r in results[1:]])
+
+	def test_dependent_projection(self):
+		# Height and Pressure of the extended graph are determined by Volume. Simulating without them has to give the same states 
+		# and transitions (compared by values, as state indices may differ), also when generating all states. The expanded transitions
+		# have to list the same changes in the same order as the transitions of the full model
+		results = list()
+		for project_dependent in [False, True]:
+			reasoner = QualitativeReasoner(create_extended_graph(), project_dependent=project_dependent)
+			reasoner.reset_state_graph()
+			reasoner.add_to_state_list(reasoner.quantities, None)
+			reasoner.explore()
+			reasoner.try_all_states()
+			graph = reasoner.get_result_graph()
+			states = [s.key for s in graph.state_list]
+			transitions = {(states[source], states[s_index]): t.to_string() for s_index in graph.state_connections for source, t in graph.state_transitions[s_index].items()}
+			results.append((reasoner, set(states), transitions))
+		projected = results[1][0]
+		return results[0][0].projection is None and projected.projection.roots == {"Height": "Volume", "Pressure": "Volume"} and \
+			   len(projected.quantities) == 3 and results[0][1] == results[1][1] and results[0][2] == results[1][2]
+
+	def test_behavior_generator(self):
+		# Without skipping repeated cycles, the behaviors have to be exactly the paths without repeated states in the simulated state graph 
+		# that end in a terminal state, a cycle or at the maximum length
+		max_length = 6
+		reasoner = QualitativeReasoner()
+		reasoner.simulate(sinks=[])
+		query = reasoner.get_query()
+		indices = {s.key: i for i, s in enumerate(reasoner.state_list)}
+		expected = set()
+		paths = [[0]]
+		while len(paths) > 0:
+			path = paths.pop()
+			successors = query.get_successors(path[-1])
+			if len(successors) == 0 or len(path) > max_length:
+				expected.add((tuple(path), None))
+				continue
+			for succ in successors:
+				if succ in path:
+					expected.add((tuple(path), path.index(succ)))
+				else:
+					paths.append(path + [succ])
+		behaviors = list(generate_behaviors(QualitativeReasoner(), max_length=max_length, report_cycles_once=False))
+		found = set([(tuple([indices[s.key] for s in b.states]), b.cycle_start) for b in behaviors])
+		cycles_once = list(generate_behaviors(QualitativeReasoner(), max_length=max_length))
+		# Without space for saving reported cycles, every cycle is reported again
+		no_saved_cycles = list(generate_behaviors(QualitativeReasoner(), max_length=max_length, max_reported_cycles=0))
+		samples = list(generate_behaviors(QualitativeReasoner(), max_length=max_length, sample=20, seed=1))
+		# Without successor cache of the reasoner, every state is still expanded only once (and with a cache of size 0 on every path)
+		counting_reasoners = [QualitativeReasoner(collect_statistics=True) for _ in range(2)]
+		list(generate_behaviors(counting_reasoners[0], max_length=max_length, report_cycles_once=False))
+		list(generate_behaviors(counting_reasoners[1], max_length=max_length, report_cycles_once=False, max_cache_size=0))
+		expansions = [r.stats.counters.get("expanded_states", 0) for r in counting_reasoners]
+		return found == expected and len(behaviors) == len(expected) and all(len(b) <= max_length for b in behaviors + samples) and \
+			   expansions[0] <= len(indices) < expansions[1] and len(samples) == 20 and 0 < len(cycles_once) < len(behaviors) and len(no_saved_cycles) == len(behaviors) and all(len(b.transitions) == len(b.states) - (0 if b.is_cycle() else 1) for b in behaviors)
+
+	# List version of QualitativeReasoner.iterate_all_combinations (extends every combination by one position at a time)
+	@staticmethod
+	def generate_combinations_list(num, poss=2):
+		all_combs = [list()]
+		for i in range(num):
+			new_combs = list()
+			for c in all_combs:
+				for r in ([1, 0] if not isinstance(poss, list) else range(poss[i])):
+					new_combs.append(c + [r])
+			all_combs = new_combs
+		return all_combs
+
+	# Default graph where the derivative space of the inflow has no negative value, which exogenous changes can still set
+	@staticmethod
+	def create_restricted_derivative_graph():
+		description = read_model_description(os.path.join(os.path.dirname(os.path.abspath(__file__)), "models", "default.json"))
+		[q for q in description["quantities"] if q["name"] == "Inflow"][0]["deriv_space"] = ["0", "+"]
+		return create_graph_from_compiled(compile_model_description(description))
+
 	@staticmethod
 	def get_quantity(quantities, q_name):
 		for q in quantities:
@@ -159,7 +781,7 @@ class ReasonerTest:
 		return None
 
 
-if name == '__main__':
+if __name__ == '__main__':
 	if DEBUG:
 		tester = ReasonerTest()
 		tester.run_tests()
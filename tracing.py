@@ -0,0 +1,126 @@
+#################################
+## Tracing of reasoning events ##
+#################################
+
+import sys
+
+# Levels of events. Handlers only receive events of at least the level they subscribed with
+DEBUG = 10
+INFO = 20
+WARNING = 30
+LEVEL_NAMES = {DEBUG: "debug", INFO: "info", WARNING: "warning"}
+
+
+#################
+## Single event. The message is only formatted when a handler asks for it: the formatter is either a format string for
+## the arguments (%-style) or a function that is called with the arguments
+#################
+class TraceEvent:
+
+	__slots__ = ["channel", "level", "formatter", "args"]
+
+	def __init__(self, channel, level, formatter, args):
+		self.channel = channel
+		self.level = level
+		self.formatter = formatter
+		self.args = args
+
+	def message(self):
+		if callable(self.formatter):
+			return self.formatter(*self.args)
+		return self.formatter % self.args if len(self.args) > 0 else self.formatter
+
+
+#################
+## Channel for one kind of event, e.g. states being added. Code emitting events checks enabled(level) first, so that no
+## arguments are created and no function is called as long as no handler is subscribed for the level of the event:
+##     if STATE_ADDED.enabled(DEBUG):
+##         STATE_ADDED.emit(DEBUG, "Adding new state %d", s_index)
+## The attribute "active" tells whether any handler is subscribed
+#################
+class TraceChannel:
+
+	def __init__(self, name):
+		self.name = name
+		self.handlers = list()
+		self.active = False
+		self.min_level = WARNING + 1
+
+	# Handler is a function that is called with the TraceEvent
+	def subscribe(self, handler, level=DEBUG):
+		self.unsubscribe(handler)
+		self.handlers.append((handler, level))
+		self.update()
+
+	def unsubscribe(self, handler):
+		self.handlers = [(h, l) for h, l in self.handlers if h is not handler]
+		self.update()
+
+	def update(self):
+		self.active = len(self.handlers) > 0
+		self.min_level = min([l for _, l in self.handlers] + [WARNING + 1])
+
+	# Whether an event of the level would reach a handler
+	def enabled(self, level):
+		return self.active and level >= self.min_level
+
+	def emit(self, level, formatter, *args):
+		if level < self.min_level:
+			return
+		event = TraceEvent(self.name, level, formatter, args)
+		for handler, handler_level in self.handlers:
+			if level >= handler_level:
+				handler(event)
+
+# Relations being added to quantities (arguments: relation, quantity)
+RELATION_ADDED = TraceChannel("relation_added")
+# New states in the state graph (arguments: state index, state)
+STATE_ADDED = TraceChannel("state_added")
+# Transitions leading to a valid state (arguments: transition) and transitions that do not (arguments: transition)
+TRANSITION_ACCEPTED = TraceChannel("transition_accepted")
+TRANSITION_REJECTED = TraceChannel("transition_rejected")
+# Progress of long running steps (arguments: done, total, formatted by format_progress)
+PROGRESS = TraceChannel("progress")
+# Warnings about unexpected model or state values
+WARNINGS = TraceChannel("warnings")
+# Other debugging output
+MESSAGES = TraceChannel("messages")
+CHANNELS = {c.name: c for c in [RELATION_ADDED, STATE_ADDED, TRANSITION_ACCEPTED, TRANSITION_REJECTED, PROGRESS, WARNINGS, MESSAGES]}
+
+# Message of progress events
+def format_progress(done, total):
+	return "Checked %4.2f%% of all states" % (100*done/total)
+
+# Subscribes a handler to the given channel names (or all channels if None)
+def subscribe(handler, channel_names=None, level=DEBUG):
+	for name in (channel_names if channel_names is not None else CHANNELS.keys()):
+		CHANNELS[name].subscribe(handler, level)
+
+def unsubscribe(handler, channel_names=None):
+	for name in (channel_names if channel_names is not None else CHANNELS.keys()):
+		CHANNELS[name].unsubscribe(handler)
+
+
+#################
+## Prints events to the terminal. Progress events overwrite each other in the same line
+#################
+class ConsoleHandler:
+
+	def __init__(self, stream=None):
+		self.stream = stream
+
+	def __call__(self, event):
+		stream = self.stream if self.stream is not None else sys.stdout
+		stream.write(event.message() + ("\r" if event.channel == PROGRESS.name else "\n"))
+
+CONSOLE = ConsoleHandler()
+
+# Level of the output in the terminal. With INFO (default), warnings and progress are printed. With DEBUG, all events are printed
+def set_console_level(level):
+	unsubscribe(CONSOLE)
+	if level <= DEBUG:
+		subscribe(CONSOLE, level=level)
+	else:
+		subscribe(CONSOLE, [WARNINGS.name, PROGRESS.name], level=level)
+
+set_console_level(INFO)
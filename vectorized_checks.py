@@ -0,0 +1,133 @@
+##################################################################
+## Optional NumPy backend for checking the validity of many states ##
+##################################################################
+
+from state_graph import Quantity, Relationship
+from tracing import PROGRESS
+import tracing
+
+# NumPy is optional. Without it, the reasoner falls back to the pure Python checks
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+
+def numpy_available():
+	return np is not None
+
+# Integer code of a (derivative) value: + => 1, - => -1, 0 => 0. Other values get a code that is neither of those
+def value_to_sign(val):
+	if val == Quantity.POSITIVE:
+		return 1
+	elif val == Quantity.NEGATIVE:
+		return -1
+	elif val == Quantity.ZERO:
+		return 0
+	return 2
+
+
+#################
+## Checks batches of states as integer matrix (one row per state, one column per magnitude/derivative/2nd order derivative slot).
+## Rows are numbered like the combinations of QualitativeReasoner.iterate_all_combinations over all slots, so valid states
+## are returned in the same order as by checking the combinations one by one with Quantity.is_quantity_valid
+#################
+class VectorizedValidityChecker:
+
+	def __init__(self, quantities, model):
+		self.quantities = quantities
+		self.model = model
+		# Slot indices per quantity: magnitude, derivative, 2nd order derivative (None if not modelled)
+		self.slots = list()
+		self.slot_sizes = list()
+		for q in quantities:
+			magn_slot = len(self.slot_sizes)
+			self.slot_sizes += [len(q.magn_space), len(q.deriv_space)]
+			deriv_2nd_slot = None
+			if q.model_2nd_derivative:
+				deriv_2nd_slot = len(self.slot_sizes)
+				self.slot_sizes.append(len(q.deriv_2nd_space))
+			self.slots.append((magn_slot, magn_slot + 1, deriv_2nd_slot))
+		self.num_combs = 1
+		for size in self.slot_sizes:
+			self.num_combs *= size
+
+		# Lookup tables from value index to properties needed for the checks
+		self.is_lowest_landmark = [np.array([i == 0 and q.is_landmark_value(v) for i, v in enumerate(q.magn_space)]) for q in quantities]
+		self.is_highest_landmark = [np.array([i == len(q.magn_space) - 1 and q.is_landmark_value(v) for i, v in enumerate(q.magn_space)]) for q in quantities]
+		self.magn_has_influence = [np.array([v == Quantity.POSITIVE or v == Quantity.MAX_VAL for v in q.magn_space]) for q in quantities]
+		self.deriv_signs = [np.array([value_to_sign(v) for v in q.deriv_space]) for q in quantities]
+		self.deriv_2nd_signs = [np.array([value_to_sign(v) for v in q.deriv_2nd_space]) for q in quantities]
+
+	# Checks whether the number of combinations can be indexed by 64 bit integers
+	def is_feasible(self):
+		return self.num_combs < 2**63
+
+	# Yields the valid rows of all combinations, batch by batch, as lists of value indices per slot
+	def iterate_valid_combinations(self, batch_size=65536):
+		for start in range(0, self.num_combs, batch_size):
+			end = min(start + batch_size, self.num_combs)
+			if PROGRESS.enabled(tracing.INFO):
+				PROGRESS.emit(tracing.INFO, tracing.format_progress, start, self.num_combs)
+			for row in self.check_batch(start, end).tolist():
+				yield row
+
+	# Creates the value matrix for the combinations start..end-1 and returns the rows that fulfill all constraints
+	def check_batch(self, start, end):
+		combs = np.arange(start, end, dtype=np.int64)
+		values = np.empty((end - start, len(self.slot_sizes)), dtype=np.int64)
+		for slot in reversed(range(len(self.slot_sizes))):
+			combs, values[:, slot] = np.divmod(combs, self.slot_sizes[slot])
+
+		magnitudes = [values[:, s[0]] for s in self.slots]
+		derivs = [self.deriv_signs[q_index][values[:, s[1]]] for q_index, s in enumerate(self.slots)]
+		derivs_2nd = list()
+		for q_index, (q, s) in enumerate(zip(self.quantities, self.slots)):
+			if s[2] is not None:
+				derivs_2nd.append(self.deriv_2nd_signs[q_index][values[:, s[2]]])
+			else:
+				# Not part of the state, keeps value of the original quantity
+				derivs_2nd.append(np.full(end - start, value_to_sign(q.derivative_2nd)))
+
+		valid = np.ones(end - start, dtype=bool)
+		for q_index, q in enumerate(self.quantities):
+			magn, deriv, deriv_2nd = magnitudes[q_index], derivs[q_index], derivs_2nd[q_index]
+			# Quantity space boundaries (see Quantity.check_quantity_space_boundaries)
+			valid &= ~(((deriv == 1) | ((deriv == 0) & (deriv_2nd == 1))) & self.is_highest_landmark[q_index][magn])
+			valid &= ~(((deriv == -1) | ((deriv == 0) & (deriv_2nd == -1))) & self.is_lowest_landmark[q_index][magn])
+			# Causal relations (see Quantity.check_causal_relations)
+			deriv_infs = list()
+			deriv_2nd_infs = list()
+			for rel_opt, q1_index, positive, q1_val, self_val in self.model.incoming_relations[q_index]:
+				if rel_opt == Relationship.PROPORTIONAL:
+					deriv_inf = derivs[q1_index]
+					deriv_2nd_inf = derivs_2nd[q1_index]
+				elif rel_opt == Relationship.INFLUENCE:
+					deriv_inf = self.magn_has_influence[q1_index][magnitudes[q1_index]].astype(np.int64)
+					deriv_2nd_inf = derivs[q1_index]
+				else:
+					q1_space = self.quantities[q1_index].magn_space
+					if q1_val not in q1_space:
+						continue
+					active = magnitudes[q1_index] == q1_space.index(q1_val)
+					self_val_index = q.magn_space.index(self_val) if self_val in q.magn_space else -1
+					valid &= ~(active & (magn != self_val_index))
+					continue
+				if not positive:
+					deriv_inf = np.where(np.abs(deriv_inf) == 1, -deriv_inf, deriv_inf)
+					deriv_2nd_inf = np.where(np.abs(deriv_2nd_inf) == 1, -deriv_2nd_inf, deriv_2nd_inf)
+				deriv_infs.append(deriv_inf)
+				deriv_2nd_infs.append(deriv_2nd_inf)
+			if len(deriv_infs) != 0:
+				valid &= VectorizedValidityChecker.check_influences(deriv_infs, deriv)
+				valid &= VectorizedValidityChecker.check_influences(deriv_2nd_infs, deriv_2nd)
+		return values[valid]
+
+	# Checks whether a derivative is in line with the influences on it (ambiguity allowed)
+	@staticmethod
+	def check_influences(influences, deriv):
+		pos_infs = sum([i == 1 for i in influences])
+		neg_infs = sum([i == -1 for i in influences])
+		return ~(((pos_infs > 0) & (neg_infs == 0) & (deriv != 1)) | \
+				 ((neg_infs > 0) & (pos_infs == 0) & (deriv != -1)) | \
+				 ((pos_infs == 0) & (neg_infs == 0) & (deriv != 0)))
@@ -4,6 +4,12 @@
 
 from state_graph import Termination,Entity, Quantity, Relationship, State, create_default_graph
 import random
+import gzip
+import io
+import json
+
+# Buffer size of output files in bytes
+OUTPUT_BUFFER_SIZE = 1 << 20
 
 # Visualizing causal model
 def visualize_system(filename, entities, relations=None):
@@ -38,39 +44,60 @@ def visualize_system(filename, entities, relations=None):
 	with open(filename, "w") as f:
 		f.write(s)
 
+# Opens an output file for writing. Text is written through a buffer while iterating over the states, so the whole file is
+# never kept in memory. Filenames ending with ".gz" are compressed with gzip (or all files if compress is True)
+def open_output_file(filename, compress=False):
+	if compress or filename.endswith(".gz"):
+		return io.TextIOWrapper(io.BufferedWriter(gzip.open(filename, "wb"), buffer_size=OUTPUT_BUFFER_SIZE), encoding="utf-8")
+	return open(filename, "w", buffering=OUTPUT_BUFFER_SIZE)
+
 # Visualizing a state graph as shown in the report
-def visualize_state_graph(filename, state_list, state_connections):
-	dot_file_string = "digraph graphname {\n\trankdir=LR;\n"
-	for i, s in enumerate(state_list):
-		dot_file_string += "\ts" + (str(i)) + " [shape=box, label=\"" + state_to_label(s, i) + "\"];\n"
+def visualize_state_graph(filename, state_list, state_connections, compress=False):
+	with open_output_file(filename, compress) as f:
+		f.write("digraph graphname {\n\trankdir=LR;\n")
+		for i, s in enumerate(state_list):
+			f.write("\ts" + (str(i)) + " [shape=box, label=\"" + state_to_label(s, i) + "\"];\n")
 
-	for s_c, s_list in state_connections.items():
-		for source in s_list:
-			dot_file_string += "\ts" + str(source) + " -> s" + str(s_c) + ";\n"
+		for s_c, s_list in state_connections.items():
+			for source in s_list:
+				f.write("\ts" + str(source) + " -> s" + str(s_c) + ";\n")
 
-	dot_file_string += "}"
-	with open(filename, "w") as f:
-		f.write(dot_file_string)
+		f.write("}")
 # Helper function to convert state to text (label for dot node)
 def state_to_label(s, i):
-	label = "State " + str(i) + "\n"
-	for key, val in s.value_dict.items():
-		label += key + " (" + ",".join(val) + ")\n"
-	return label
+	return "State " + str(i) + "\n" + "".join([key + " (" + ",".join(val) + ")\n" for key, val in s.value_dict.items()])
 
 # Exports transitions for debugging
-def save_transitions(filename, state_list, state_connections, state_transitions):
-	s = "Transition recording\n"
-	s += "#"*50+"\n"
-	for goal_state, connections in state_transitions.items():
-		for source_state, transition in connections.items():
-			sub_s = "** Transition from " + str(source_state) + " to " + str(goal_state) + " **"
-			s += "*"*len(sub_s) + "\n" + sub_s + "\n" + "*"*len(sub_s) + "\n"
-			s += transition.to_string()
-			s += "-"*len(sub_s) + "\n" + "\n"
-
-	with open(filename, "w") as f:
-		f.write(s)
+def save_transitions(filename, state_list, state_connections, state_transitions, compress=False):
+	with open_output_file(filename, compress) as f:
+		f.write("Transition recording\n")
+		f.write("#"*50+"\n")
+		for goal_state, connections in state_transitions.items():
+			for source_state, transition in connections.items():
+				sub_s = "** Transition from " + str(source_state) + " to " + str(goal_state) + " **"
+				f.write("*"*len(sub_s) + "\n" + sub_s + "\n" + "*"*len(sub_s) + "\n")
+				f.write(transition.to_string())
+				f.write("-"*len(sub_s) + "\n" + "\n")
+
+# Exports the state graph as JSON for other tools: states with their values, and transitions with the changes that caused them.
+# Written as one state or transition per line
+def save_json_state_graph(filename, state_list, state_connections, state_transitions, compress=False):
+	with open_output_file(filename, compress) as f:
+		f.write("{\n\"states\": [")
+		for i, s in enumerate(state_list):
+			f.write(("," if i > 0 else "") + "\n\t" + json.dumps({"id": i, "values": s.value_dict}))
+		f.write("\n],\n\"transitions\": [")
+		first = True
+		for goal_state, connections in state_transitions.items():
+			for source_state, transition in connections.items():
+				changes = list()
+				for q, vs, typ in zip(transition.quantities, transition.vals, transition.types):
+					for v, t_type, v_name in zip(vs, typ, ["magnitude", "derivative", "derivative_2nd"]):
+						if v != Termination.UNCHANGED:
+							changes.append({"quantity": q.name, "value": v_name, "to": v, "type": t_type})
+				f.write(("," if not first else "") + "\n\t" + json.dumps({"source": source_state, "target": goal_state, "changes": changes}))
+				first = False
+		f.write("\n]\n}\n")
 
 
 #############
@@ -78,45 +105,42 @@ def save_transitions(filename, state_list, state_connections, state_transitions)
 #############
 
 # Inter-state trace relies on transitions/terminations that were used. 
-def save_inter_state_trace(filename, state_list, state_connections, state_transitions):
-	s = "Inter state trace\n"
-	s += "#" * 50 + "\n"
-	for goal_state, connections in state_transitions.items():
-		for source_state, transition in connections.items():
-			sub_s = "** Transition from " + str(source_state) + " to " + str(goal_state) + " **"
-			s += "*"*len(sub_s) + "\n" + sub_s + "\n" + "*"*len(sub_s) + "\n"
-			for q, vs, typ in zip(transition.quantities, transition.vals, transition.types):
-				if vs[0] != Termination.UNCHANGED:
-					s += "The magnitude of " + q.name + " changes from " + state_list[source_state].value_dict[q.name][0] + " to " + vs[0] + " because" + termination_type_to_text(typ[0], vs[0], state_list[source_state].value_dict[q.name][0], state_list[source_state].value_dict[q.name][1]) + "\n"
-				if vs[1] != Termination.UNCHANGED:
-					s += "The derivative of " + q.name + " changes from " + state_list[source_state].value_dict[q.name][1] + " to " + vs[1] + " because" + termination_type_to_text(typ[1], vs[1], state_list[source_state].value_dict[q.name][1], state_list[source_state].value_dict[q.name][2] if len(state_list[source_state].value_dict[q.name])>2 else None) + "\n"
-				if q.model_2nd_derivative and len(vs) > 2 and vs[2] != Termination.UNCHANGED:
-					s += "The second order derivative of " + q.name + " changes from " + state_list[source_state].value_dict[q.name][2] + " to " + vs[2] + " because" + termination_type_to_text(typ[2], vs[2], state_list[source_state].value_dict[q.name][2], None) + "\n"
-	
-	with open(filename, "w") as f:
-		f.write(s)		
+def save_inter_state_trace(filename, state_list, state_connections, state_transitions, compress=False):
+	with open_output_file(filename, compress) as f:
+		f.write("Inter state trace\n")
+		f.write("#" * 50 + "\n")
+		for goal_state, connections in state_transitions.items():
+			for source_state, transition in connections.items():
+				sub_s = "** Transition from " + str(source_state) + " to " + str(goal_state) + " **"
+				f.write("*"*len(sub_s) + "\n" + sub_s + "\n" + "*"*len(sub_s) + "\n")
+				source_values = state_list[source_state].value_dict
+				for q, vs, typ in zip(transition.quantities, transition.vals, transition.types):
+					if vs[0] != Termination.UNCHANGED:
+						f.write("The magnitude of " + q.name + " changes from " + source_values[q.name][0] + " to " + vs[0] + " because" + termination_type_to_text(typ[0], vs[0], source_values[q.name][0], source_values[q.name][1]) + "\n")
+					if vs[1] != Termination.UNCHANGED:
+						f.write("The derivative of " + q.name + " changes from " + source_values[q.name][1] + " to " + vs[1] + " because" + termination_type_to_text(typ[1], vs[1], source_values[q.name][1], source_values[q.name][2] if len(source_values[q.name])>2 else None) + "\n")
+					if q.model_2nd_derivative and len(vs) > 2 and vs[2] != Termination.UNCHANGED:
+						f.write("The second order derivative of " + q.name + " changes from " + source_values[q.name][2] + " to " + vs[2] + " because" + termination_type_to_text(typ[2], vs[2], source_values[q.name][2], None) + "\n")
 
 # Intra-state trace is generated by taking a state and describing the values as well as the active influences on quantities
-def save_intra_state_trace(filename, relations, state_list):
-	s = "Intra state trace\n"
-	s += "#" * 50 + "\n"
-	for s_index, state in enumerate(state_list):
-		s += "="*50+"\nState " + str(s_index) + "\n" + "-"*50 + "\n"
-		for q_name, vals in state.value_dict.items():
-			s += "The " + q_name + " " + magnitude_to_text(vals[0]) + " and " + derivative_to_text(vals[1]) + "."
-			if len(vals) > 2:
-				s += " " + get_random_phrase() + " the derivative of " + q_name + " " + derivative_to_text(vals[2]) + "."
-			s += "\n"
-		for rel in relations:
-			if rel.rel_opt == Relationship.INFLUENCE:
-				s += rel.q1.name + " has " + influence_to_text(state.value_dict[rel.q1.name][0], rel.positive) + " on " + rel.q2.name + " which " + derivative_to_text(state.value_dict[rel.q1.name][1]) + ".\n"
-		for q_name, vals in state.value_dict.items():
-			if q_name == "Volume":
-				s += "Combined, this leads to a " + ("positive" if vals[1] == Quantity.POSITIVE else ("negative" if vals[1] == Quantity.NEGATIVE else "empty")) + " influence which " + derivative_to_text(vals[2]) + ".\n"
-		s += "="*50+"\n\n"
-
-	with open(filename, "w") as f:
-		f.write(s)
+def save_intra_state_trace(filename, relations, state_list, compress=False):
+	influences = [rel for rel in relations if rel.rel_opt == Relationship.INFLUENCE]
+	with open_output_file(filename, compress) as f:
+		f.write("Intra state trace\n")
+		f.write("#" * 50 + "\n")
+		for s_index, state in enumerate(state_list):
+			f.write("="*50+"\nState " + str(s_index) + "\n" + "-"*50 + "\n")
+			for q_name, vals in state.value_dict.items():
+				f.write("The " + q_name + " " + magnitude_to_text(vals[0]) + " and " + derivative_to_text(vals[1]) + ".")
+				if len(vals) > 2:
+					f.write(" " + get_random_phrase() + " the derivative of " + q_name + " " + derivative_to_text(vals[2]) + ".")
+				f.write("\n")
+			for rel in influences:
+				f.write(rel.q1.name + " has " + influence_to_text(state.value_dict[rel.q1.name][0], rel.positive) + " on " + rel.q2.name + " which " + derivative_to_text(state.value_dict[rel.q1.name][1]) + ".\n")
+			for q_name, vals in state.value_dict.items():
+				if q_name == "Volume":
+					f.write("Combined, this leads to a " + ("positive" if vals[1] == Quantity.POSITIVE else ("negative" if vals[1] == Quantity.NEGATIVE else "empty")) + " influence which " + derivative_to_text(vals[2]) + ".\n")
+			f.write("="*50+"\n\n")
 
 
 ###########